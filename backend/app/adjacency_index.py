@@ -0,0 +1,275 @@
+"""
+Memory-mapped follower graph for the network endpoints.
+
+Anything deeper than a top-10 list used to mean walking following_relationships
+in SQLite, one row per edge. The daily job now also writes the graph it
+scored to ADJACENCY_DIR/<date>.<build>/ as flat arrays, a new directory for
+every run. Nodes are renumbered by
+ascending int64 user_id, so user_id.npy doubles as the lookup table:
+
+    user_id.npy                 int64, ascending; node i is user_id[i]
+    score.npy                   float64 pagerank per node
+    following_indptr.npy        int64, CSR row pointers
+    following.npy               int32, accounts each node follows, by node
+    following_ranked.npy        int32, the same rows by score, best first
+    followers_indptr.npy        int64, CSC column pointers
+    followers.npy               int32, accounts following each node, by node
+    followers_ranked.npy        int32, the same rows by score, best first
+    manifest.json               date, node and edge counts
+
+Workers map every file read-only when they open an index, and no build is
+ever changed or deleted while it is the newest. A rerun on the same date
+adds a directory instead of replacing one, so the pages a worker has mapped
+stay valid. A user's page of followers is a slice of
+one ranked row. Checking whether an edge exists, or intersecting two rows,
+works on the node-ordered rows with searchsorted and intersect1d. None of it
+reads SQLite, and no request reads more than the rows of the users involved.
+Only the returned page of profiles is fetched from users, by primary key.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from app.db import DB_PATH
+
+
+def adjacency_dir_for(db_path):
+    return os.getenv('ADJACENCY_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), 'adjacency')
+
+
+ADJACENCY_DIR = adjacency_dir_for(DB_PATH)
+
+# Older indexes kept next to the current one, for workers that still map them
+ADJACENCY_KEEP = int(os.getenv('ADJACENCY_KEEP', 1))
+
+# <date>.<build>, the build a time_ns stamp; plain <date> from older releases
+_BUILD_DIR = re.compile(r'^(\d{4}-\d{2}-\d{2})(?:\.(\d+))?$')
+
+
+def _builds(index_dir):
+    """Build directory names under index_dir, newest first"""
+    builds = []
+    for name in os.listdir(index_dir):
+        match = _BUILD_DIR.match(name)
+        if match:
+            builds.append(((match.group(1), int(match.group(2) or 0)), name))
+    return [name for _, name in sorted(builds, reverse=True)]
+
+
+def _ranked_rows(indptr, indices, score):
+    """Each row's indices reordered by descending score, ties by node"""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return indices[np.lexsort((indices, -score[indices], rows))]
+
+
+def write_adjacency_index(date, G, scores, index_dir=ADJACENCY_DIR, keep=ADJACENCY_KEEP):
+    """
+    Write one day's index for CSRGraph G and its score array (G's node order).
+
+    Written under a temporary name and renamed to a directory of its own,
+    even when one for the date exists. Builds beyond the newest keep + 1
+    are removed afterwards.
+
+    Returns:
+        str: the index directory
+    """
+    date = str(date)
+    try:
+        user_ids = np.asarray(G.node_ids).astype(np.int64)
+    except ValueError as e:
+        raise ValueError(f"The adjacency index needs numeric user ids: {e}")
+    order = np.argsort(user_ids, kind='stable')
+    score = np.asarray(scores, dtype=np.float64)[order]
+
+    # Renumber nodes by user_id; sorting the permuted matrix keeps rows by node
+    A = G.adjacency(dtype=np.int8)[order][:, order].tocsr()
+    A.sort_indices()
+    C = A.tocsc()
+    C.sort_indices()
+
+    final = os.path.join(index_dir, f'{date}.{time.time_ns()}')
+    tmp = final + '.tmp'
+    os.makedirs(tmp)
+
+    arrays = {'user_id': user_ids[order], 'score': score}
+    for name, M in (('following', A), ('followers', C)):
+        indices = M.indices.astype(np.int32, copy=False)
+        arrays[f'{name}_indptr'] = M.indptr.astype(np.int64, copy=False)
+        arrays[name] = indices
+        arrays[f'{name}_ranked'] = _ranked_rows(M.indptr, indices, score)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), array)
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump({'date': date, 'nodes': len(user_ids), 'edges': int(A.nnz)}, f)
+
+    os.replace(tmp, final)
+
+    for old in _builds(index_dir)[keep + 1:]:
+        shutil.rmtree(os.path.join(index_dir, old), ignore_errors=True)
+    # Left behind by runs that died before their rename
+    for name in os.listdir(index_dir):
+        if name.endswith('.tmp'):
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    return final
+
+
+class AdjacencyIndex:
+    """
+    One build's index. Every array is memory-mapped up front, so the index
+    keeps working if its directory is pruned later.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.date = self.manifest['date']
+        self.build = os.path.basename(path)
+        self._arrays = {
+            name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith('.npy')
+        }
+
+    def array(self, name):
+        return self._arrays[name]
+
+    def node(self, user_id):
+        """Node of user_id, or None if it was not in the graph that day"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        ids = self.array('user_id')
+        i = int(np.searchsorted(ids, user_id))
+        if i < len(ids) and ids[i] == user_id:
+            return i
+        return None
+
+    def degree(self, node, direction):
+        indptr = self.array(f'{direction}_indptr')
+        return int(indptr[node + 1] - indptr[node])
+
+    def neighbors(self, node, direction, ranked=False):
+        """Row of `direction` for node, by node or best score first"""
+        indptr = self.array(f'{direction}_indptr')
+        name = f'{direction}_ranked' if ranked else direction
+        return self.array(name)[indptr[node]:indptr[node + 1]]
+
+    def page(self, node, direction, offset=0, limit=50):
+        """(nodes, total) for one page of a ranked row"""
+        indptr = self.array(f'{direction}_indptr')
+        start, end = int(indptr[node]), int(indptr[node + 1])
+        lo = min(start + offset, end)
+        return np.asarray(self.array(f'{direction}_ranked')[lo:min(lo + limit, end)]), end - start
+
+    def has_edge(self, src, dst):
+        """True if src follows dst"""
+        row = self.neighbors(src, 'following')
+        i = int(np.searchsorted(row, dst))
+        return i < len(row) and row[i] == dst
+
+    def common(self, a, b, direction):
+        """Nodes in both a's and b's rows, best score first"""
+        shared = np.intersect1d(self.neighbors(a, direction), self.neighbors(b, direction),
+                                assume_unique=True)
+        return self.rank(shared)
+
+    def rank(self, nodes):
+        """nodes sorted by descending score, ties by node"""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return nodes[np.lexsort((nodes, -self.array('score')[nodes]))]
+
+    def ego_sample(self, node, first=20, second=5):
+        """
+        Two-hop neighborhood sample around node.
+
+        Takes the `first` best-scored accounts among node's followers and
+        followings, then the `second` best not yet picked from each of those.
+        Only the heads of ranked rows are read, so the cost does not grow
+        with degree beyond one binary search per picked pair for the edges.
+
+        Returns:
+            (nodes, hops, edges): picked nodes in order with their hop
+            count, and the (src, dst) follow edges among them as positions
+            into nodes
+        """
+        candidates = np.unique(np.concatenate([
+            self.neighbors(node, 'following', ranked=True)[:first],
+            self.neighbors(node, 'followers', ranked=True)[:first],
+        ]))
+        candidates = candidates[candidates != node]
+        hop1 = self.rank(candidates)[:first]
+
+        picked = [node, *hop1.tolist()]
+        hops = [0] + [1] * len(hop1)
+        seen = set(picked)
+        for neighbor in hop1.tolist():
+            row = self.rank(np.unique(np.concatenate([
+                self.neighbors(neighbor, 'following', ranked=True)[:first + second],
+                self.neighbors(neighbor, 'followers', ranked=True)[:first + second],
+            ])))
+            added = 0
+            for candidate in row.tolist():
+                if added == second:
+                    break
+                if candidate not in seen:
+                    seen.add(candidate)
+                    picked.append(candidate)
+                    hops.append(2)
+                    added += 1
+
+        nodes = np.array(picked, dtype=np.int64)
+        by_node = np.argsort(nodes)
+        sorted_nodes = nodes[by_node]
+        edges = []
+        for position, src in enumerate(picked):
+            row = self.neighbors(src, 'following')
+            # Which picked nodes src follows: one search per picked node
+            found = np.searchsorted(row, sorted_nodes)
+            inside = found < len(row)
+            hit = np.zeros(len(sorted_nodes), dtype=bool)
+            hit[inside] = row[found[inside]] == sorted_nodes[inside]
+            edges.extend((position, int(dst)) for dst in by_node[hit].tolist())
+        return nodes, hops, edges
+
+    def user_ids(self, nodes):
+        return [str(user_id) for user_id in self.array('user_id')[np.asarray(nodes, dtype=np.int64)].tolist()]
+
+    def scores(self, nodes):
+        return self.array('score')[np.asarray(nodes, dtype=np.int64)].tolist()
+
+
+class AdjacencyIndexStore:
+    """
+    The newest index under one directory, reopened when the directory
+    changes (the daily job renames a new build into place).
+    """
+
+    def __init__(self, index_dir=ADJACENCY_DIR):
+        self.index_dir = index_dir
+        self._index = None
+        self._listed_mtime = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The newest AdjacencyIndex, or None if the daily job has not written one"""
+        try:
+            mtime = os.stat(self.index_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if mtime != self._listed_mtime:
+                builds = [name for name in _builds(self.index_dir)
+                          if os.path.exists(os.path.join(self.index_dir, name, 'manifest.json'))]
+                self._index = AdjacencyIndex(os.path.join(self.index_dir, builds[0])) if builds else None
+                self._listed_mtime = mtime
+            return self._index
+
+
+adjacency_store = AdjacencyIndexStore()
@@ -0,0 +1,47 @@
+"""
+Small key/value table for state shared between the API workers and the jobs.
+
+metrics_epoch changes whenever anything a user page shows is rewritten: the
+daily job, niche and top-follower saves, and users added through the
+not-in-db path. The API's response cache keys on it, so cached pages from
+every worker go stale as soon as any writer commits.
+"""
+import sqlite3
+
+APP_STATE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS app_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER
+    )
+"""
+
+METRICS_EPOCH_KEY = 'metrics_epoch'
+
+METRICS_EPOCH_SQL = """
+    SELECT (SELECT MAX(date) FROM user_daily_metrics),
+           (SELECT value FROM app_state WHERE key = ?)
+"""
+
+
+def ensure_app_state_table(db):
+    db.execute(APP_STATE_SCHEMA)
+
+
+def bump_metrics_epoch(db):
+    """Advance the metrics epoch; call inside the writer's transaction, before commit"""
+    db.execute("""
+        INSERT INTO app_state (key, value) VALUES (?, 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """, (METRICS_EPOCH_KEY,))
+
+
+def metrics_epoch(db):
+    """
+    Current metrics epoch as a string: the latest metrics date plus the
+    bump counter. Databases that predate app_state fall back to the date.
+    """
+    try:
+        row = db.execute(METRICS_EPOCH_SQL, (METRICS_EPOCH_KEY,)).fetchone()
+    except sqlite3.OperationalError:
+        row = db.execute("SELECT MAX(date), NULL FROM user_daily_metrics").fetchone()
+    return f"{row[0]}:{row[1] or 0}"
@@ -0,0 +1,115 @@
+import click
+from flask.cli import with_appcontext
+from app import get_write_db
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Build (or rebuild) the trigram username index used by /api/search"""
+    from app.search_index import rebuild_search_index
+
+    count = rebuild_search_index(get_write_db())
+    click.echo(f"Indexed {count} usernames")
+
+
+@click.command('backfill-latest-metrics')
+@with_appcontext
+def backfill_latest_metrics_command():
+    """Create and fill user_latest_metrics from the latest day of user_daily_metrics"""
+    from app.latest_metrics import backfill_latest_metrics
+
+    count = backfill_latest_metrics(get_write_db())
+    click.echo(f"Wrote {count} rows to user_latest_metrics")
+
+
+@click.command('create-indexes')
+@click.option('--analyze/--no-analyze', default=None,
+              help='Always / never run ANALYZE (default: only after creating an index)')
+@with_appcontext
+def create_indexes_command(analyze):
+    """Create the indexes the API queries rely on (idempotent)"""
+    from app.queries import create_indexes
+
+    db = get_write_db()
+    created = create_indexes(db, analyze=analyze is None)
+    click.echo(f"Created {len(created)} indexes" + (f": {', '.join(created)}" if created else ""))
+    if analyze:
+        db.execute("ANALYZE")
+        db.commit()
+        click.echo("Refreshed planner statistics")
+    elif created and analyze is False:
+        click.echo("Skipped ANALYZE; run `flask --app run.py create-indexes --analyze` to refresh planner statistics")
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """Fail if any hot API query plans a full table scan on this database"""
+    from app.queries import check_query_plans
+
+    failures = check_query_plans(get_write_db())
+    for name, scans in failures.items():
+        click.echo(f"FULL SCAN in {name}: {'; '.join(scans)}")
+    if failures:
+        raise SystemExit(1)
+    click.echo("No full table scans in hot queries")
+
+
+@click.command('backfill-percentile-sketches')
+@with_appcontext
+def backfill_percentile_sketches_command():
+    """Store pagerank quantile sketches for metrics dates saved before sketches existed"""
+    from app.percentiles import backfill_percentile_sketches
+
+    count = backfill_percentile_sketches(get_write_db())
+    click.echo(f"Sketched {count} dates")
+
+
+@click.command('compact-daily-metrics')
+@click.option('--keep-days', default=30, show_default=True,
+              help='Keep user_daily_metrics rows for this many days')
+@click.option('--snapshot-days', default=0, show_default=True,
+              help='Also delete snapshots older than this many days (0 keeps all)')
+@click.option('--vacuum', is_flag=True, help='VACUUM afterwards to return the space to the volume')
+@with_appcontext
+def compact_daily_metrics_command(keep_days, snapshot_days, vacuum):
+    """Move old daily metrics rows into columnar snapshots and delete them from SQLite"""
+    from app.snapshots import compact_daily_metrics, prune_snapshots
+
+    db = get_write_db()
+    compacted = compact_daily_metrics(db, keep_days)
+    click.echo(f"Compacted {len(compacted)} dates, {sum(n for _, n in compacted)} rows")
+    if snapshot_days:
+        removed = prune_snapshots(snapshot_days)
+        click.echo(f"Removed {len(removed)} snapshots")
+    if vacuum and compacted:
+        click.echo("Vacuuming...")
+        db.execute("VACUUM")
+
+
+@click.command('sync-dense-ids')
+@click.option('--full', is_flag=True, help='Rebuild following_edges even if no relationships were deleted')
+@with_appcontext
+def sync_dense_ids_command(full):
+    """Map user_ids to dense integer ids and relationships to following_edges"""
+    from app.dense_ids import sync_dense_ids, table_sizes
+
+    db = get_write_db()
+    synced = sync_dense_ids(db, full=full)
+    click.echo(f"{synced['ids']} dense ids ({synced['ids_added']} new), "
+               f"{synced['edges']} edges ({synced['edges_added']} new)")
+    sizes = table_sizes(db, ('following_relationships', 'following_edges', 'dense_user_ids'))
+    for table, size in (sizes or {}).items():
+        click.echo(f"{table}: {size['table'] / 2**20:.1f} MiB table, "
+                   f"{size['indexes'] / 2**20:.1f} MiB indexes")
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(backfill_latest_metrics_command)
+    app.cli.add_command(create_indexes_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(backfill_percentile_sketches_command)
+    app.cli.add_command(compact_daily_metrics_command)
+    app.cli.add_command(sync_dense_ids_command)
@@ -0,0 +1,312 @@
+"""
+Async client for the Twitter (RapidAPI) endpoints used by the not-in-db path.
+
+Flask handlers are synchronous, so the client lives on one background event
+loop thread per worker and handlers submit coroutines to it. That loop owns a
+single long-lived httpx.AsyncClient: connections are kept alive between
+requests (HTTP/2 when the h2 package is installed), instead of a new client
+and TLS handshake per call. Requests from every handler thread pass through
+one token bucket, which replaces the fixed sleeps between pages. Responses
+are cached in app/remote_cache.py, and concurrent calls for the same request
+share one upstream call.
+
+Follower pages have to be fetched in order (each needs the previous page's
+continuation token). stream_followers runs that chain on the loop and hands
+pages to the caller as they arrive, so the caller's database work on page k
+overlaps the fetch of page k + 1.
+"""
+import asyncio
+import copy
+import importlib.util
+import os
+import queue
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+
+from app.remote_cache import cache_key, is_not_found, remote_cache
+
+api_key = os.getenv("RAPID_API_KEY")
+
+API_BASE = os.getenv("RAPID_API_BASE", "https://twitter154.p.rapidapi.com")
+HEADERS = {
+    "x-rapidapi-key": api_key,
+    "x-rapidapi-host": "twitter154.p.rapidapi.com"
+}
+
+RAPID_API_RATE = float(os.getenv('RAPID_API_RATE', 10))    # requests per second
+RAPID_API_BURST = int(os.getenv('RAPID_API_BURST', 5))
+RAPID_API_TIMEOUT = float(os.getenv('RAPID_API_TIMEOUT', 15))
+MAX_ATTEMPTS = 5
+# Longest 429 wait, the exponential backoff's last step by default; a longer
+# Retry-After fails the request instead of parking a worker on it
+RAPID_API_MAX_RETRY_WAIT = float(os.getenv('RAPID_API_MAX_RETRY_WAIT', 2 ** (MAX_ATTEMPTS - 1)))
+FOLLOWERS_PAGE_SIZE = 100
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+class NotFound(Exception):
+    """The API answered that the requested user does not exist"""
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _retry_after(response):
+    """Seconds from a numeric Retry-After header, or None"""
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _json_or_none(response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+class TwitterAPI:
+    """Pooled async client with rate limiting and retries; create it on the loop"""
+
+    def __init__(self, base_url=API_BASE, headers=HEADERS, rate=RAPID_API_RATE,
+                 burst=RAPID_API_BURST, timeout=RAPID_API_TIMEOUT, cache=remote_cache):
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            http2=HTTP2_AVAILABLE,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        self.limiter = TokenBucket(rate, burst)
+        self.cache = cache
+        self._inflight = {}
+
+    async def get_json(self, path: str, params: Dict) -> Dict:
+        """
+        GET path and decode the JSON body, from the remote cache when possible.
+
+        A miss for a request that is already in flight waits for that call
+        instead of making another. Every caller gets its own copy of the body.
+        Not-found answers raise NotFound, cached or not. Cache reads and writes are SQLite calls, so
+        they run in the loop's default executor instead of blocking it.
+        """
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.cache.get, path, params)
+        if cached is None:
+            key = cache_key(path, params)
+            call = self._inflight.get(key)
+            if call is None:
+                call = asyncio.ensure_future(self._fetch_and_store(path, params))
+                self._inflight[key] = call
+                call.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self.cache.coalesced += 1
+            # Shielded: one caller giving up must not cancel the others' call
+            cached = await asyncio.shield(call)
+
+        status, body = cached
+        if is_not_found(path, status, body):
+            raise NotFound(f"HTTP Error: {status} Not Found for {path}")
+        return copy.deepcopy(body)
+
+    async def _fetch_and_store(self, path, params):
+        status, body = await self._fetch(path, params)
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.cache.set, path, params, status, body)
+        return status, body
+
+    async def _fetch(self, path, params):
+        """
+        (status, body) for a 2xx or 404 response from the API.
+
+        429s back off exponentially (or by Retry-After when the server sends
+        it, raising if that is over RAPID_API_MAX_RETRY_WAIT); other HTTP
+        errors raise immediately; network errors are retried.
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            await self.limiter.acquire()
+            self.cache.upstream_calls += 1
+            try:
+                response = await self.client.get(path, params=params)
+                if response.status_code == 404:
+                    return 404, _json_or_none(response)
+                response.raise_for_status()
+                return response.status_code, response.json()
+
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 429:
+                    wait_time = _retry_after(e.response) or 2 ** attempt
+                    if wait_time > RAPID_API_MAX_RETRY_WAIT:
+                        raise Exception(f"Rate limited on {path}: Retry-After of {wait_time:g}s "
+                                        f"is over the {RAPID_API_MAX_RETRY_WAIT:g}s limit")
+                    print(f"\033[93mRate limited on {path}, retrying in {wait_time}s\033[0m")
+                    await asyncio.sleep(wait_time)
+                    continue
+                raise Exception(f"HTTP Error: {str(e)}")
+
+            except httpx.TransportError:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(1 * attempt)
+
+        raise Exception("Max retry attempts reached")
+
+    async def user_details(self, identifier: str) -> Dict:
+        response = await self.get_json("/user/details", {"username": identifier})
+        if "user_id" in response:
+            response["user_id"] = str(response["user_id"])
+        return response
+
+    async def follower_pages(self, user_id: str, max_limit: int = 2500):
+        """Yield lists of normalized followers, one per API page"""
+        fetched = 0
+        continuation_token = ""
+        while fetched < max_limit:
+            path = "/user/followers/continuation" if continuation_token else "/user/followers"
+            response = await self.get_json(path, {
+                "user_id": str(user_id),
+                "limit": FOLLOWERS_PAGE_SIZE,
+                "continuation_token": continuation_token,
+            })
+            if not response.get("results"):
+                break
+
+            # Extract user objects with required fields, using .get() for optional fields
+            page = [{
+                'user_id': str(user.get('user_id', '')),
+                'username': user.get('username', ''),
+                'follower_count': user.get('follower_count', 0),
+                'profile_pic_url': user.get('profile_pic_url', None)
+            } for user in response['results']]
+            fetched += len(page)
+            yield page
+
+            continuation_token = response.get("continuation_token")
+            if not continuation_token:
+                break
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class _LoopThread:
+    """Background event loop (one per process) that owns the TwitterAPI client"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self.loop = None
+        self.api = None
+
+    def _start(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='twitter-api-loop', daemon=True).start()
+        self.api = self.submit(self._create_api()).result()
+        self._pid = os.getpid()
+
+    @staticmethod
+    async def _create_api():
+        return TwitterAPI()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def ensure_started(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+        return self
+
+
+_loop = _LoopThread()
+
+
+def _require_api_key():
+    if not HEADERS.get("x-rapidapi-key"):
+        raise Exception("RAPID_API_KEY environment variable is not set!")
+
+
+def run(coro_factory, timeout=None):
+    """Run coro_factory(api) on the background loop and wait for the result"""
+    _require_api_key()
+    loop = _loop.ensure_started()
+    return loop.submit(coro_factory(loop.api)).result(timeout)
+
+
+def fetch_json(path: str, params: Dict) -> Dict:
+    return run(lambda api: api.get_json(path, params))
+
+
+def get_user_details(identifier: str) -> Dict:
+    return run(lambda api: api.user_details(identifier))
+
+
+class FollowerStream:
+    """Iterator over follower pages crawled in the background; close() stops the crawl"""
+
+    _done = object()
+
+    def __init__(self, api, user_id, max_limit):
+        self._pages = queue.Queue()
+        self._future = _loop.submit(self._crawl(api, user_id, max_limit))
+
+    async def _crawl(self, api, user_id, max_limit):
+        try:
+            async for page in api.follower_pages(user_id, max_limit):
+                self._pages.put(page)
+        except Exception as e:
+            self._pages.put(e)
+        finally:
+            self._pages.put(self._done)
+
+    def __iter__(self):
+        while True:
+            item = self._pages.get()
+            if item is self._done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self._future.cancel()
+
+
+def stream_followers(user_id: str, max_limit: int = 2500) -> FollowerStream:
+    """
+    Start paging through user_id's followers in the background and return an
+    iterator over the pages, in order. Raises the crawl's exception, if any,
+    once the pages before it have been consumed.
+    """
+    _require_api_key()
+    loop = _loop.ensure_started()
+    return FollowerStream(loop.api, user_id, max_limit)
+
+
+def get_followers(user_id: str, max_limit: int = 2500) -> List[Dict]:
+    """All follower pages for user_id, flattened"""
+    return [follower for page in stream_followers(user_id, max_limit) for follower in page]
@@ -0,0 +1,339 @@
+"""
+Follower graph stored as NumPy arrays.
+
+Nodes are interned to dense indices in the order they are first seen (users
+table first, then any ids that only appear in following_relationships), which
+is the same order networkx used. Edges are kept in CSR form, where row i lists
+the accounts user i follows; the transposed (CSC) view listing each user's
+followers is built lazily.
+
+A graph loaded with from_dense_ids is numbered by the dense ids in
+app.dense_ids instead. It never builds the user_id -> index dict unless
+something asks for node_index; index_of resolves user_ids through the
+dense_user_ids table.
+"""
+import os
+import sqlite3
+import time
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+from app.dense_ids import lookup_dense_ids
+
+# Edge rows fetched from SQLite per round trip while loading the graph
+EDGE_CHUNK_SIZE = int(os.getenv('EDGE_CHUNK_SIZE', 500_000))
+
+
+class CSRGraph:
+    def __init__(self, node_ids, indptr, indices, follower_count, following_count,
+                 is_verified, has_profile, node_index=None, dense_ids=None, db_path=None):
+        self.node_ids = node_ids
+        self._node_index = node_index
+        # Ascending dense id of each node, and the database they belong to
+        self.dense_ids = dense_ids
+        self.db_path = db_path
+        self.indptr = indptr
+        self.indices = indices
+        # Counts are float64 so NULLs from the users table survive as NaN
+        self.follower_count = follower_count
+        self.following_count = following_count
+        self.is_verified = is_verified
+        # False for ids that only appear in following_relationships
+        self.has_profile = has_profile
+        self._csc = None
+
+    @property
+    def n(self):
+        return len(self.node_ids)
+
+    @property
+    def node_index(self):
+        """user_id -> node index dict, built on first use"""
+        if self._node_index is None:
+            self._node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        return self._node_index
+
+    def dense_index(self, dense_ids):
+        """Node index of each dense id, -1 where it is not in the graph"""
+        dense_ids = np.asarray(dense_ids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.dense_ids, dense_ids), self.n - 1)
+        return np.where(self.dense_ids[positions] == dense_ids, positions, -1)
+
+    def index_of(self, user_ids):
+        """Node indices of the given user_ids that are in the graph, in the order given"""
+        user_ids = list(user_ids)
+        if self._node_index is None and self.dense_ids is not None and self.n:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                dense = lookup_dense_ids(conn, user_ids)
+            finally:
+                conn.close()
+            found = [dense[u] for u in user_ids if u in dense]
+            indices = self.dense_index(found)
+            return indices[indices >= 0]
+        return np.array([self.node_index[u] for u in user_ids if u in self.node_index],
+                        dtype=np.int64)
+
+    def number_of_nodes(self):
+        return self.n
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def in_degree(self):
+        return np.bincount(self.indices, minlength=self.n)
+
+    def reciprocal_degree(self):
+        """Mutual follows per node: the row sums of A ∘ Aᵀ"""
+        A = self.adjacency(dtype=bool)
+        return A.multiply(A.T.tocsr()).getnnz(axis=1).astype(np.int64)
+
+    def adjacency(self, dtype=np.float64):
+        """Sparse adjacency matrix where A[i, j] = 1 means i follows j"""
+        data = np.ones(len(self.indices), dtype=dtype)
+        return csr_matrix((data, self.indices, self.indptr), shape=(self.n, self.n))
+
+    def followers(self):
+        """(indptr, indices) where indices[indptr[j]:indptr[j + 1]] follow node j"""
+        if self._csc is None:
+            csc = self.adjacency().tocsc()
+            self._csc = (csc.indptr, csc.indices)
+        return self._csc
+
+    @classmethod
+    def from_edges(cls, node_ids, src, dst, follower_count, following_count,
+                   is_verified, has_profile, node_index=None):
+        """Build the CSR arrays from parallel src/dst index arrays, dropping duplicate edges"""
+        n = len(node_ids)
+        A = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n)).tocsr()
+        # Merges duplicate edges and sorts each row's indices
+        A.sum_duplicates()
+        return cls(node_ids, A.indptr.astype(np.int64, copy=False), A.indices.astype(np.int32, copy=False),
+                   follower_count, following_count, is_verified, has_profile, node_index)
+
+    @classmethod
+    def from_sqlite(cls, conn, chunk_size=EDGE_CHUNK_SIZE):
+        """
+        Load users and following_relationships straight from SQLite cursors.
+
+        Edges are streamed with fetchmany, chunk_size rows at a time, and
+        interned into int32 buffers as they arrive, so only one chunk of
+        Python tuples is alive at any point.
+        """
+        n_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        follower_count = np.full(n_users, np.nan)
+        following_count = np.full(n_users, np.nan)
+        is_verified = np.zeros(n_users, dtype=np.int8)
+
+        node_ids = []
+        node_index = {}
+        users = conn.execute("""
+            SELECT user_id, follower_count, following_count, is_verified
+            FROM users
+        """)
+        for i, (user_id, followers, following, verified) in enumerate(users):
+            node_index[user_id] = i
+            node_ids.append(user_id)
+            if followers is not None:
+                follower_count[i] = followers
+            if following is not None:
+                following_count[i] = following
+            is_verified[i] = 1 if verified else 0
+
+        def intern(node_id):
+            i = node_index.get(node_id)
+            if i is None:
+                i = node_index[node_id] = len(node_ids)
+                node_ids.append(node_id)
+            return i
+
+        src, dst = _stream_edges(conn, intern, chunk_size)
+
+        # Ids that only appear in the edge list get no profile attributes
+        extra = len(node_ids) - n_users
+        return cls.from_edges(
+            np.array(node_ids, dtype=object),
+            src,
+            dst,
+            np.concatenate([follower_count, np.full(extra, np.nan)]),
+            np.concatenate([following_count, np.full(extra, np.nan)]),
+            np.concatenate([is_verified, np.zeros(extra, dtype=np.int8)]),
+            np.arange(len(node_ids)) < n_users,
+            node_index,
+        )
+
+    @classmethod
+    def from_dense_ids(cls, conn, chunk_size=EDGE_CHUNK_SIZE):
+        """
+        Load the graph from dense_user_ids and following_edges (see
+        app.dense_ids), which sync_dense_ids must have brought up to date.
+
+        Edges arrive as integer pairs already sorted by (src, dst), so the CSR
+        arrays are filled in place. Nodes are the dense ids that are in users
+        or have an edge, in dense id order.
+        """
+        size = conn.execute('SELECT COALESCE(MAX(dense_id), 0) + 1 FROM dense_user_ids').fetchone()[0]
+        src, dst = _stream_dense_edges(conn, chunk_size)
+
+        follower_count = np.full(size, np.nan)
+        following_count = np.full(size, np.nan)
+        is_verified = np.zeros(size, dtype=np.int8)
+        has_profile = np.zeros(size, dtype=bool)
+        users = conn.execute("""
+            SELECT d.dense_id, u.follower_count, u.following_count, u.is_verified
+            FROM users u
+            JOIN dense_user_ids d ON d.user_id = u.user_id
+        """)
+        while True:
+            rows = users.fetchmany(chunk_size)
+            if not rows:
+                break
+            # NULL counts become NaN
+            block = np.array(rows, dtype=np.float64).reshape(-1, 4)
+            ids = block[:, 0].astype(np.int64)
+            has_profile[ids] = True
+            follower_count[ids] = block[:, 1]
+            following_count[ids] = block[:, 2]
+            is_verified[ids] = np.nan_to_num(block[:, 3]) != 0
+
+        # Ids no longer in users or following_relationships drop out
+        live = has_profile.copy()
+        live[src] = True
+        live[dst] = True
+        dense_ids = np.flatnonzero(live)
+        n = len(dense_ids)
+        # Monotone, so edges stay sorted by (src, dst)
+        remap = np.full(size, -1, dtype=np.int32)
+        remap[dense_ids] = np.arange(n, dtype=np.int32)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(remap[src], minlength=n), out=indptr[1:])
+
+        node_ids = np.empty(n, dtype=object)
+        for dense_id, user_id in conn.execute('SELECT dense_id, user_id FROM dense_user_ids'):
+            i = remap[dense_id]
+            if i >= 0:
+                node_ids[i] = user_id
+
+        db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+        return cls(node_ids, indptr, remap[dst], follower_count[dense_ids],
+                   following_count[dense_ids], is_verified[dense_ids], has_profile[dense_ids],
+                   dense_ids=dense_ids, db_path=db_path)
+
+    @classmethod
+    def from_networkx(cls, G):
+        """Convert an nx.DiGraph whose nodes carry the users-table attributes"""
+        node_ids = list(G.nodes())
+        node_index = {node: i for i, node in enumerate(node_ids)}
+        n = len(node_ids)
+
+        follower_count = np.full(n, np.nan)
+        following_count = np.full(n, np.nan)
+        is_verified = np.zeros(n, dtype=np.int8)
+        has_profile = np.zeros(n, dtype=bool)
+        for i, node in enumerate(node_ids):
+            data = G.nodes[node]
+            if 'follower_count' in data:
+                has_profile[i] = True
+                follower_count[i] = _nan_if_none(data['follower_count'])
+                following_count[i] = _nan_if_none(data.get('following_count'))
+                is_verified[i] = 1 if data.get('is_verified') else 0
+
+        edges = np.array([(node_index[u], node_index[v]) for u, v in G.edges()],
+                         dtype=np.int64).reshape(-1, 2)
+        return cls.from_edges(np.array(node_ids, dtype=object), edges[:, 0], edges[:, 1],
+                              follower_count, following_count, is_verified, has_profile,
+                              node_index)
+
+
+def _nan_if_none(value):
+    return np.nan if value is None else value
+
+
+def _edge_count_hint(conn):
+    """Upper bound on the edge count from MAX(rowid), which SQLite answers without a scan"""
+    try:
+        return conn.execute('SELECT MAX(rowid) FROM following_relationships').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        # WITHOUT ROWID table
+        return 0
+
+
+def _grow(buffer, count, capacity):
+    grown = np.empty(capacity, dtype=buffer.dtype)
+    grown[:count] = buffer[:count]
+    return grown
+
+
+def _stream_edges(conn, intern, chunk_size):
+    """Read following_relationships chunk by chunk into interned int32 src/dst arrays"""
+    capacity = max(_edge_count_hint(conn), chunk_size)
+    src = np.empty(capacity, dtype=np.int32)
+    dst = np.empty(capacity, dtype=np.int32)
+    count = 0
+
+    cursor = conn.execute("""
+        SELECT user_id, following_id
+        FROM following_relationships
+    """)
+    start = time.perf_counter()
+    chunks = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+
+        end = count + len(rows)
+        if end > capacity:
+            capacity = max(end, int(capacity * 1.5))
+            src = _grow(src, count, capacity)
+            dst = _grow(dst, count, capacity)
+
+        src[count:end] = [intern(user_id) for user_id, _ in rows]
+        dst[count:end] = [intern(following_id) for _, following_id in rows]
+        count = end
+        chunks += 1
+
+        if chunks % 10 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"Loaded {count:,} edges ({count / elapsed:,.0f} edges/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {count:,} edges in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} edges/s)")
+    return src[:count], dst[:count]
+
+
+def _stream_dense_edges(conn, chunk_size):
+    """Read following_edges in (src, dst) order into int32 arrays"""
+    count = conn.execute('SELECT COUNT(*) FROM following_edges').fetchone()[0]
+    src = np.empty(count, dtype=np.int32)
+    dst = np.empty(count, dtype=np.int32)
+
+    cursor = conn.execute("""
+        SELECT src, dst FROM following_edges
+        ORDER BY src, dst
+    """)
+    start = time.perf_counter()
+    loaded = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        pairs = np.array(rows, dtype=np.int32)
+        src[loaded:loaded + len(rows)] = pairs[:, 0]
+        dst[loaded:loaded + len(rows)] = pairs[:, 1]
+        loaded += len(rows)
+
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {loaded:,} edges in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):,.0f} edges/s)")
+    return src[:loaded], dst[:loaded]
+
+
+def as_csr_graph(G):
+    """Accept either a CSRGraph or a networkx DiGraph"""
+    if isinstance(G, CSRGraph):
+        return G
+    return CSRGraph.from_networkx(G)
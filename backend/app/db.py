@@ -0,0 +1,238 @@
+"""
+SQLite connections for the API.
+
+Read routes share one long-lived read-only connection per worker thread, so
+each request starts with a warm page cache and a mapped database file instead
+of a fresh sqlite3.connect. The connection is attached to the app context
+through flask.g and handed back to its thread on teardown; it is closed
+when its thread ends or the worker process exits. Anything that
+writes (the not-in-db path, maintenance commands) gets its own read-write
+connection for the duration of the request, closed on teardown.
+
+Every connection times its statements. Statements slower than SLOW_QUERY_MS
+are printed, per-statement totals are kept for statement_stats(), and each
+response carries a Server-Timing header with that request's database time.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from pathlib import Path
+
+from flask import g
+
+# DATABASE_PATH overrides; otherwise check if we're running on Fly.io by
+# looking for the FLY_APP_NAME environment variable
+if os.getenv('DATABASE_PATH'):
+    DB_PATH = os.getenv('DATABASE_PATH')
+elif os.getenv('FLY_APP_NAME'):
+    DB_PATH = '/data/twitter.db'
+else:
+    # Local development path
+    DB_PATH = 'data/twitter.db'
+
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+
+READ_PRAGMAS = (
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+    "PRAGMA query_only = ON",
+    "PRAGMA temp_store = MEMORY",
+)
+
+WRITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+)
+
+_stats = {}
+_stats_lock = threading.Lock()
+_local = threading.local()
+# This process's pooled readers, for close_pooled_readers at exit
+_readers = weakref.WeakSet()
+_readers_lock = threading.Lock()
+# Readers inherited across a gunicorn fork belong to the parent
+os.register_at_fork(after_in_child=_readers.clear)
+
+
+def _statement_key(sql):
+    return re.sub(r'\s+', ' ', sql).strip()[:200]
+
+
+def _record(sql, elapsed_ms, executed):
+    key = _statement_key(sql)
+    with _stats_lock:
+        entry = _stats.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += executed
+        entry[1] += elapsed_ms
+        entry[2] = max(entry[2], elapsed_ms)
+    if elapsed_ms > SLOW_QUERY_MS:
+        print(f"\033[93mSlow query ({elapsed_ms:.1f} ms): {key}\033[0m")
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that charges execute and fetch time to the statement it ran"""
+
+    _sql = ''
+
+    def _timed(self, method, executed, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.connection.charge(self._sql, elapsed_ms, executed)
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        return self._timed(super().execute, True, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        return self._timed(super().executemany, True, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed(super().fetchone, False)
+
+    def fetchmany(self, size=None):
+        args = () if size is None else (size,)
+        return self._timed(super().fetchmany, False, *args)
+
+    def fetchall(self):
+        return self._timed(super().fetchall, False)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements run through TimedCursor"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reset_timing()
+
+    def reset_timing(self):
+        self.statements = 0
+        self.elapsed_ms = 0.0
+
+    def charge(self, sql, elapsed_ms, executed):
+        self.statements += executed
+        self.elapsed_ms += elapsed_ms
+        _record(sql, elapsed_ms, executed)
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def open_read_connection(db_path=DB_PATH, check_same_thread=True):
+    """Read-only connection with the read pragmas applied"""
+    uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+    db = sqlite3.connect(uri, uri=True, factory=TimedConnection,
+                         check_same_thread=check_same_thread)
+    db.row_factory = sqlite3.Row
+    for pragma in READ_PRAGMAS:
+        db.execute(pragma)
+    db.reset_timing()
+    return db
+
+
+def open_write_connection(db_path=DB_PATH):
+    """Read-write connection; also makes sure the database is in WAL mode"""
+    db = sqlite3.connect(db_path, factory=TimedConnection)
+    db.row_factory = sqlite3.Row
+    for pragma in WRITE_PRAGMAS:
+        db.execute(pragma)
+    db.reset_timing()
+    return db
+
+
+def _pooled_reader():
+    # One reader per thread per process; gunicorn forks workers after import
+    reader = getattr(_local, 'reader', None)
+    if reader is None or _local.pid != os.getpid():
+        # Only this thread queries it; close_pooled_readers closes it from another
+        reader = open_read_connection(check_same_thread=False)
+        with _readers_lock:
+            _readers.add(reader)
+        _local.reader = reader
+        _local.pid = os.getpid()
+    reader.reset_timing()
+    return reader
+
+
+def close_pooled_readers():
+    """Close every pooled reader of this process; runs at interpreter exit"""
+    with _readers_lock:
+        readers = list(_readers)
+        _readers.clear()
+    for reader in readers:
+        reader.close()
+
+
+atexit.register(close_pooled_readers)
+
+
+def get_db():
+    """Read-only connection for the current request"""
+    if 'db' not in g:
+        g.db = _pooled_reader()
+    return g.db
+
+
+def get_write_db():
+    """Read-write connection for the current request, closed on teardown"""
+    if 'write_db' not in g:
+        g.write_db = open_write_connection()
+    return g.write_db
+
+
+def statement_stats():
+    """
+    Per-statement timing for this process, slowest total first.
+
+    Returns:
+        list: dicts with sql, calls, total_ms, mean_ms and max_ms
+    """
+    with _stats_lock:
+        items = [(sql, *entry) for sql, entry in _stats.items()]
+    items.sort(key=lambda item: item[2], reverse=True)
+    return [{
+        'sql': sql,
+        'calls': calls,
+        'total_ms': round(total, 3),
+        'mean_ms': round(total / calls, 3),
+        'max_ms': round(longest, 3),
+    } for sql, calls, total, longest in items]
+
+
+def _add_server_timing(response):
+    parts = []
+    for name in ('db', 'write_db'):
+        conn = g.get(name)
+        if conn is not None:
+            parts.append(f'{name};dur={conn.elapsed_ms:.2f};desc="{conn.statements} statements"')
+    if parts:
+        response.headers.add('Server-Timing', ', '.join(parts))
+    return response
+
+
+def _release_connections(exc):
+    g.pop('db', None)  # stays open for the next request on this thread
+    write_db = g.pop('write_db', None)
+    if write_db is not None:
+        write_db.close()
+
+
+def init_app(app):
+    app.after_request(_add_server_timing)
+    app.teardown_appcontext(_release_connections)
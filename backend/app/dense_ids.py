@@ -0,0 +1,232 @@
+"""
+Dense integer ids for the daily job.
+
+The API tables key users by TEXT user_id, which is what gets exposed, so the
+daily job used to intern every id string from following_relationships into a
+Python dict just to get matrix indices. These two tables do that once and keep
+the result:
+
+    dense_user_ids   dense_id INTEGER PRIMARY KEY  <->  user_id TEXT UNIQUE
+    following_edges  (src, dst) dense ids, WITHOUT ROWID, in (src, dst) order
+
+Dense ids are handed out in insertion order and never reused, so they fit in
+int32 and stay stable from one day to the next. following_edges is already in
+CSR order: the graph build reads it as integer pairs straight into the index
+arrays, with no string hashing and no sort. Strings come back only when the
+job writes rows for the API (CSRGraph.node_ids).
+
+sync_dense_ids only maps relationships added since the last sync, using
+following_relationships' rowid as a watermark. That is only sound while rows
+are never deleted or changed: SQLite can hand a deleted row's rowid to the
+next INSERT, so a re-crawl (DELETE then INSERT) lands at or below the
+watermark. A trigger on following_relationships flags any DELETE or UPDATE,
+and the edge counts are compared after every incremental sync; either one
+turns the sync into a full rebuild of following_edges.
+"""
+import json
+import sqlite3
+
+from app.app_state import ensure_app_state_table
+
+DENSE_USER_IDS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS dense_user_ids (
+        dense_id INTEGER PRIMARY KEY,
+        user_id TEXT NOT NULL UNIQUE
+    )
+"""
+
+FOLLOWING_EDGES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS following_edges (
+        src INTEGER NOT NULL,
+        dst INTEGER NOT NULL,
+        PRIMARY KEY (src, dst)
+    ) WITHOUT ROWID
+"""
+
+# Rowid of the last following_relationships row mapped into following_edges
+EDGES_WATERMARK_KEY = 'dense_edges_rowid'
+# Set when following_relationships rows are deleted or changed after a sync
+EDGES_STALE_KEY = 'dense_edges_stale'
+
+EDGES_STALE_TRIGGERS = [f"""
+    CREATE TRIGGER IF NOT EXISTS following_relationships_{event.lower()}_dense
+    AFTER {event} ON following_relationships
+    BEGIN
+        INSERT INTO app_state (key, value) VALUES ('{EDGES_STALE_KEY}', 1)
+        ON CONFLICT(key) DO UPDATE SET value = 1;
+    END
+""" for event in ('DELETE', 'UPDATE')]
+
+MAP_NEW_IDS_SQL = """
+    INSERT OR IGNORE INTO dense_user_ids (user_id)
+    SELECT user_id FROM following_relationships {where}
+    UNION ALL
+    SELECT following_id FROM following_relationships {where}
+"""
+
+MAP_NEW_EDGES_SQL = """
+    INSERT OR IGNORE INTO following_edges (src, dst)
+    SELECT s.dense_id, d.dense_id
+    FROM following_relationships f
+    JOIN dense_user_ids s ON s.user_id = f.user_id
+    JOIN dense_user_ids d ON d.user_id = f.following_id
+    {where}
+    ORDER BY 1, 2
+"""
+
+LOOKUP_DENSE_IDS_SQL = """
+    SELECT d.user_id, d.dense_id
+    FROM json_each(?) j
+    JOIN dense_user_ids d ON d.user_id = j.value
+"""
+
+
+def ensure_dense_id_tables(db):
+    db.execute(DENSE_USER_IDS_SCHEMA)
+    db.execute(FOLLOWING_EDGES_SCHEMA)
+    for trigger in EDGES_STALE_TRIGGERS:
+        db.execute(trigger)
+
+
+def has_dense_ids(db):
+    """True once sync_dense_ids has run on this database"""
+    return db.execute("""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'table' AND name IN ('dense_user_ids', 'following_edges')
+    """).fetchone()[0] == 2
+
+
+def _relationships_have_rowid(db):
+    try:
+        db.execute("SELECT rowid FROM following_relationships LIMIT 1").fetchall()
+        return True
+    except sqlite3.OperationalError:
+        # WITHOUT ROWID table: nothing to keep a watermark on
+        return False
+
+
+def _save_watermark(db):
+    db.execute("""
+        INSERT INTO app_state (key, value)
+        VALUES (?, (SELECT COALESCE(MAX(rowid), 0) FROM following_relationships))
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (EDGES_WATERMARK_KEY,))
+
+
+def _app_state_value(db, key):
+    row = db.execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row and row[0] else 0
+
+
+def _edge_counts(db):
+    return db.execute("""
+        SELECT (SELECT COUNT(*) FROM following_relationships
+                WHERE user_id IS NOT NULL AND following_id IS NOT NULL),
+               (SELECT COUNT(*) FROM following_edges)
+    """).fetchone()
+
+
+def sync_dense_ids(db, full=False):
+    """
+    Give every user_id in users and following_relationships a dense id and
+    map new relationships into following_edges, in one transaction.
+
+    The sync is incremental unless full is set, relationships were deleted
+    or updated since the last sync, or following_edges ends up with a
+    different number of edges than following_relationships has rows.
+
+    Args:
+        full: Rebuild following_edges from scratch instead of mapping only
+            the relationships added since the last sync. Always done for a
+            WITHOUT ROWID following_relationships table.
+
+    Returns:
+        dict: full, ids, ids_added, edges, edges_added
+    """
+    ensure_app_state_table(db)
+    ensure_dense_id_tables(db)
+    db.commit()
+    incremental = not full and _relationships_have_rowid(db)
+
+    ids_before = db.execute("SELECT COUNT(*) FROM dense_user_ids").fetchone()[0]
+    edges_before = db.execute("SELECT COUNT(*) FROM following_edges").fetchone()[0]
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        # Users first, so a fresh mapping numbers them in the users table's order
+        db.execute("INSERT OR IGNORE INTO dense_user_ids (user_id) SELECT user_id FROM users")
+        if incremental and _app_state_value(db, EDGES_STALE_KEY):
+            print("Relationships were deleted or updated since the last sync; rebuilding following_edges")
+            incremental = False
+        if incremental:
+            watermark = _app_state_value(db, EDGES_WATERMARK_KEY)
+            db.execute(MAP_NEW_IDS_SQL.format(where='WHERE rowid > ?'), (watermark, watermark))
+            db.execute(MAP_NEW_EDGES_SQL.format(where='WHERE f.rowid > ?'), (watermark,))
+            relationships, edges = _edge_counts(db)
+            if relationships != edges:
+                print(f"following_edges has {edges} edges for {relationships} relationships; "
+                      f"rebuilding it")
+                incremental = False
+        if incremental:
+            _save_watermark(db)
+        else:
+            db.execute(MAP_NEW_IDS_SQL.format(where=''))
+            db.execute("DELETE FROM following_edges")
+            db.execute(MAP_NEW_EDGES_SQL.format(where=''))
+            if _relationships_have_rowid(db):
+                _save_watermark(db)
+        db.execute("DELETE FROM app_state WHERE key = ?", (EDGES_STALE_KEY,))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error syncing dense ids: {e}")
+        raise
+
+    ids = db.execute("SELECT COUNT(*) FROM dense_user_ids").fetchone()[0]
+    if ids >= 2 ** 31:
+        raise OverflowError(f"{ids} dense ids no longer fit in int32")
+    edges = db.execute("SELECT COUNT(*) FROM following_edges").fetchone()[0]
+    return {
+        'full': not incremental,
+        'ids': ids,
+        'ids_added': ids - ids_before,
+        'edges': edges,
+        'edges_added': edges - (edges_before if incremental else 0),
+    }
+
+
+def lookup_dense_ids(db, user_ids):
+    """
+    Dense ids of the given user_ids, in one query.
+
+    Returns:
+        dict: user_id -> dense id, for the user_ids that have one
+    """
+    return dict(db.execute(LOOKUP_DENSE_IDS_SQL, (json.dumps([str(u) for u in user_ids]),)))
+
+
+def table_sizes(db, tables):
+    """
+    Bytes used by each table and each of its indexes, from the dbstat
+    virtual table.
+
+    Returns:
+        dict: table -> {'table': bytes, 'indexes': bytes}, or None if this
+        SQLite build has no dbstat
+    """
+    sizes = {}
+    try:
+        for table in tables:
+            row = db.execute("""
+                SELECT
+                    COALESCE(SUM(CASE WHEN s.name = ? THEN s.pgsize END), 0),
+                    COALESCE(SUM(CASE WHEN s.name != ? THEN s.pgsize END), 0)
+                FROM dbstat s
+                JOIN sqlite_master m ON m.name = s.name
+                WHERE m.tbl_name = ?
+            """, (table, table, table)).fetchone()
+            sizes[table] = {'table': row[0], 'indexes': row[1]}
+    except sqlite3.OperationalError:
+        return None
+    return sizes
+
@@ -1,116 +1,403 @@
-import networkx as nx
 import numpy as np
 import sqlite3
 from datetime import datetime
-import pandas as pd
+from itertools import repeat
 from scipy import stats
 from scipy.sparse import csr_matrix
-from tqdm import tqdm
+from app.adjacency_index import adjacency_dir_for, write_adjacency_index
+from app.app_state import bump_metrics_epoch, ensure_app_state_table
+from app.bulk_write import staging_database, tune_for_bulk_write
+from app.csr_graph import EDGE_CHUNK_SIZE, CSRGraph, as_csr_graph
+from app.dense_ids import sync_dense_ids
+from app.latest_metrics import (
+    SAVE_LATEST_METRICS_SQL, add_metrics_columns, ensure_latest_metrics_table,
+)
+from app.niches import ensure_niche_tables
+from app.percentiles import ensure_percentile_sketch_table, save_percentile_sketch
+from app.snapshots import snapshot_dir_for, write_snapshot
+from app.pagerank import (
+    batched_power_iteration, estimate_cold_iterations, incremental_pagerank,
+    load_previous_scores, power_iteration, warm_start_scores,
+)
 
-def build_graph():
-    """Build NetworkX graph from database"""
+def build_graph(db_path='data/twitter.db', chunk_size=EDGE_CHUNK_SIZE, dense_ids=True):
+    """
+    Build CSR graph from database, streaming edges chunk_size rows at a time
+
+    Args:
+        dense_ids: Sync dense_user_ids / following_edges and load the graph
+            from those integer tables, instead of interning the user_id
+            strings of following_relationships
+    """
     print("Building graph from database...")
     
-    conn = sqlite3.connect('data/twitter.db')
-    
-    # Load users and their attributes
-    users_df = pd.read_sql_query("""
-        SELECT user_id, username, follower_count, following_count,
-               is_verified, profile_pic_url
-        FROM users
-    """, conn)
-    
-    # Load relationships
-    relationships_df = pd.read_sql_query("""
-        SELECT user_id, following_id
-        FROM following_relationships
-    """, conn)
-    
-    conn.close()
-    
-    # Create graph
-    G = nx.DiGraph()
-    
-    # Add nodes with attributes
-    for _, user in users_df.iterrows():
-        G.add_node(user['user_id'], **{
-            'username': user['username'],
-            'follower_count': user['follower_count'],
-            'following_count': user['following_count'],
-            'is_verified': user['is_verified'],
-            'profile_pic_url': user['profile_pic_url']
-        })
-    
-    # Add edges
-    G.add_edges_from(relationships_df.values)
+    conn = sqlite3.connect(db_path)
+    try:
+        if dense_ids:
+            synced = sync_dense_ids(conn)
+            print(f"Dense ids synced: {synced['ids_added']} new ids, {synced['edges_added']} new edges")
+            G = CSRGraph.from_dense_ids(conn, chunk_size=chunk_size)
+        else:
+            G = CSRGraph.from_sqlite(conn, chunk_size=chunk_size)
+    finally:
+        conn.close()
     
     print(f"Graph built with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
     return G
 
-def calculate_pagerank(G, alpha=0.15, max_iter=1000, tol=1e-6, seed_nodes=None):
-    """Calculate PageRank scores using sparse matrix operations."""
-    print("Preparing matrices...")
-    
-    # Get adjacency matrix in sparse format
-    A = nx.adjacency_matrix(G)
+def personalization_vector(G, seed_indices):
+    """
+    Teleport vector for personalized PageRank, scaled to [0, 1].
+
+    Non-seed nodes get log((followers + 250) / (following + 250)) clipped to
+    [0, 5], divided by following / 2000 for accounts following more than 3000.
+    Seed nodes get an equal share of a weight of 5. Nodes without a users row
+    count as 1 follower / 1 following, and NULL counts contribute 0.
+
+    Args:
+        G: CSRGraph
+        seed_indices: Node indices of the seed accounts
+    """
+    followers = np.where(G.has_profile, G.follower_count, 1)
+    following = np.where(G.has_profile, G.following_count, 1)
+
+    with np.errstate(invalid='ignore'):
+        p = np.clip(np.log((followers + 250) / (following + 250)), 0, 5)
+        p = np.nan_to_num(p, nan=0.0)
+        penalty = np.where(following > 3000, following / 2000, 1)
+    p /= penalty
+
+    if len(seed_indices):
+        p[seed_indices] = 5 / len(seed_indices)  # Much higher weight for seed nodes
+
+    # Scale to [0,1] range
+    return (p - p.min()) / (p.max() - p.min())
+
+
+def transition_matrix(A):
+    """Column-stochastic M = A^T D^-1, with dangling nodes left as zero columns"""
     n = A.shape[0]
-    
-    # Create node mapping
-    node_list = list(G.nodes())
-    node_idx = {node: i for i, node in enumerate(node_list)}
-    
     # Normalize adjacency matrix by out-degree
     out_degrees = np.array(A.sum(axis=1)).flatten()
     out_degrees[out_degrees == 0] = 1  # Avoid division by zero
     D_inv = csr_matrix((1 / out_degrees, (range(n), range(n))))
-    M = A.T.dot(D_inv)
+    return A.T.dot(D_inv).tocsr()
+
+
+def calculate_pagerank(G, alpha=0.15, max_iter=1000, tol=1e-6, seed_nodes=None,
+                       warm_start=False, incremental=False, db_path='data/twitter.db',
+                       norm='l1', check_every=1, dtype=np.float64, workers=1,
+                       return_diagnostics=False, as_array=False):
+    """
+    Calculate PageRank scores using sparse matrix operations.
+
+    Args:
+        warm_start: Start the power iteration from the latest stored scores
+            instead of the uniform vector
+        incremental: Warm start, then only push residuals around nodes whose
+            score is still changing instead of sweeping the whole graph
+        db_path: Database to read the stored scores from
+        norm: Convergence check, 'l1' or 'linf'
+        check_every: Evaluate convergence every k iterations
+        dtype: np.float64, or np.float32 for the power iteration
+        workers: Threads used for the sparse mat-vec in the power iteration
+        return_diagnostics: Also return a dict describing the run
+        as_array: Return scores as an array in G's node order instead of a
+            user_id dict; save_daily_metrics and save_top_followers take both
+
+    Returns:
+        dict: user_id -> score, or (scores, diagnostics) with return_diagnostics
+    """
+    print("Preparing matrices...")
+    G = as_csr_graph(G)
     
-    # Initialize personalization vector
-    p = np.ones(n) / n
-    if seed_nodes:
-        seed_indices = [node_idx[node] for node in seed_nodes if node in node_idx]
-        p = np.zeros(n)
-        p[seed_indices] = 5 / len(seed_indices)  # Much higher weight for seed nodes
+    # Get adjacency matrix in sparse format
+    A = G.adjacency()
+    n = A.shape[0]
     
-    # Adjust personalization with follower/following ratio
-    for i, node in enumerate(node_list):
-        data = G.nodes[node]
-        if not (seed_nodes and node in seed_nodes):
-            followers = data.get('follower_count', 1)
-            following = data.get('following_count', 1)
-            p[i] = min(max(0, np.log((followers + 250) / (following + 250))), 5)
+    M = transition_matrix(A)
     
-            if following > 3000:
-                penalty_factor = following / 2000
-                p[i] /= penalty_factor
+    # Initialize personalization vector
+    seed_indices = G.index_of(seed_nodes or [])
+    p = personalization_vector(G, seed_indices)
 
-    # Scale to [0,1] range
-    p = (p - p.min()) / (p.max() - p.min())
-
-    # Power iteration
-    scores = np.ones(n) / n
-    for iteration in tqdm(range(max_iter)):
-        prev_scores = scores.copy()
-        scores = (1 - alpha) * M.dot(scores) + alpha * p
-        
-        # Check convergence
-        err = np.abs(scores - prev_scores).sum()
-        if err < tol:
-            print(f"Converged after {iteration + 1} iterations")
-            break
+    diagnostics = {'mode': 'cold', 'nodes': n, 'edges': int(A.nnz)}
+    scores = None
+    if warm_start or incremental:
+        previous = load_previous_scores(G, db_path)
+        known = int((~np.isnan(previous)).sum())
+        diagnostics['warm_start_nodes'] = known
+        if known:
+            scores = warm_start_scores(previous, M, p, alpha)
+            diagnostics['mode'] = 'incremental' if incremental else 'warm'
+        else:
+            incremental = False
+
+    if incremental:
+        scores, rounds, edges_touched = incremental_pagerank(A, scores, p, alpha, tol, max_iter)
+        iterations = edges_touched / max(A.nnz, 1)
+        diagnostics.update({
+            'rounds': rounds,
+            'edges_touched': int(edges_touched),
+            'iterations': iterations,
+            'converged': rounds < max_iter,
+        })
+    else:
+        result = power_iteration(M, p, alpha, x0=scores, max_iter=max_iter, tol=tol,
+                                 norm=norm, check_every=check_every, dtype=dtype,
+                                 workers=workers)
+        scores = result.pop('scores')
+        iterations = result['iterations']
+        diagnostics.update(result)
+
+    if diagnostics['mode'] != 'cold':
+        cold_iterations = estimate_cold_iterations(M, p, alpha, tol)
+        diagnostics['estimated_cold_iterations'] = cold_iterations
+        diagnostics['iterations_saved'] = max(cold_iterations - iterations, 0)
+
+    print(f"PageRank ({diagnostics['mode']}) finished after {iterations:.0f} iterations, "
+          f"converged: {diagnostics['converged']}")
 
     scores -= alpha * p * 1.0  # subtract the boost from followers
     
-    # Convert back to dictionary
-    score_dict = {node: float(score) for node, score in zip(node_list, scores)}
+    if not as_array:
+        # Convert back to dictionary
+        scores = {node: float(score) for node, score in zip(G.node_ids, scores)}
     
-    return score_dict
+    if return_diagnostics:
+        return scores, diagnostics
+    return scores
+
+
+def calculate_niche_pageranks(G, niches, alpha=0.15, max_iter=1000, tol=1e-6,
+                              dtype=np.float64):
+    """
+    Personalized PageRank for several niches in one pass over the graph.
+
+    Args:
+        niches: Mapping of niche key -> list of seed user_ids
+
+    Returns:
+        dict: niche key -> score array in G's node order
+    """
+    G = as_csr_graph(G)
+    keys = list(niches)
+    print(f"Calculating PageRank for {len(keys)} niches: {', '.join(keys)}")
+
+    M = transition_matrix(G.adjacency())
+    P = np.empty((G.n, len(keys)))
+    for column, key in enumerate(keys):
+        P[:, column] = personalization_vector(G, G.index_of(niches[key]))
+
+    result = batched_power_iteration(M, P, alpha, max_iter=max_iter, tol=tol, dtype=dtype)
+    print(f"Niche PageRank finished after {result['iterations']} iterations, "
+          f"converged: {result['converged']}")
+
+    # subtract the boost from followers, as for the main score
+    scores = result['scores'] - alpha * P
+    return {key: scores[:, column] for column, key in enumerate(keys)}
+
+
+def save_niche_metrics(niche_scores, G, db_path='data/twitter.db'):
+    """Save each niche's scores and percentiles for today under its niche key"""
+    G = as_csr_graph(G)
+    today = datetime.now().date()
+    user_ids = G.node_ids.tolist()
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    ensure_niche_tables(c)
+    ensure_app_state_table(c)
+
+    c.execute('BEGIN TRANSACTION')
+    try:
+        for niche, scores in niche_scores.items():
+            print(f"Saving metrics for niche {niche}...")
+            sorted_scores = np.sort(scores)
+            percentiles = np.searchsorted(sorted_scores, scores) / len(scores) * 100
+            rows = [(niche, user_id, today, score, pct)
+                    for user_id, score, pct in zip(user_ids, scores.tolist(), percentiles.tolist())]
+
+            c.executemany('''
+                INSERT OR REPLACE INTO user_niche_daily_metrics
+                (niche, user_id, date, pagerank_score, pagerank_percentile)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            c.execute('DELETE FROM user_niche_latest_metrics WHERE niche = ?', (niche,))
+            c.executemany('''
+                INSERT INTO user_niche_latest_metrics
+                (niche, user_id, date, pagerank_score, pagerank_percentile)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+        bump_metrics_epoch(c)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error saving niche metrics: {e}")
+        raise
+    finally:
+        conn.close()
+
+    print(f"Successfully saved niche metrics for {today}")
+
+
+def save_adjacency_index(scores, G, db_path='data/twitter.db'):
+    """
+    Write the memory-mapped follower graph the /network endpoints read
+
+    Args:
+        scores: user_id -> score dict, or a score array in G's node order
+    """
+    G = as_csr_graph(G)
+    if isinstance(scores, dict):
+        scores = np.array([scores[node] for node in G.node_ids])
+    today = datetime.now().date()
+    print("Writing adjacency index...")
+    path = write_adjacency_index(today, G, scores, adjacency_dir_for(db_path))
+    print(f"Adjacency index written to {path}")
+
+
+def _count_column(values, has_profile):
+    """
+    Attribute column as Python ints for executemany.
+
+    NULLs from the users table become None and nodes without a users row get 0.
+    """
+    missing = np.isnan(values) & has_profile
+    column = np.where(has_profile, np.nan_to_num(values), 0).astype(np.int64).astype(object)
+    column[missing] = None
+    return column
 
 
-def save_daily_metrics(scores, G):
-    """Save daily metrics including PageRank scores and graph metrics"""
+def metrics_columns(scores, G):
+    """
+    Column arrays for one day of user_daily_metrics rows.
+
+    Args:
+        scores: user_id -> score dict, or a score array in G's node order
+
+    Returns:
+        dict: user_id, pagerank_score, pagerank_percentile, follower_count,
+        following_count, inbound_edges, outbound_edges, reciprocal_edges
+    """
+    if isinstance(scores, dict):
+        user_ids = np.array(list(scores), dtype=object)
+        score_array = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+        idx = np.fromiter((G.node_index[user_id] for user_id in scores), dtype=np.int64,
+                          count=len(scores))
+    else:
+        user_ids = G.node_ids
+        score_array = np.asarray(scores, dtype=np.float64)
+        idx = np.arange(G.n)
+
+    # Percentile = share of scores strictly below, in one O(n log n) pass
+    sorted_scores = np.sort(score_array)
+    percentiles = np.searchsorted(sorted_scores, score_array) / len(sorted_scores) * 100
+
+    return {
+        'user_id': user_ids,
+        'pagerank_score': score_array,
+        'pagerank_percentile': percentiles,
+        'follower_count': _count_column(G.follower_count, G.has_profile)[idx],
+        'following_count': _count_column(G.following_count, G.has_profile)[idx],
+        'inbound_edges': G.in_degree()[idx],
+        'outbound_edges': G.out_degree()[idx],
+        'reciprocal_edges': G.reciprocal_degree()[idx],
+    }
+
+
+def _metrics_rows(columns, today, start, end):
+    """Rows [start, end) of the metrics columns as insert tuples"""
+    return zip(
+        columns['user_id'][start:end].tolist(),
+        repeat(today, end - start),
+        columns['pagerank_score'][start:end].tolist(),
+        columns['pagerank_percentile'][start:end].tolist(),
+        columns['follower_count'][start:end].tolist(),
+        columns['following_count'][start:end].tolist(),
+        columns['inbound_edges'][start:end].tolist(),
+        columns['outbound_edges'][start:end].tolist(),
+        columns['reciprocal_edges'][start:end].tolist(),
+    )
+
+
+def _bulk_save_daily_metrics(conn, columns, today, db_path, chunk_size):
+    """
+    Load the day into a scratch database, then merge it in one transaction.
+
+    Batches commit to the scratch file only, so the live tables change in a
+    single short write at the end.
+    """
+    tune_for_bulk_write(conn)
+    total = len(columns['user_id'])
+
+    with staging_database(conn, db_path) as staging:
+        conn.execute(f'''
+            CREATE TABLE {staging}.daily_metrics_load (
+                user_id TEXT,
+                date DATE,
+                pagerank_score REAL,
+                pagerank_percentile REAL,
+                follower_count INTEGER,
+                following_count INTEGER,
+                inbound_edges INTEGER,
+                outbound_edges INTEGER,
+                reciprocal_edges INTEGER
+            )
+        ''')
+
+        for i in range(0, total, chunk_size):
+            print(f"Staging chunk {i//chunk_size + 1}...")
+            conn.executemany(f'''
+                INSERT INTO {staging}.daily_metrics_load
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', _metrics_rows(columns, today, i, min(i + chunk_size, total)))
+            conn.commit()
+
+        print("Merging staged metrics...")
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(f'''
+                INSERT OR REPLACE INTO user_daily_metrics
+                (user_id, date, pagerank_score, pagerank_percentile,
+                follower_count, following_count, inbound_edges, outbound_edges, reciprocal_edges)
+                SELECT * FROM {staging}.daily_metrics_load
+                ORDER BY user_id
+            ''')
+            conn.execute('DELETE FROM user_latest_metrics')
+            save_percentile_sketch(conn, today, columns['pagerank_score'])
+            conn.execute(f'''
+                INSERT INTO user_latest_metrics
+                (user_id, date, pagerank_score, pagerank_percentile,
+                follower_count, following_count, inbound_edges, outbound_edges, reciprocal_edges)
+                SELECT * FROM {staging}.daily_metrics_load
+                ORDER BY user_id
+            ''')
+            bump_metrics_epoch(conn)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error during merge: {e}")
+            raise
+
+
+def _save_snapshot(today, columns, db_path):
+    print("Writing columnar snapshot...")
+    path = write_snapshot(today, columns, snapshot_dir_for(db_path))
+    print(f"Snapshot written to {path}")
+
+
+def save_daily_metrics(scores, G, db_path='data/twitter.db', bulk=False):
+    """
+    Save daily metrics including PageRank scores and graph metrics
+
+    Args:
+        bulk: Stage the rows in a scratch database and merge them in one
+            transaction on a WAL-mode database, so API readers are not
+            blocked while the day is written
+    """
     print("Starting to save daily metrics...")
-    conn = sqlite3.connect('data/twitter.db')
+    conn = sqlite3.connect(db_path)
     c = conn.cursor()
     
     c.execute('''
@@ -123,73 +410,59 @@ def save_daily_metrics(scores, G):
             following_count INTEGER,
             inbound_edges INTEGER,
             outbound_edges INTEGER,
+            reciprocal_edges INTEGER,
             PRIMARY KEY (user_id, date)
         )
     ''')
+    add_metrics_columns(c, 'user_daily_metrics')
+    ensure_latest_metrics_table(c)
+    ensure_app_state_table(c)
+    ensure_percentile_sketch_table(c)
     
     today = datetime.now().date()
     
-    print("Calculating in/out degrees...")
-    in_degrees = dict(G.in_degree())
-    out_degrees = dict(G.out_degree())
-    
-    print("Converting scores to percentiles...")
-    # Convert scores to numpy array for faster operations
-    df = pd.DataFrame(list(scores.items()), columns=['user_id', 'pagerank_score'])
-    
-    # Calculate percentiles using numpy - O(n log n) operation
-    sorted_scores = np.sort(df['pagerank_score'].values)
-    score_to_percentile = {}
-    
-    print("Creating percentile lookup...")
-    # Create a lookup dictionary for score -> percentile
-    for score in df['pagerank_score'].unique():
-        # searchsorted is O(log n)
-        position = np.searchsorted(sorted_scores, score)
-        percentile = (position / len(sorted_scores)) * 100
-        score_to_percentile[score] = percentile
+    G = as_csr_graph(G)
+
+    print("Calculating percentiles and degrees...")
+    columns = metrics_columns(scores, G)
+    total = len(columns['user_id'])
     
-    print("Preparing data for insertion...")
-    data = []
     # Process in chunks to reduce memory usage
     chunk_size = 100000
+
+    if bulk:
+        _bulk_save_daily_metrics(conn, columns, today, db_path, chunk_size)
+        print(f"Successfully saved metrics for {today}")
+        conn.close()
+        _save_snapshot(today, columns, db_path)
+        return
     
-    for i in range(0, len(df), chunk_size):
-        chunk = df.iloc[i:i + chunk_size]
-        
-        for _, row in chunk.iterrows():
-            user_id = row['user_id']
-            score = row['pagerank_score']
-            node_data = G.nodes[user_id]
-            
-            data.append((
-                user_id,
-                today,
-                float(score),
-                float(score_to_percentile[score]),
-                node_data.get('follower_count', 0),
-                node_data.get('following_count', 0),
-                in_degrees.get(user_id, 0),
-                out_degrees.get(user_id, 0)
-            ))
-            
-        # Insert the chunk immediately to free up memory
-        print(f"Inserting chunk {i//chunk_size + 1}...")
-        c.execute('BEGIN TRANSACTION')
-        try:
+    # History rows and the latest-metrics snapshot are written in one
+    # transaction so readers never see them disagree
+    c.execute('BEGIN TRANSACTION')
+    try:
+        c.execute('DELETE FROM user_latest_metrics')
+
+        for i in range(0, total, chunk_size):
+            data = list(_metrics_rows(columns, today, i, min(i + chunk_size, total)))
+                
+            print(f"Inserting chunk {i//chunk_size + 1}...")
             c.executemany('''
                 INSERT OR REPLACE INTO user_daily_metrics 
                 (user_id, date, pagerank_score, pagerank_percentile, 
-                follower_count, following_count, inbound_edges, outbound_edges)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                follower_count, following_count, inbound_edges, outbound_edges, reciprocal_edges)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', data)
-            conn.commit()
-            # Clear data after successful insertion
-            data = []
-        except Exception as e:
-            conn.rollback()
-            print(f"Error during insertion: {e}")
-            raise
+            c.executemany(SAVE_LATEST_METRICS_SQL, data)
+
+        save_percentile_sketch(c, today, columns['pagerank_score'])
+        bump_metrics_epoch(c)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error during insertion: {e}")
+        raise
     
     print(f"Successfully saved metrics for {today}")
-    conn.close()
\ No newline at end of file
+    conn.close()
+    _save_snapshot(today, columns, db_path)
@@ -0,0 +1,211 @@
+"""
+Background analysis of users that are not in the database yet.
+
+Analyzing a new user means a profile fetch, up to 25 follower pages (with
+429 backoff) and a couple of writes, which can take longer than the gunicorn
+timeout. Holding a request thread for that long ties up one of only four
+threads. So /api/user/<id>?not_in_database=true only enqueues a job and
+returns its id. Clients then poll /api/jobs/<id> or follow
+/api/jobs/<id>/events.
+
+Jobs live in the analysis_jobs table, so any worker can report on any job.
+A partial unique index allows only one queued or running job per
+identifier, which deduplicates concurrent requests across workers. Each
+worker runs its jobs on a small thread pool (ANALYSIS_WORKERS), and refuses
+new jobs once ANALYSIS_MAX_PENDING are queued or running in that worker. A
+running job refreshes updated_at as it makes progress. A job that has not
+moved for ANALYSIS_JOB_STALE_SECONDS (its worker died) no longer blocks a
+new one for the same identifier.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.db import open_write_connection
+
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 2))
+ANALYSIS_MAX_PENDING = int(os.getenv('ANALYSIS_MAX_PENDING', 20))
+ANALYSIS_JOB_STALE_SECONDS = float(os.getenv('ANALYSIS_JOB_STALE_SECONDS', 300))
+ANALYSIS_JOB_RETENTION_DAYS = float(os.getenv('ANALYSIS_JOB_RETENTION_DAYS', 7))
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('done', 'failed')
+
+ANALYSIS_JOBS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS analysis_jobs (
+        job_id TEXT PRIMARY KEY,
+        identifier TEXT NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT,
+        followers_fetched INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+"""
+
+ANALYSIS_JOBS_ACTIVE_INDEX = """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_analysis_jobs_active
+    ON analysis_jobs(identifier) WHERE status IN ('queued', 'running')
+"""
+
+JOB_SQL = "SELECT * FROM analysis_jobs WHERE job_id = ?"
+
+ACTIVE_JOB_SQL = """
+    SELECT * FROM analysis_jobs
+    WHERE identifier = ? AND status IN ('queued', 'running')
+"""
+
+
+class JobQueueFull(Exception):
+    """This worker already has ANALYSIS_MAX_PENDING jobs queued or running"""
+
+
+def ensure_jobs_table(db):
+    db.execute(ANALYSIS_JOBS_SCHEMA)
+    db.execute(ANALYSIS_JOBS_ACTIVE_INDEX)
+
+
+def job_to_dict(row):
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def get_job(db, job_id):
+    """The job as a dict, or None (also on databases without the jobs table)"""
+    try:
+        row = db.execute(JOB_SQL, (job_id,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return job_to_dict(row) if row else None
+
+
+def update_job(db, job_id, **fields):
+    """Set columns on a job and refresh its updated_at; commits"""
+    fields['updated_at'] = time.time()
+    if 'result' in fields:
+        fields['result'] = json.dumps(fields['result'])
+    assignments = ', '.join(f"{column} = ?" for column in fields)
+    db.execute(f"UPDATE analysis_jobs SET {assignments} WHERE job_id = ?",
+               (*fields.values(), job_id))
+    db.commit()
+
+
+class AnalysisQueue:
+    """Per-process pool that runs analysis jobs; the pool starts on first use"""
+
+    def __init__(self, workers=ANALYSIS_WORKERS, max_pending=ANALYSIS_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self.pending = 0
+
+    def _pool(self):
+        # gunicorn forks workers after import; threads do not survive the fork
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='analysis')
+            self._pid = os.getpid()
+            self.pending = 0
+        return self._executor
+
+    def enqueue(self, db, identifier):
+        """
+        Start analyzing identifier, or join the job already doing it.
+
+        Args:
+            db: Read-write connection; the job row is committed on it
+            identifier: Username or user_id, as requested
+
+        Returns:
+            tuple: (job dict, True if this call created the job)
+
+        Raises:
+            JobQueueFull: This worker is at ANALYSIS_MAX_PENDING jobs
+        """
+        key = str(identifier).lower()
+        now = time.time()
+        ensure_jobs_table(db)
+        reserved = False
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            active = db.execute(ACTIVE_JOB_SQL, (key,)).fetchone()
+            if active and active['updated_at'] >= now - ANALYSIS_JOB_STALE_SECONDS:
+                db.rollback()
+                return job_to_dict(active), False
+            if active:
+                db.execute("""
+                    UPDATE analysis_jobs SET status = 'failed', error = ?, updated_at = ?
+                    WHERE job_id = ?
+                """, ('Worker stopped responding', now, active['job_id']))
+
+            with self._lock:
+                self._pool()
+                if self.pending >= self.max_pending:
+                    raise JobQueueFull(f"{self.pending} analysis jobs already pending")
+                self.pending += 1
+                reserved = True
+
+            job_id = uuid.uuid4().hex
+            db.execute("""
+                INSERT INTO analysis_jobs (job_id, identifier, status, stage, created_at, updated_at)
+                VALUES (?, ?, 'queued', 'queued', ?, ?)
+            """, (job_id, key, now, now))
+            db.execute("DELETE FROM analysis_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                       (now - ANALYSIS_JOB_RETENTION_DAYS * 86400,))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            # The job row was never committed, so _run will not free the slot
+            if reserved:
+                self._release()
+            raise
+
+        print(f"\033[94mQueued analysis job {job_id} for {identifier}\033[0m")
+        try:
+            self._executor.submit(self._run, job_id, identifier)
+        except BaseException as e:
+            self._release()
+            update_job(db, job_id, status='failed', error=str(e))
+            raise
+        return get_job(db, job_id), True
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+
+    def _run(self, job_id, identifier):
+        from app.routes.handle_user_not_in_db import analyze_new_user
+
+        jobs_db = open_write_connection()
+        db = open_write_connection()
+        try:
+            update_job(jobs_db, job_id, status='running', stage='fetching_profile')
+
+            def progress(stage, followers_fetched=0):
+                update_job(jobs_db, job_id, stage=stage, followers_fetched=followers_fetched)
+
+            result = analyze_new_user(identifier, db, progress)
+            update_job(jobs_db, job_id, status='done', stage='done', result=result)
+            print(f"\033[92mAnalysis job {job_id} for {identifier} finished\033[0m")
+        except Exception as e:
+            print(f"\033[91mAnalysis job {job_id} for {identifier} failed: {str(e)}\033[0m")
+            db.rollback()
+            update_job(jobs_db, job_id, status='failed', error=str(e))
+        finally:
+            db.close()
+            jobs_db.close()
+            self._release()
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self.pending, 'max_pending': self.max_pending}
+
+
+analysis_queue = AnalysisQueue()
@@ -0,0 +1,114 @@
+"""
+Snapshot of each user's most recent daily metrics.
+
+user_daily_metrics keeps one row per user per day, so "latest metrics" used to
+mean a MAX(date) subquery over the whole history on every request.
+user_latest_metrics holds only the rows of the latest date, keyed by user_id,
+and is rewritten by the daily job in the same transaction as the history rows.
+
+The daily job also stores each user's reciprocal follow count there, so the
+profile page no longer self-joins following_relationships per request.
+"""
+import sqlite3
+
+from app.app_state import bump_metrics_epoch, ensure_app_state_table
+from app.queries import RECIPROCAL_COUNT_SQL, STORED_RECIPROCAL_SQL
+
+LATEST_METRICS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_latest_metrics (
+        user_id TEXT PRIMARY KEY,
+        date DATE,
+        pagerank_score REAL,
+        pagerank_percentile REAL,
+        follower_count INTEGER,
+        following_count INTEGER,
+        inbound_edges INTEGER,
+        outbound_edges INTEGER,
+        reciprocal_edges INTEGER
+    )
+"""
+
+# Added to the metrics tables after they were first created; see add_metrics_columns
+ADDED_METRICS_COLUMNS = (
+    ('reciprocal_edges', 'INTEGER'),
+)
+
+UPSERT_LATEST_METRICS_SQL = """
+    INSERT OR REPLACE INTO user_latest_metrics
+    (user_id, date, pagerank_score, pagerank_percentile,
+    follower_count, following_count, inbound_edges, outbound_edges)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# The daily job's version, with the columns only the full graph provides.
+# Users added through the not-in-db path use UPSERT_LATEST_METRICS_SQL and get
+# NULL there.
+SAVE_LATEST_METRICS_SQL = """
+    INSERT OR REPLACE INTO user_latest_metrics
+    (user_id, date, pagerank_score, pagerank_percentile,
+    follower_count, following_count, inbound_edges, outbound_edges, reciprocal_edges)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def add_metrics_columns(db, table):
+    """ALTER TABLE in any ADDED_METRICS_COLUMNS that table was created without"""
+    existing = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+    for name, declaration in ADDED_METRICS_COLUMNS:
+        if existing and name not in existing:
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+
+def ensure_latest_metrics_table(db):
+    db.execute(LATEST_METRICS_SCHEMA)
+    add_metrics_columns(db, 'user_latest_metrics')
+
+
+def backfill_latest_metrics(db):
+    """
+    Rebuild user_latest_metrics from the latest date in user_daily_metrics.
+
+    Returns:
+        int: Number of rows written
+    """
+    ensure_latest_metrics_table(db)
+    add_metrics_columns(db, 'user_daily_metrics')
+    ensure_app_state_table(db)
+    db.execute('BEGIN TRANSACTION')
+    try:
+        db.execute('DELETE FROM user_latest_metrics')
+        db.execute("""
+            INSERT INTO user_latest_metrics
+            (user_id, date, pagerank_score, pagerank_percentile,
+            follower_count, following_count, inbound_edges, outbound_edges, reciprocal_edges)
+            SELECT user_id, date, pagerank_score, pagerank_percentile,
+                   follower_count, following_count, inbound_edges, outbound_edges,
+                   reciprocal_edges
+            FROM user_daily_metrics
+            WHERE date = (SELECT MAX(date) FROM user_daily_metrics)
+        """)
+        bump_metrics_epoch(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return db.execute('SELECT COUNT(*) FROM user_latest_metrics').fetchone()[0]
+
+
+def get_reciprocal_connections(db, user_id):
+    """
+    Number of accounts that follow the user and that the user follows back.
+
+    Reads the count stored by the daily job. Users added since then (stored
+    NULL or no metrics row) and databases the job has not run on since the
+    column was added get the live self-join instead.
+    """
+    try:
+        row = db.execute(STORED_RECIPROCAL_SQL, (user_id,)).fetchone()
+    except sqlite3.OperationalError:
+        # reciprocal_edges column not added yet
+        row = None
+    if row is not None and row[0] is not None:
+        return row[0]
+    return db.execute(RECIPROCAL_COUNT_SQL, (user_id, user_id)).fetchone()['count']
@@ -0,0 +1,79 @@
+"""
+Per-niche PageRank scores.
+
+Each niche (e.g. "solana", "ethereum") has its own seed set and therefore its
+own personalized PageRank. Scores and percentiles are stored per niche key;
+follower counts and degrees do not depend on the niche and stay in the main
+metrics tables.
+"""
+
+NICHE_METRICS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_niche_daily_metrics (
+        niche TEXT,
+        user_id TEXT,
+        date DATE,
+        pagerank_score REAL,
+        pagerank_percentile REAL,
+        PRIMARY KEY (niche, user_id, date)
+    )
+"""
+
+NICHE_LATEST_METRICS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_niche_latest_metrics (
+        niche TEXT,
+        user_id TEXT,
+        date DATE,
+        pagerank_score REAL,
+        pagerank_percentile REAL,
+        PRIMARY KEY (niche, user_id)
+    )
+"""
+
+LATEST_METRICS_JOIN = "LEFT JOIN user_latest_metrics m ON m.user_id = u.user_id"
+
+NICHE_METRICS_JOIN = (
+    "LEFT JOIN user_niche_latest_metrics m ON m.niche = :niche AND m.user_id = u.user_id"
+)
+
+
+def metrics_join(niche=None):
+    """
+    JOIN clause exposing the latest pagerank columns as `m` for users `u`.
+
+    Niche joins bind the niche key as the :niche named parameter.
+    """
+    return NICHE_METRICS_JOIN if niche else LATEST_METRICS_JOIN
+
+
+def ensure_niche_tables(db):
+    db.execute(NICHE_METRICS_SCHEMA)
+    db.execute(NICHE_LATEST_METRICS_SCHEMA)
+
+
+def niche_exists(db, niche):
+    """Check whether the daily job has stored scores for this niche"""
+    try:
+        return db.execute(
+            "SELECT 1 FROM user_niche_latest_metrics WHERE niche = ? LIMIT 1",
+            (niche,)
+        ).fetchone() is not None
+    except Exception:
+        # Niche tables not created yet
+        return False
+
+
+def get_niche_metrics(db, niche, user_id):
+    """Latest pagerank score and percentile of a user within a niche"""
+    return db.execute("""
+        SELECT pagerank_score, pagerank_percentile, date
+        FROM user_niche_latest_metrics
+        WHERE niche = ? AND user_id = ?
+    """, (niche, user_id)).fetchone()
+
+
+def list_niches(db):
+    try:
+        return [row[0] for row in db.execute(
+            "SELECT DISTINCT niche FROM user_niche_latest_metrics ORDER BY niche")]
+    except Exception:
+        return []
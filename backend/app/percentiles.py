@@ -0,0 +1,162 @@
+"""
+Pagerank percentile sketches, one per metrics date.
+
+Users scored outside the daily job (the not-in-db path) still need a
+percentile against that day's score distribution. save_daily_metrics stores a
+fixed grid of SKETCH_POINTS quantiles of the day's scores (8 KB). The
+estimator loads each date's sketch once and caches it. It answers any number
+of scores with one np.interp over the grid, instead of reading a hand-made
+anchor file on every call.
+
+Percentiles use the same definition as the stored pagerank_percentile: the
+share of that day's scores strictly below the given score.
+"""
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+SKETCH_POINTS = 1001  # every 0.1 percentile
+
+PERCENTILE_SKETCH_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pagerank_quantiles (
+        date DATE PRIMARY KEY,
+        n_scores INTEGER,
+        quantiles BLOB,
+        updated_at REAL
+    )
+"""
+
+SKETCH_VERSION_SQL = """
+    SELECT date, updated_at FROM pagerank_quantiles
+    WHERE date = COALESCE(?, (SELECT MAX(date) FROM pagerank_quantiles))
+"""
+
+# Returned when there is no sketch to estimate from
+FALLBACK_PERCENTILE = 50.0
+
+
+def ensure_percentile_sketch_table(db):
+    db.execute(PERCENTILE_SKETCH_SCHEMA)
+
+
+def quantile_sketch(scores, points=SKETCH_POINTS):
+    """
+    Sample sorted scores at `points` evenly spaced ranks.
+
+    Returns:
+        np.ndarray: float64 quantiles, from the minimum to the maximum score
+    """
+    sorted_scores = np.sort(np.asarray(scores, dtype=np.float64))
+    return sorted_scores[_sketch_ranks(len(sorted_scores), points)]
+
+
+def _sketch_ranks(n, points):
+    return np.round(np.linspace(0, n - 1, points)).astype(np.int64)
+
+
+def save_percentile_sketch(db, date, scores):
+    """Store the day's sketch; call inside the daily job's transaction"""
+    if len(scores) == 0:
+        return
+    db.execute("INSERT OR REPLACE INTO pagerank_quantiles VALUES (?, ?, ?, ?)",
+               (date, len(scores), quantile_sketch(scores).astype('<f8').tobytes(), time.time()))
+
+
+class PercentileSketch:
+    """Quantile grid for one date, with the percentile at each grid point"""
+
+    def __init__(self, quantiles, n_scores):
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.n_scores = n_scores
+        self.percentiles = _sketch_ranks(n_scores, len(self.quantiles)) / n_scores * 100
+
+    def estimate(self, scores):
+        """Percentiles for an array of scores, clamped to the day's range"""
+        scores = np.asarray(scores, dtype=np.float64)
+        estimates = np.interp(scores, self.quantiles, self.percentiles)
+        # Between grid points np.interp is right even next to a run of tied
+        # scores, but an exact hit on a tied score has only the scores before
+        # the run below it: use the first grid point of the run
+        left = np.minimum(np.searchsorted(self.quantiles, scores, side='left'),
+                          len(self.quantiles) - 1)
+        exact = self.quantiles[left] == scores
+        estimates[exact] = self.percentiles[left[exact]]
+        return estimates
+
+
+_sketches = {}
+_sketches_lock = threading.Lock()
+
+
+def get_percentile_sketch(db, date=None):
+    """
+    The sketch for date (default: the latest one), or None if there is none.
+
+    Sketches are cached per process by date and write time, so a re-run of
+    the daily job for the same date is picked up.
+    """
+    try:
+        version = db.execute(SKETCH_VERSION_SQL, (date,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if version is None:
+        return None
+    key = (str(version[0]), version[1])
+    with _sketches_lock:
+        sketch = _sketches.get(key)
+    if sketch is None:
+        n_scores, blob = db.execute(
+            "SELECT n_scores, quantiles FROM pagerank_quantiles WHERE date = ?", (version[0],)
+        ).fetchone()
+        sketch = PercentileSketch(np.frombuffer(blob, dtype='<f8'), n_scores)
+        with _sketches_lock:
+            for stale in [k for k in _sketches if k[0] == key[0]]:
+                del _sketches[stale]
+            _sketches[key] = sketch
+    return sketch
+
+
+def estimate_percentiles(db, scores, date=None):
+    """
+    Batch percentile estimate against date's distribution (default: latest).
+
+    Returns:
+        np.ndarray: percentiles in [0, 100); FALLBACK_PERCENTILE everywhere
+        if no sketch has been saved yet
+    """
+    sketch = get_percentile_sketch(db, date)
+    if sketch is None and date is not None:
+        sketch = get_percentile_sketch(db)
+    if sketch is None:
+        print("\033[93mNo pagerank percentile sketch saved yet, using fallback\033[0m")
+        return np.full(np.shape(scores), FALLBACK_PERCENTILE)
+    return sketch.estimate(scores)
+
+
+def estimate_percentile(db, score, date=None):
+    """Percentile of a single score; see estimate_percentiles"""
+    return float(estimate_percentiles(db, [score], date)[0])
+
+
+def backfill_percentile_sketches(db):
+    """
+    Build sketches for every date in user_daily_metrics that has none.
+
+    Returns:
+        int: number of dates sketched
+    """
+    ensure_percentile_sketch_table(db)
+    dates = [row[0] for row in db.execute("""
+        SELECT DISTINCT date FROM user_daily_metrics
+        WHERE date NOT IN (SELECT date FROM pagerank_quantiles)
+    """).fetchall()]
+    for date in dates:
+        scores = np.fromiter((row[0] for row in db.execute(
+            "SELECT pagerank_score FROM user_daily_metrics WHERE date = ?", (date,))),
+            dtype=np.float64)
+        save_percentile_sketch(db, date, scores)
+        db.commit()
+        print(f"Sketched {len(scores)} scores for {date}")
+    return len(dates)
@@ -0,0 +1,388 @@
+"""
+SQL used by the API routes, and the indexes it depends on.
+
+Keeping every route query as a module constant means each one is a single
+statement text, so a pooled connection prepares it once and then reuses it
+from sqlite3's statement cache. It also lets check_query_plans run EXPLAIN
+QUERY PLAN over all of the hot queries. Username lookups compare
+LOWER(username), which only uses an index when one exists on that exact
+expression. Lookups by "user_id or username" are written as a UNION ALL of
+two indexed lookups, not an OR that SQLite answers by scanning users.
+"""
+import re
+import sqlite3
+
+# Identifier lookups: user_id first, then case-insensitive username
+
+USER_EXISTS_SQL = """
+    SELECT 1 as user_exists
+    FROM users
+    WHERE user_id = ?
+        UNION
+    SELECT 1
+    FROM users
+    WHERE LOWER(username) = LOWER(?)
+    LIMIT 1
+"""
+
+USER_WITH_METRICS_SQL = """
+    SELECT u.*, m.pagerank_score, m.pagerank_percentile,
+            m.inbound_edges, m.outbound_edges, m.date AS metrics_date
+    FROM users u
+    LEFT JOIN user_latest_metrics m ON m.user_id = u.user_id
+    WHERE u.user_id = ?
+        UNION ALL
+    SELECT u.*, m.pagerank_score, m.pagerank_percentile,
+            m.inbound_edges, m.outbound_edges, m.date AS metrics_date
+    FROM users u
+    LEFT JOIN user_latest_metrics m ON m.user_id = u.user_id
+    WHERE LOWER(u.username) = LOWER(?)
+    LIMIT 1
+"""
+
+USER_FIELDS_SQL = """
+    SELECT *
+    FROM users
+    WHERE user_id = ?
+        UNION ALL
+    SELECT *
+    FROM users
+    WHERE LOWER(username) = LOWER(?)
+    LIMIT 1
+"""
+
+USER_NAME_SQL = """
+    SELECT user_id, username
+    FROM users
+    WHERE user_id = ?
+        UNION ALL
+    SELECT user_id, username
+    FROM users
+    WHERE LOWER(username) = LOWER(?)
+    LIMIT 1
+"""
+
+USER_BY_ID_SQL = "SELECT * FROM users WHERE user_id = ?"
+
+# Profile and history
+
+RECIPROCAL_COUNT_SQL = """
+    SELECT COUNT(*) as count
+    FROM following_relationships f1
+    JOIN following_relationships f2 ON f1.following_id = f2.user_id
+    WHERE f1.user_id = ? AND f2.following_id = ?
+"""
+
+# Written by the daily job; NULL for users added since, which fall back to
+# RECIPROCAL_COUNT_SQL
+STORED_RECIPROCAL_SQL = """
+    SELECT reciprocal_edges FROM user_latest_metrics WHERE user_id = ?
+"""
+
+# One page of a network listing, in the order given; ids without a users row
+# (only seen in following_relationships) come back with NULL profile columns
+NETWORK_PROFILES_SQL = """
+    SELECT j.value AS user_id, u.username, u.follower_count, u.profile_pic_url,
+           m.pagerank_percentile
+    FROM json_each(?) j
+    LEFT JOIN users u ON u.user_id = j.value
+    LEFT JOIN user_latest_metrics m ON m.user_id = j.value
+    ORDER BY j.key
+"""
+
+USER_HISTORY_SQL = """
+    SELECT date, pagerank_score, pagerank_percentile,
+           follower_count, following_count,
+           inbound_edges, outbound_edges
+    FROM user_daily_metrics
+    WHERE user_id = ?
+    ORDER BY date DESC
+    LIMIT 30
+"""
+
+NICHE_USER_HISTORY_SQL = """
+    SELECT n.date, n.pagerank_score, n.pagerank_percentile,
+           d.follower_count, d.following_count,
+           d.inbound_edges, d.outbound_edges
+    FROM user_niche_daily_metrics n
+    LEFT JOIN user_daily_metrics d ON d.user_id = n.user_id AND d.date = n.date
+    WHERE n.niche = ? AND n.user_id = ?
+    ORDER BY n.date DESC
+    LIMIT 30
+"""
+
+# Users fetched from the Twitter API (handle_user_not_in_db)
+
+RECENT_LAST_UPDATED_SQL = """
+    SELECT last_updated
+    FROM users
+    ORDER BY last_updated DESC
+    LIMIT 5
+"""
+
+RECENT_METRICS_DATES_SQL = """
+    SELECT date
+    FROM user_daily_metrics
+    ORDER BY date DESC
+    LIMIT 5
+"""
+
+INSERT_USER_SQL = """
+    INSERT OR REPLACE INTO users (
+        user_id, username, name, follower_count, following_count,
+        description, creation_date, timestamp, is_private, is_verified,
+        location, profile_pic_url, profile_banner_url, external_url,
+        number_of_tweets, bot, has_nft_avatar, last_updated,
+        followers_crawled, bfs_depth, is_in_niche, checked_in_niche
+    ) VALUES (
+        ?, ?, ?, ?, ?,
+        ?, ?, ?, ?, ?,
+        ?, ?, ?, ?,
+        ?, ?, ?, ?,
+        ?, ?, ?, ?
+    )
+"""
+
+INSERT_DAILY_METRICS_SQL = """
+    INSERT OR REPLACE INTO user_daily_metrics
+    (user_id, date, pagerank_score, pagerank_percentile,
+    follower_count, following_count, inbound_edges, outbound_edges)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Follower ids come in as one JSON array (json_each), so any number of them
+# is a single statement; the sum, match count and top followers are computed
+# in one pass. The totals row is always returned, with NULL top columns when
+# no follower is in the dataset.
+FOLLOWER_SCORES_SQL = """
+    WITH matched AS (
+        SELECT CAST(j.key AS INTEGER) AS position,
+               m.pagerank_score, m.pagerank_percentile, m.outbound_edges
+        FROM json_each(:follower_ids) j
+        JOIN user_latest_metrics m ON m.user_id = j.value
+        WHERE m.outbound_edges > 0
+    ),
+    totals AS (
+        SELECT TOTAL(pagerank_score / (outbound_edges + 1)) AS score_sum,
+               COUNT(*) AS matched
+        FROM matched
+    )
+    SELECT t.score_sum, t.matched, top.position, top.pagerank_score, top.pagerank_percentile
+    FROM totals t
+    LEFT JOIN (
+        SELECT * FROM matched
+        ORDER BY pagerank_score DESC, position
+        LIMIT :limit
+    ) top ON 1
+    ORDER BY top.pagerank_score DESC, top.position
+"""
+
+
+# (name, table, definition); created by create_indexes
+INDEXES = (
+    ('idx_users_username_lower', 'users', 'users (LOWER(username))'),
+    ('idx_users_last_updated', 'users', 'users (last_updated)'),
+    ('idx_following_relationships_following_id', 'following_relationships',
+     'following_relationships (following_id)'),
+    ('idx_user_daily_metrics_date_user_id', 'user_daily_metrics',
+     'user_daily_metrics (date, user_id)'),
+)
+
+
+def missing_indexes(db):
+    """(name, definition) of the INDEXES this database lacks, on tables it has"""
+    existing = {row[0] for row in db.execute("SELECT name FROM sqlite_master")}
+    return [(name, definition) for name, table, definition in INDEXES
+            if table in existing and name not in existing]
+
+
+def create_indexes(db, analyze=True):
+    """
+    Create any missing index from INDEXES. Safe to run repeatedly; indexes on
+    tables that do not exist yet are skipped.
+
+    Args:
+        analyze: Run ANALYZE after creating any index, so the planner has
+            statistics for it. On a large database this takes as long as
+            the index builds.
+
+    Returns:
+        list: Names of the indexes created by this call
+    """
+    created = []
+    for name, definition in missing_indexes(db):
+        db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+        created.append(name)
+    if created and analyze:
+        db.execute("ANALYZE")
+    db.commit()
+    return created
+
+
+def hot_queries():
+    """
+    Queries served on every request, with sample parameters for EXPLAIN.
+
+    The LIKE search fallback is left out on purpose: it only runs for one- and
+    two-character queries and a leading-wildcard LIKE cannot use an index.
+    """
+    from app.app_state import METRICS_EPOCH_KEY, METRICS_EPOCH_SQL
+    from app.jobs import ACTIVE_JOB_SQL, JOB_SQL
+    from app.percentiles import SKETCH_VERSION_SQL
+    from app.niches import metrics_join
+    from app.search_index import SEARCH_SQL
+    from app.top_followers import LIVE_TOP_FOLLOWERS_SQL, PRECOMPUTED_TOP_FOLLOWERS_SQL
+
+    user, niche = '1', 'solana'
+    return {
+        'user_exists': (USER_EXISTS_SQL, (user, user)),
+        'user_with_metrics': (USER_WITH_METRICS_SQL, (user, user)),
+        'user_fields': (USER_FIELDS_SQL, (user, user)),
+        'user_name': (USER_NAME_SQL, (user, user)),
+        'user_by_id': (USER_BY_ID_SQL, (user,)),
+        'reciprocal_count': (RECIPROCAL_COUNT_SQL, (user, user)),
+        'stored_reciprocal': (STORED_RECIPROCAL_SQL, (user,)),
+        'user_history': (USER_HISTORY_SQL, (user,)),
+        'network_profiles': (NETWORK_PROFILES_SQL, ('["1", "2"]',)),
+        'niche_user_history': (NICHE_USER_HISTORY_SQL, (niche, user)),
+        'recent_last_updated': (RECENT_LAST_UPDATED_SQL, ()),
+        'recent_metrics_dates': (RECENT_METRICS_DATES_SQL, ()),
+        'follower_scores': (FOLLOWER_SCORES_SQL, {'follower_ids': '["1", "2", "3"]', 'limit': 10}),
+        'metrics_epoch': (METRICS_EPOCH_SQL, (METRICS_EPOCH_KEY,)),
+        'analysis_job': (JOB_SQL, ('0' * 32,)),
+        'active_analysis_job': (ACTIVE_JOB_SQL, (user,)),
+        'percentile_sketch': (SKETCH_VERSION_SQL, (None,)),
+        'search': (SEARCH_SQL.format(metrics_join=metrics_join()),
+                   {'match': '"sol"', 'limit': 10}),
+        'niche_search': (SEARCH_SQL.format(metrics_join=metrics_join(niche)),
+                         {'match': '"sol"', 'limit': 10, 'niche': niche}),
+        'top_followers': (PRECOMPUTED_TOP_FOLLOWERS_SQL, ('["1"]', 10)),
+        'live_top_followers': (LIVE_TOP_FOLLOWERS_SQL.format(metrics_join=metrics_join()),
+                               {'user_id': user, 'limit': 10}),
+        'niche_live_top_followers': (
+            LIVE_TOP_FOLLOWERS_SQL.format(metrics_join=metrics_join(niche)),
+            {'user_id': user, 'limit': 10, 'niche': niche}),
+    }
+
+
+def _matching_paren(sql, start):
+    """Index of the parenthesis closing the one at sql[start]"""
+    depth = 0
+    for i in range(start, len(sql)):
+        if sql[i] == '(':
+            depth += 1
+        elif sql[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(sql)
+
+
+def _outer_level(sql):
+    """sql with everything inside parentheses blanked out"""
+    chars, depth = [], 0
+    for char in sql:
+        if char == ')':
+            depth -= 1
+        chars.append(char if depth == 0 else ' ')
+        if char == '(':
+            depth += 1
+    return ''.join(chars)
+
+
+def _block_bodies(sql):
+    """CTE and subquery alias -> the SQL of that block"""
+    bodies = {}
+    for match in re.finditer(r'\b(\w+)\s+AS\s*\(', sql, re.I):
+        start = match.end() - 1
+        bodies[match.group(1)] = sql[start + 1:_matching_paren(sql, start)]
+    for start in (i for i, char in enumerate(sql) if char == '('):
+        end = _matching_paren(sql, start)
+        alias = re.match(r'\)\s*(?:AS\s+)?(\w+)', sql[end:], re.I)
+        if alias and alias.group(1).upper() not in ('ON', 'WHERE', 'AND', 'OR', 'ORDER',
+                                                    'GROUP', 'LIMIT', 'UNION', 'AS'):
+            bodies.setdefault(alias.group(1), sql[start + 1:end])
+    return bodies
+
+
+def _ordered_limit(sql):
+    """True if this block (not a nested one) ends in ORDER BY ... LIMIT"""
+    return re.search(r'\bORDER BY\b.*\bLIMIT\b', _outer_level(sql), re.I | re.S) is not None
+
+
+def full_scans(db, sql, params=()):
+    """
+    Full table scans in a query's plan.
+
+    A SCAN of a real table (directly or through its alias) counts, with one
+    exception: an index walk that is the outer loop of a block ending in
+    ORDER BY ... LIMIT, where the block needs no sort step, stops after
+    LIMIT rows. The block is the scan's own plan node (the statement, a
+    CTE or an aliased subquery), so a scan in another subquery, a scalar
+    subquery or a UNION arm still counts. Scans of virtual tables and of the query's own
+    CTEs do not count.
+
+    Returns:
+        list: The offending EXPLAIN QUERY PLAN lines
+    """
+    plan = db.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    sources = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.I):
+        sources[table] = table
+        if alias:
+            sources.setdefault(alias, table)
+    bodies = _block_bodies(sql)
+    details = {node: detail for node, _, _, detail in plan}
+    parents = {node: parent for node, parent, _, _ in plan}
+
+    def block_of(node):
+        """(plan node, SQL) of the block a loop belongs to; SQL is None for
+        UNION arms, scalar and unnamed subqueries"""
+        parent = parents[node]
+        if not parent:
+            return 0, sql
+        named = re.match(r'(?:CO-ROUTINE|MATERIALIZE) (\w+)$', details[parent])
+        return parent, bodies.get(named.group(1)) if named else None
+
+    def exempt(node):
+        block, block_sql = block_of(node)
+        if block_sql is None or not _ordered_limit(block_sql):
+            return False
+        lines = [(n, d) for n, parent, _, d in plan if parent == block]
+        if any(d.startswith('USE TEMP B-TREE FOR ORDER BY') for _, d in lines):
+            return False
+        loops = [n for n, d in lines if d.startswith(('SCAN ', 'SEARCH '))]
+        return bool(loops) and loops[0] == node
+
+    scans = []
+    for node, _, _, line in plan:
+        if not line.startswith('SCAN ') or 'VIRTUAL TABLE' in line:
+            continue
+        if sources.get(line.split()[1]) not in tables:
+            continue
+        if ' INDEX ' in line and exempt(node):
+            continue
+        scans.append(line)
+    return scans
+
+
+def check_query_plans(db):
+    """
+    Run full_scans over hot_queries(). Queries on tables or columns this
+    database does not have yet (e.g. no niches computed) are skipped.
+
+    Returns:
+        dict: query name -> offending plan lines, for the queries that scan
+    """
+    failures = {}
+    for name, (sql, params) in hot_queries().items():
+        try:
+            scans = full_scans(db, sql, params)
+        except sqlite3.OperationalError as e:
+            if 'no such table' not in str(e) and 'no such column' not in str(e):
+                raise
+            continue
+        if scans:
+            failures[name] = scans
+    return failures
@@ -0,0 +1,193 @@
+"""
+Persistent cache of RapidAPI responses, under TwitterAPI.get_json.
+
+Every remote call costs quota and seconds of latency, and the same handles
+get looked up again and again (retries after an error, the same link shared
+around, handles that do not exist). Responses are stored in a small SQLite
+file next to the database, keyed by endpoint path plus the sorted query
+parameters, so every worker shares them and they survive restarts.
+
+Each endpoint has its own TTL. Lookups that found nothing (a 404, or a
+profile response that says the user was not found) are cached too, for the
+shorter REMOTE_CACHE_TTL_NOT_FOUND. Any other body without the field the
+endpoint always returns, such as an upstream error or quota message, is not
+cached at all, so the next request asks again. Concurrent misses for one key
+are coalesced in TwitterAPI, so they share a single upstream call. TwitterAPI
+calls get and set from an executor thread, off its event loop.
+
+REMOTE_CACHE_BACKEND=none turns the cache off.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.db import DB_PATH
+
+REMOTE_CACHE_BACKEND = os.getenv('REMOTE_CACHE_BACKEND', 'sqlite')
+REMOTE_CACHE_PATH = os.getenv('REMOTE_CACHE_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), 'remote_cache.db')
+
+# Seconds; follower pages share one TTL so a continuation chain expires together
+ENDPOINT_TTLS = {
+    '/user/details': float(os.getenv('REMOTE_CACHE_TTL_DETAILS', 6 * 3600)),
+    '/user/followers': float(os.getenv('REMOTE_CACHE_TTL_FOLLOWERS', 6 * 3600)),
+    '/user/followers/continuation': float(os.getenv('REMOTE_CACHE_TTL_FOLLOWERS', 6 * 3600)),
+}
+DEFAULT_TTL = float(os.getenv('REMOTE_CACHE_TTL', 3600))
+NOT_FOUND_TTL = float(os.getenv('REMOTE_CACHE_TTL_NOT_FOUND', 15 * 60))
+
+# Expired rows are deleted every this many writes
+PRUNE_EVERY = 200
+
+REMOTE_CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS remote_cache (
+        key TEXT PRIMARY KEY,
+        status INTEGER NOT NULL,
+        body TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+"""
+
+
+# Handles are case-insensitive, so "Jack" and "jack" share an entry
+CASE_INSENSITIVE_PARAMS = {('/user/details', 'username')}
+
+
+def cache_key(path, params):
+    params = {
+        name: str(value).lower() if (path, name) in CASE_INSENSITIVE_PARAMS else value
+        for name, value in params.items()
+    }
+    return path + '?' + json.dumps(params, sort_keys=True, default=str)
+
+
+# Field every real response from the endpoint has
+EXPECTED_FIELDS = {
+    '/user/details': 'user_id',
+    '/user/followers': 'results',
+    '/user/followers/continuation': 'results',
+}
+
+NOT_FOUND_MESSAGES = ('not found', 'does not exist', 'no user')
+
+
+def _says_not_found(body):
+    """True if an error body states that the user does not exist"""
+    return isinstance(body, dict) and any(
+        isinstance(body.get(field), str)
+        and any(message in body[field].lower() for message in NOT_FOUND_MESSAGES)
+        for field in ('detail', 'message', 'error')
+    )
+
+
+def is_not_found(path, status, body):
+    """Whether a response means the thing looked up does not exist"""
+    if status == 404:
+        return True
+    return (path == '/user/details' and isinstance(body, dict) and 'user_id' not in body
+            and _says_not_found(body))
+
+
+def is_cacheable(path, status, body):
+    """Whether a response is a real answer: a 404, a not-found marker or a normal body"""
+    field = EXPECTED_FIELDS.get(path)
+    if field is None or status == 404:
+        return True
+    return isinstance(body, dict) and (field in body or is_not_found(path, status, body))
+
+
+class RemoteCache:
+    """
+    SQLite-backed response store with per-process counters. Thread-safe; the
+    file is opened on first use.
+    """
+
+    def __init__(self, path=REMOTE_CACHE_PATH, backend=REMOTE_CACHE_BACKEND):
+        self.path = path
+        self.enabled = backend != 'none'
+        self._db = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+
+    def _conn(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute("PRAGMA busy_timeout = 5000")
+            db.execute(REMOTE_CACHE_SCHEMA)
+            self._db = db
+        return self._db
+
+    def get(self, path, params):
+        """(status, body) of the unexpired response for this request, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                row = self._conn().execute(
+                    "SELECT status, body FROM remote_cache WHERE key = ? AND expires_at > ?",
+                    (cache_key(path, params), time.time())
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"\033[93mRemote cache read failed: {str(e)}\033[0m")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            status, body = row[0], json.loads(row[1])
+            if is_not_found(path, status, body):
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+        return status, body
+
+    def set(self, path, params, status, body):
+        """Store a response; not-found responses get NOT_FOUND_TTL, unexpected ones are skipped"""
+        if not self.enabled:
+            return
+        if not is_cacheable(path, status, body):
+            print(f"\033[93mNot caching unexpected response from {path}: {str(body)[:200]}\033[0m")
+            return
+        ttl = NOT_FOUND_TTL if is_not_found(path, status, body) else ENDPOINT_TTLS.get(path, DEFAULT_TTL)
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._conn()
+                db.execute("INSERT OR REPLACE INTO remote_cache VALUES (?, ?, ?, ?)",
+                           (cache_key(path, params), status, json.dumps(body), now + ttl))
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    db.execute("DELETE FROM remote_cache WHERE expires_at <= ?", (now,))
+            except sqlite3.Error as e:
+                print(f"\033[93mRemote cache write failed: {str(e)}\033[0m")
+
+    def clear(self):
+        with self._lock:
+            self._conn().execute("DELETE FROM remote_cache")
+
+    def stats(self):
+        stats = {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'upstream_calls': self.upstream_calls,
+            # Remote calls this worker did not have to make
+            'quota_saved': self.hits + self.negative_hits + self.coalesced,
+        }
+        if self.enabled and self._db is not None:
+            with self._lock:
+                stats['entries'] = self._db.execute("SELECT COUNT(*) FROM remote_cache").fetchone()[0]
+        return stats
+
+
+remote_cache = RemoteCache()
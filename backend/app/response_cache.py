@@ -0,0 +1,241 @@
+"""
+Cache of serialized JSON responses for the user and search endpoints.
+
+User pages only change when a writer commits (see app/app_state.py), so a
+response is cached under the normalized request (identifier or query, plus
+niche) and the current metrics epoch. When the epoch moves, old entries are
+no longer looked up and age out. Entries are the response bytes, an ETag
+and the view's response headers (CORS headers, for one), so a hit costs one
+epoch query and no JSON encoding, and carries the same headers as a miss. A
+matching If-None-Match gets a 304 with no body.
+
+RESPONSE_CACHE_BACKEND picks the storage:
+  shared  one memory-mapped file for all workers (app/shared_cache.py), the default
+  memory  a per-process LRU
+  none    disabled
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request
+from werkzeug.http import is_hop_by_hop_header
+
+from app import get_db
+from app.app_state import metrics_epoch
+from app.db import DB_PATH
+
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'shared')
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 4096))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 3600))
+# Next to the database, so it survives machine restarts on the Fly volume
+SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), 'response_cache.mmap')
+
+ETAG_LENGTH = 24
+HEADERS_LENGTH = struct.Struct('<I')
+# Part of every key, so entries stored in another layout by an older
+# release (the shared file outlives deploys) are never read
+ENTRY_FORMAT = 2
+
+# Recomputed on every response, or not safe to hand to another client
+UNCACHED_HEADERS = {'content-length', 'etag', 'set-cookie', 'x-cache'}
+
+
+class MemoryCache:
+    """
+    Thread-safe per-process LRU of bytes values, bounded by entry count and
+    total value size.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.time():
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= len(old[0])
+            self._entries[key] = (value, time.time() + ttl)
+            self.size_bytes += len(value)
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self.size_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+
+def _open_backend(name):
+    if name == 'none':
+        return None
+    if name == 'shared':
+        from app.shared_cache import SharedCache
+        try:
+            return SharedCache(SHARED_CACHE_PATH)
+        except (OSError, RuntimeError) as e:
+            print(f"\033[93mShared response cache unavailable ({e}), using per-process cache\033[0m")
+    return MemoryCache()
+
+
+class ResponseCache:
+    """
+    (body, etag, headers) entries on top of a bytes backend, with hit/miss
+    counters for this process. The backend is opened on first use.
+    """
+
+    def __init__(self, backend=RESPONSE_CACHE_BACKEND, ttl=RESPONSE_CACHE_TTL):
+        self.backend_name = backend
+        self.ttl = ttl
+        self._backend = None
+        self._opened = False
+        self._open_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        if not self._opened:
+            with self._open_lock:
+                if not self._opened:
+                    self._backend = _open_backend(self.backend_name)
+                    self._opened = True
+        return self._backend
+
+    @staticmethod
+    def _key(parts):
+        return '\x1f'.join(str(part) for part in (ENTRY_FORMAT, *parts)).encode()
+
+    def get(self, parts):
+        if self.backend is None:
+            return None
+        value = self.backend.get(self._key(parts))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        (headers_length,) = HEADERS_LENGTH.unpack_from(value, ETAG_LENGTH)
+        body_start = ETAG_LENGTH + HEADERS_LENGTH.size + headers_length
+        headers = json.loads(value[ETAG_LENGTH + HEADERS_LENGTH.size:body_start])
+        return value[body_start:], value[:ETAG_LENGTH].decode(), headers
+
+    def set(self, parts, body, etag, headers=()):
+        """headers is a list of (name, value) pairs to replay on hits"""
+        if self.backend is not None:
+            encoded = json.dumps(headers).encode()
+            value = etag.encode() + HEADERS_LENGTH.pack(len(encoded)) + encoded + body
+            self.backend.set(self._key(parts), value, self.ttl)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': self.backend_name if self.backend is not None else 'none',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def _etag(body):
+    return hashlib.blake2b(body, digest_size=ETAG_LENGTH // 2).hexdigest()
+
+
+def _replayable_headers(response):
+    return [(name, value) for name, value in response.headers.items()
+            if not is_hop_by_hop_header(name) and name.lower() not in UNCACHED_HEADERS]
+
+
+def cached_response(key_parts):
+    """
+    Serve a GET endpoint from response_cache.
+
+    key_parts(**view_args) returns the normalized request, or None to bypass
+    the cache. Only 200 JSON responses are stored, with the view's headers
+    minus hop-by-hop ones.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            parts = key_parts(**view_args)
+            if parts is None:
+                return view(**view_args)
+
+            key = (request.endpoint, *parts, metrics_epoch(get_db()))
+            cached = response_cache.get(key)
+            if cached is None:
+                response = make_response(view(**view_args))
+                if response.status_code != 200 or response.mimetype != 'application/json':
+                    return response
+                body = response.get_data()
+                cached = (body, _etag(body))
+                response_cache.set(key, *cached, _replayable_headers(response))
+                cache_status = 'MISS'
+            else:
+                body, etag, headers = cached
+                response = current_app.response_class(body, headers=headers)
+                cached = (body, etag)
+                cache_status = 'HIT'
+
+            response.set_etag(cached[1])
+            response.headers['X-Cache'] = cache_status
+            return response.make_conditional(request)
+
+        return wrapper
+    return decorator
+
+
+def user_request_key(identifier):
+    # The not-in-db path writes, so it is never served from the cache
+    if request.args.get('not_in_database', 'false').lower() == 'true':
+        return None
+    return identifier.lower(), request.args.get('niche') or ''
+
+
+def search_request_key():
+    # Both search paths are case-insensitive
+    return request.args.get('q', '').lower(), request.args.get('niche') or ''
+
+
+cached_user_response = cached_response(user_request_key)
+cached_search_response = cached_response(search_request_key)
@@ -3,4 +3,8 @@ from flask import Blueprint
 api = Blueprint('api', __name__)
 
 from .user_routes import *
-from .search_routes import *
\ No newline at end of file
+from .search_routes import *
+from .niche_routes import *
+from .stats_routes import *
+from .job_routes import *
+from .network_routes import *
@@ -1,28 +1,37 @@
-import httpx
+import json
 import time
-import os
 from datetime import datetime
-from typing import List, Dict, Any
-from flask import jsonify
+from app.app_state import bump_metrics_epoch, ensure_app_state_table
+from app.crawler import NotFound, get_user_details, stream_followers
+from app.latest_metrics import UPSERT_LATEST_METRICS_SQL
+from app.percentiles import estimate_percentile
+from app.queries import (
+    FOLLOWER_SCORES_SQL, INSERT_DAILY_METRICS_SQL, INSERT_USER_SQL, RECENT_LAST_UPDATED_SQL,
+    RECENT_METRICS_DATES_SQL, USER_BY_ID_SQL, USER_FIELDS_SQL,
+)
+from app.search_index import index_user
 
-# Debug print for environment variables
-api_key = os.getenv("RAPID_API_KEY")
+def _no_progress(stage, followers_fetched=0):
+    pass
 
 
-API_BASE = "https://twitter154.p.rapidapi.com"
-HEADERS = {
-    "x-rapidapi-key": api_key,  # Store in variable for debugging
-    "x-rapidapi-host": "twitter154.p.rapidapi.com"
-}
-
-def handle_user_not_in_db(identifier, db):
+def analyze_new_user(identifier, db, progress=_no_progress):
     """
     Handle the case when a requested user is not in the database.
     Attempts to fetch their data from Twitter API.
     
     Args:
         identifier: The user identifier (username or user_id)
-        db: Database connection from the Flask route handler
+        db: Read-write database connection
+        progress: Called as progress(stage, followers_fetched) between steps
+
+    Returns:
+        dict: The /api/user response for the new user, or an error payload
+            when the user is already in the database or does not exist
+
+    Raises:
+        Exception: Any other failure (API errors, rate limits, database
+            errors), so the job running this is marked failed
     """
     print("\033[93mHandling user not in database\033[0m")
     
@@ -30,34 +39,43 @@ def handle_user_not_in_db(identifier, db):
     print("\033[91mChecking if user exists in database...\033[0m")
     
     # Single query to check both user_id and username
-    user = db.execute("""
-        SELECT * FROM users 
-        WHERE user_id = ? 
-        OR LOWER(username) = LOWER(?)
-    """, (str(identifier), str(identifier))).fetchone()
+    user = db.execute(USER_FIELDS_SQL, (str(identifier), str(identifier))).fetchone()
     
     if user:
         print(f"\033[91mUser {identifier} found in database - Please use /api/user\033[0m")
-        return jsonify({
+        return {
             'status': 'error',
             'message': f'User {identifier} is already in the database. Please use /api/user endpoint instead.',
             'suggested_actions': {
                 'redirect': '/api/user'
             }
-        }), 200
+        }
 
+    # Get user details from Twitter
+    print(f"Fetching user details for {identifier}...")
     try:
-        # Get user details from Twitter
         user_details = get_user_details(identifier)
+    except NotFound as e:
+        return {
+            'status': 'not_found',
+            'message': f'User {identifier} not found in database or Twitter',
+            'error': str(e),
+            'suggested_actions': {
+                'retry': True,
+                'search': True
+            }
+        }
+
+    follower_pages = None
+    try:
+        # Start paging through their followers in the background; saving the
+        # user below overlaps the first pages
+        follower_pages = stream_followers(user_details["user_id"])
+        progress('saving_user')
         
         # Get the 5th most recent last_updated timestamp from users table
         # This ensures consistent timestamp patterns with existing data
-        timestamps = db.execute("""
-            SELECT last_updated 
-            FROM users 
-            ORDER BY last_updated DESC 
-            LIMIT 5
-        """).fetchall()
+        timestamps = db.execute(RECENT_LAST_UPDATED_SQL).fetchall()
         
         # Use 5th latest timestamp if available, otherwise use current time
         fifth_latest_timestamp = timestamps[4]['last_updated'] if len(timestamps) >= 5 else int(time.time() * 1000)
@@ -73,21 +91,7 @@ def handle_user_not_in_db(identifier, db):
         
         # Save user to database
         try:
-            db.execute("""
-                INSERT OR REPLACE INTO users (
-                    user_id, username, name, follower_count, following_count,
-                    description, creation_date, timestamp, is_private, is_verified,
-                    location, profile_pic_url, profile_banner_url, external_url,
-                    number_of_tweets, bot, has_nft_avatar, last_updated,
-                    followers_crawled, bfs_depth, is_in_niche, checked_in_niche
-                ) VALUES (
-                    ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?, ?,
-                    ?, ?, ?, ?,
-                    ?, ?, ?, ?,
-                    ?, ?, ?, ?
-                )
-            """, (
+            db.execute(INSERT_USER_SQL, (
                 user_details['user_id'],
                 user_details.get('username'),
                 user_details.get('name'),
@@ -111,13 +115,13 @@ def handle_user_not_in_db(identifier, db):
                 1 if user_details['is_in_niche'] else 0,
                 1 if user_details['checked_in_niche'] else 0
             ))
+            index_user(db, user_details['user_id'], user_details.get('username'))
+            ensure_app_state_table(db)
+            bump_metrics_epoch(db)  # drops cached "not found" pages for this user
             db.commit()  # Commit the transaction to save changes
             
             # Verify the save operation
-            saved_user = db.execute(
-                "SELECT * FROM users WHERE user_id = ?", 
-                (user_details['user_id'],)
-            ).fetchone()
+            saved_user = db.execute(USER_BY_ID_SQL, (user_details['user_id'],)).fetchone()
 
             
             
@@ -135,71 +139,24 @@ def handle_user_not_in_db(identifier, db):
 
 
         
-        # Get their follower list
-        followers = get_followers(user_details["user_id"])
-        
+        # Get their follower list, scoring each page while the next page is fetched
+        progress('fetching_followers')
+        followers = []
+        scores = FollowerScores(db)
+        for page in follower_pages:
+            followers.extend(page)
+            scores.add(page)
+            progress('fetching_followers', len(followers))
+
         # Calculate pagerank scores and get top followers
-        follower_scores_sum = 0
-        top_followers = []
-        follower_ids = [f['user_id'] for f in followers]
-        
-        if follower_ids:
-            # Get the most recent metrics for each follower
-            placeholders = ','.join(['?' for _ in follower_ids])
-            metrics_query = f"""
-                WITH LatestDates AS (
-                    SELECT user_id, MAX(date) as max_date
-                    FROM user_daily_metrics
-                    WHERE user_id IN ({placeholders})
-                    GROUP BY user_id
-                )
-                SELECT m.user_id, m.pagerank_score, m.pagerank_percentile, m.outbound_edges
-                FROM user_daily_metrics m
-                INNER JOIN LatestDates ld
-                    ON m.user_id = ld.user_id 
-                    AND m.date = ld.max_date
-                WHERE m.outbound_edges > 0
-            """
-            
-            metrics_results = db.execute(metrics_query, follower_ids).fetchall()
-            
-            # Create a dict for quick lookup
-            metrics_dict = {str(row['user_id']): row for row in metrics_results}
-            
-            # Calculate sum and prepare top followers
-            for follower in followers:
-                follower_id = follower['user_id']
-                if follower_id in metrics_dict:
-                    metrics = metrics_dict[follower_id]
-                    follower_scores_sum += (metrics['pagerank_score'] / (metrics['outbound_edges'] + 1))
-                    
-                    top_followers.append({
-                        'user_id': follower_id,
-                        'username': follower['username'],
-                        'follower_count': follower['follower_count'],
-                        'profile_pic_url': follower['profile_pic_url'],
-                        'pagerank_score': metrics['pagerank_score'],
-                        'pagerank_percentile': metrics['pagerank_percentile']
-                    })
-            
-            # Sort by pagerank score and take top 10
-            top_followers.sort(key=lambda x: x['pagerank_score'], reverse=True)
-            top_followers = top_followers[:10]
-            
-            follower_scores_sum *= 0.85
-                
-        
-        # Calculate percentile for the follower_scores_sum
-        # follower_scores_percentile = estimate_pagerank_percentile_fast(follower_scores_sum, db)
+        follower_scores_sum, followers_in_dataset, top_followers = scores.result()
+        follower_scores_sum *= 0.85
+
+        progress('saving_metrics', len(followers))
 
         # Get the 5th most recent date from metrics table
         # This ensures consistent date patterns with existing metrics
-        dates = db.execute("""
-            SELECT date 
-            FROM user_daily_metrics 
-            ORDER BY date DESC 
-            LIMIT 5
-        """).fetchall()
+        dates = db.execute(RECENT_METRICS_DATES_SQL).fetchall()
         
         # Use 5th latest date if available, otherwise use current date
         fifth_latest_date = dates[4]['date'] if len(dates) >= 5 else datetime.now().date()
@@ -209,20 +166,14 @@ def handle_user_not_in_db(identifier, db):
             'user_id': user_details['user_id'],
             'date': fifth_latest_date,  # Use 5th latest date for consistency
             'pagerank_score': follower_scores_sum,
-            'pagerank_percentile': estimate_pagerank_percentile_fast(follower_scores_sum),
+            'pagerank_percentile': estimate_percentile(db, follower_scores_sum, fifth_latest_date),
             'follower_count': user_details['follower_count'],
             'following_count': user_details['following_count'],
-            'inbound_edges': len(metrics_dict), # followers in
+            'inbound_edges': followers_in_dataset, # followers in
             'outbound_edges': 0  # Default to 0 since we don't have this info yet
         }
 
-        # Save metrics to database
-        db.execute("""
-            INSERT OR REPLACE INTO user_daily_metrics 
-            (user_id, date, pagerank_score, pagerank_percentile, 
-            follower_count, following_count, inbound_edges, outbound_edges)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        metrics_row = (
             metrics['user_id'],  # user_id (from user_details)
             metrics['date'],     # date (current date)
             metrics['pagerank_score'], # pagerank_score (using follower_scores_sum)
@@ -231,7 +182,12 @@ def handle_user_not_in_db(identifier, db):
             metrics['following_count'], # following_count (from user_details)
             metrics['inbound_edges'], # inbound_edges (length of followers list)
             metrics['outbound_edges'] # outbound_edges (default 0)
-        ))
+        )
+
+        # Save metrics to database, keeping the latest-metrics snapshot in step
+        db.execute(INSERT_DAILY_METRICS_SQL, metrics_row)
+        db.execute(UPSERT_LATEST_METRICS_SQL, metrics_row)
+        bump_metrics_epoch(db)
         db.commit()
 
 
@@ -261,159 +217,86 @@ def handle_user_not_in_db(identifier, db):
             }
         }
         
-        return jsonify(response), 200
-        
-    except Exception as e:
-        # If Twitter API fails, return not found
-        return jsonify({
-            'status': 'not_found',
-            'message': f'User {identifier} not found in database or Twitter',
-            'error': str(e),
-            'suggested_actions': {
-                'retry': True,
-                'search': True
-            }
-        }), 200
-
-def make_request(url: str, params: Dict) -> Dict:
-    """Handle API requests with exponential backoff retry logic"""
-    if not api_key:
-        raise Exception("RAPID_API_KEY environment variable is not set!")
+        return response
         
-    max_attempts = 5
-    response = None
-    
-    for attempt in range(max_attempts):
-        try:
-            with httpx.Client() as client:
-                response = client.get(url, headers=HEADERS, params=params)
-                response.raise_for_status()
-                return response.json()
-                
-        except httpx.HTTPStatusError as e:
-            if response and response.status_code == 429:
-                wait_time = 2 ** attempt
-                time.sleep(wait_time)
-                continue
-            raise Exception(f"HTTP Error: {str(e)}")
-            
-        except Exception as e:
-            if attempt == max_attempts - 1:
-                raise
-            
-            wait_time = 1 * attempt
-            time.sleep(wait_time)
-    
-    raise Exception("Max retry attempts reached")
+    except Exception:
+        if follower_pages is not None:
+            follower_pages.close()
+        raise
 
-def get_user_details(identifier: str) -> Dict:
-    """Get basic profile info for a user"""
-    url = f"{API_BASE}/user/details"
-    # Convert identifier to expected format
-    params = {"username": identifier} if isinstance(identifier, str) else identifier
-    
-    print(f"Fetching user details for {identifier}...")
-    print(f"URL: {url}")
-    print(f"Params: {params}")
-    
-    response = make_request(url, params)
-    
-    if "user_id" in response:
-        response["user_id"] = str(response["user_id"])
-    
-    return response
-
-def get_followers(user_id: str, max_limit: int = 2500) -> List[Dict]:
+class FollowerScores:
     """
-    Fetch user's followers list with pagination
-    Returns normalized user objects with string IDs
+    Running follower score sum and top followers, one page of followers at
+    a time.
+
+    Each add() runs FOLLOWER_SCORES_SQL on one page, so the not-in-db path
+    can score page k while the crawler fetches page k + 1. Page sums and
+    match counts are added up, and each page's top followers are merged
+    into the running top list. Ties keep API order, as in a single query.
     """
-    all_followers = []
-    continuation_token = ""
-    limit = 100  # Users per request
-    
-    while len(all_followers) < max_limit:
-        # Use different URL if we have continuation token
-        url = f"{API_BASE}/user/followers"
-        if continuation_token:
-            url += "/continuation"
-            
-        params = {
-            "user_id": str(user_id),
-            "limit": limit,
-            "continuation_token": continuation_token
-        }
-        
-        response = make_request(url, params)
-        
-        # Break if no more results
-        if not response.get("results"):
-            break
-            
-        # Unused, but has everything
-        fullInfoUsers = [{**user, "user_id": str(user["user_id"])} 
-                for user in response["results"]]
 
-        # Used, Extract into an object with three fields
-        # users = [{
-        #     "user_id": str(user["user_id"]),
-        #     "username": user["username"],
-        #     "follower_count": user["follower_count"]
-        # } for user in response["results"]]
+    def __init__(self, db, limit=10):
+        self.db = db
+        self.limit = limit
+        self.score_sum = 0.0
+        self.matched = 0
+        self._seen = set()
+        self._position = 0
+        self._top = []  # (-pagerank_score, position in API order, follower dict)
 
-        # Extract user objects with required fields, using .get() for optional fields
-        users = [{
-            'user_id': str(user.get('user_id', '')),
-            'username': user.get('username', ''),
-            'follower_count': user.get('follower_count', 0),
-            'profile_pic_url': user.get('profile_pic_url', None)
-        } for user in response['results']]
+    def add(self, followers):
+        """Score one page of follower dicts from the crawler, in API order"""
+        # A follower listed twice by the API is counted once
+        page = []
+        for follower in followers:
+            if follower['user_id'] not in self._seen:
+                self._seen.add(follower['user_id'])
+                page.append(follower)
+        if not page:
+            return
 
-        all_followers.extend(users)
+        rows = self.db.execute(FOLLOWER_SCORES_SQL, {
+            'follower_ids': json.dumps([f['user_id'] for f in page]),
+            'limit': self.limit,
+        }).fetchall()
+        self.score_sum += rows[0]['score_sum']
+        self.matched += rows[0]['matched']
+        for row in rows:
+            if row['position'] is None:
+                continue
+            follower = page[row['position']]
+            self._top.append((-row['pagerank_score'], self._position + row['position'], {
+                'user_id': follower['user_id'],
+                'username': follower['username'],
+                'follower_count': follower['follower_count'],
+                'profile_pic_url': follower['profile_pic_url'],
+                'pagerank_score': row['pagerank_score'],
+                'pagerank_percentile': row['pagerank_percentile']
+            }))
+        self._top = sorted(self._top, key=lambda top: top[:2])[:self.limit]
+        self._position += len(page)
 
-        continuation_token = response.get("continuation_token")
-        time.sleep(0.1)  # Small delay between requests
-        
-    return all_followers
+    def result(self):
+        """
+        Returns:
+            tuple: (score sum, followers in the dataset, top follower dicts)
+        """
+        return self.score_sum, self.matched, [top[2] for top in self._top]
 
-def estimate_pagerank_percentile_fast(score):
+
+def score_followers(db, followers, limit=10):
     """
-    Ultra-fast PageRank percentile estimation using hardcoded anchor points.
-    Uses pre-calculated percentiles from hardcoded_percentiles.json for quick lookups.
-    
+    Sum pagerank_score / (outbound_edges + 1) over the followers that are in
+    the dataset, and pick the top ones by pagerank, in one query.
+
     Args:
-        score: The PageRank score to estimate percentile for
-        
+        db: Database connection
+        followers: Follower dicts from the crawler, in API order
+        limit: Number of top followers to return
+
     Returns:
-        float: Estimated percentile (0-100)
+        tuple: (score sum, followers in the dataset, top follower dicts)
     """
-    import json
-    import os
-    
-    # Load hardcoded percentiles
-    json_path = os.path.join(os.getcwd(), 'data', 'hardcoded_percentiles.json')
-    try:
-        with open(json_path) as f:
-            anchors = json.load(f)
-    except Exception as e:
-        print(f"\033[91mError loading percentiles: {str(e)}\033[0m")
-        return 50.0
-    
-    # Find which segment the score falls into
-    if score <= anchors[0][0]:  # Below lowest score
-        return max(1, (score / anchors[0][0]) * anchors[0][1])
-    elif score >= anchors[-1][0]:  # Above highest score
-        remaining_range = 100 - anchors[-1][1]
-        overshoot = (score - anchors[-1][0]) / anchors[-1][0]
-        return min(99.9, anchors[-1][1] + (overshoot * remaining_range))
-        
-    # Linear search through segments (since we have few points)
-    for i in range(len(anchors) - 1):
-        if anchors[i][0] <= score <= anchors[i + 1][0]:
-            # Linear interpolation within the segment
-            score_range = anchors[i + 1][0] - anchors[i][0]
-            percentile_range = anchors[i + 1][1] - anchors[i][1]
-            progress = (score - anchors[i][0]) / score_range
-            return anchors[i][1] + (progress * percentile_range)
-    
-    return 50.0  # Fallback
+    scores = FollowerScores(db, limit)
+    scores.add(followers)
+    return scores.result()
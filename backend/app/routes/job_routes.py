@@ -0,0 +1,88 @@
+import json
+import os
+import time
+from flask import Response, jsonify, url_for
+from app import get_db
+from app.db import open_read_connection
+from app.jobs import FINISHED_STATUSES, JobQueueFull, analysis_queue, get_job
+from . import api
+
+# An event stream holds a request thread, so it ends after a while and the
+# browser's EventSource reconnects
+EVENTS_POLL_SECONDS = float(os.getenv('ANALYSIS_EVENTS_POLL_SECONDS', 0.5))
+EVENTS_MAX_SECONDS = float(os.getenv('ANALYSIS_EVENTS_MAX_SECONDS', 30))
+
+
+def job_links(job):
+    return {
+        **job,
+        'poll_url': url_for('api.get_analysis_job', job_id=job['job_id']),
+        'events_url': url_for('api.get_analysis_job_events', job_id=job['job_id']),
+    }
+
+
+def job_not_found(job_id):
+    return jsonify({
+        'status': 'not_found',
+        'message': f'No analysis job {job_id}',
+        'job_id': job_id
+    }), 404
+
+
+def enqueue_analysis(identifier, db):
+    """Queue (or join) the background analysis of identifier; 202 with the job"""
+    try:
+        job, created = analysis_queue.enqueue(db, identifier)
+    except JobQueueFull as e:
+        return jsonify({
+            'status': 'busy',
+            'message': f'Too many users are being analyzed right now ({str(e)}). Try again shortly.',
+            'identifier': identifier
+        }), 503, {'Retry-After': '10'}
+
+    if not created:
+        print(f"\033[93mJoining analysis job {job['job_id']} for {identifier}\033[0m")
+    return jsonify(job_links(job)), 202, {'Location': url_for('api.get_analysis_job', job_id=job['job_id'])}
+
+
+@api.route('/api/jobs/<job_id>')
+def get_analysis_job(job_id):
+    """Status of an analysis job; result holds the /api/user response once status is done"""
+    job = get_job(get_db(), job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify(job_links(job))
+
+
+@api.route('/api/jobs/<job_id>/events')
+def get_analysis_job_events(job_id):
+    """Server-sent events: one 'job' event per change in status or progress, 'gone' if it is deleted"""
+    if get_job(get_db(), job_id) is None:
+        return job_not_found(job_id)
+
+    def events():
+        db = open_read_connection()
+        try:
+            yield f"retry: {int(EVENTS_POLL_SECONDS * 2000)}\n\n"
+            last = None
+            deadline = time.monotonic() + EVENTS_MAX_SECONDS
+            while time.monotonic() < deadline:
+                job = get_job(db, job_id)
+                if job is None:
+                    # Deleted while the stream was open (retention cleanup)
+                    yield f"event: gone\ndata: {json.dumps({'job_id': job_id})}\n\n"
+                    return
+                state = (job['status'], job['stage'], job['followers_fetched'])
+                if state != last:
+                    yield f"event: job\ndata: {json.dumps(job)}\n\n"
+                    last = state
+                if job['status'] in FINISHED_STATUSES:
+                    return
+                time.sleep(EVENTS_POLL_SECONDS)
+        finally:
+            db.close()
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,162 @@
+from flask import jsonify, request
+from app import get_db
+import json
+from . import api
+from app.adjacency_index import adjacency_store
+from app.queries import NETWORK_PROFILES_SQL, USER_NAME_SQL
+from app.response_cache import cached_response
+
+MAX_PAGE_SIZE = 200
+MAX_EGO_FIRST = 50
+MAX_EGO_SECOND = 10
+
+
+def network_request_key(identifier, other=None):
+    # Keyed on the index build too, since it is renamed into place after the
+    # daily job has already bumped the metrics epoch
+    index = adjacency_store.current()
+    args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items()))
+    return identifier.lower(), (other or '').lower(), args, index.build if index else ''
+
+
+cached_network_response = cached_response(network_request_key)
+
+
+def _bounded_arg(name, default, maximum):
+    value = request.args.get(name, default, type=int)
+    return max(0, min(value, maximum))
+
+
+def _resolve(db, index, identifier):
+    """(user row, node) for an identifier, or (None, error response)"""
+    user = db.execute(USER_NAME_SQL, (identifier, identifier)).fetchone()
+    if not user:
+        return None, (jsonify({'error': 'User not found'}), 404)
+    node = index.node(user['user_id'])
+    if node is None:
+        return None, (jsonify({
+            'status': 'not_indexed',
+            'error': 'User is not in the network index yet; it is rebuilt by the daily job',
+            'user_id': user['user_id'],
+        }), 404)
+    return user, node
+
+
+def _index_or_error():
+    index = adjacency_store.current()
+    if index is None:
+        return None, (jsonify({'error': 'Network index not built yet'}), 503)
+    return index, None
+
+
+def _profiles(db, index, nodes):
+    """Profiles for nodes, in order, with the score from the index"""
+    user_ids = index.user_ids(nodes)
+    rows = db.execute(NETWORK_PROFILES_SQL, (json.dumps(user_ids),)).fetchall()
+    return [{
+        'user_id': row['user_id'],
+        'username': row['username'],
+        'follower_count': row['follower_count'],
+        'profile_pic_url': row['profile_pic_url'],
+        'pagerank_score': score,
+        'pagerank_percentile': row['pagerank_percentile'],
+    } for row, score in zip(rows, index.scores(nodes))]
+
+
+def _network_page(identifier, direction):
+    index, error = _index_or_error()
+    if error:
+        return error
+    db = get_db()
+    user, node = _resolve(db, index, identifier)
+    if user is None:
+        return node
+
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = _bounded_arg('limit', 50, MAX_PAGE_SIZE)
+    nodes, total = index.page(node, direction, offset, limit)
+
+    return jsonify({
+        'user_id': user['user_id'],
+        'username': user['username'],
+        'date': index.date,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        direction: _profiles(db, index, nodes),
+    })
+
+
+@api.route('/api/user/<identifier>/followers')
+@cached_network_response
+def get_user_followers(identifier):
+    """Followers in the dataset, best pagerank first, ?offset=&limit= paginated"""
+    return _network_page(identifier, 'followers')
+
+
+@api.route('/api/user/<identifier>/following')
+@cached_network_response
+def get_user_following(identifier):
+    """Accounts followed in the dataset, best pagerank first, ?offset=&limit= paginated"""
+    return _network_page(identifier, 'following')
+
+
+@api.route('/api/user/<identifier>/mutual/<other>')
+@cached_network_response
+def get_mutual_follows(identifier, other):
+    """Whether two users follow each other, and the accounts they both follow and are both followed by"""
+    index, error = _index_or_error()
+    if error:
+        return error
+    db = get_db()
+    user, a = _resolve(db, index, identifier)
+    if user is None:
+        return a
+    other_user, b = _resolve(db, index, other)
+    if other_user is None:
+        return b
+
+    limit = _bounded_arg('limit', 10, MAX_PAGE_SIZE)
+    response = {
+        'user_id': user['user_id'],
+        'other_user_id': other_user['user_id'],
+        'date': index.date,
+        'follows_other': bool(index.has_edge(a, b)),
+        'followed_by_other': bool(index.has_edge(b, a)),
+    }
+    for direction in ('following', 'followers'):
+        shared = index.common(a, b, direction)
+        response[f'common_{direction}'] = {
+            'total': len(shared),
+            'users': _profiles(db, index, shared[:limit]),
+        }
+    return jsonify(response)
+
+
+@api.route('/api/user/<identifier>/ego')
+@cached_network_response
+def get_ego_network(identifier):
+    """Two-hop neighborhood sample: ?first= best neighbors, ?second= best of each of theirs"""
+    index, error = _index_or_error()
+    if error:
+        return error
+    db = get_db()
+    user, node = _resolve(db, index, identifier)
+    if user is None:
+        return node
+
+    first = _bounded_arg('first', 20, MAX_EGO_FIRST)
+    second = _bounded_arg('second', 5, MAX_EGO_SECOND)
+    nodes, hops, edges = index.ego_sample(node, first, second)
+
+    profiles = _profiles(db, index, nodes)
+    for profile, hop in zip(profiles, hops):
+        profile['hop'] = hop
+    return jsonify({
+        'user_id': user['user_id'],
+        'username': user['username'],
+        'date': index.date,
+        'nodes': profiles,
+        # [follower, followed] as positions into nodes
+        'edges': edges,
+    })
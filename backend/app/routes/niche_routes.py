@@ -0,0 +1,18 @@
+from flask import jsonify
+from app import get_db
+from app.niches import list_niches
+from . import api
+
+
+def niche_not_found(niche):
+    return jsonify({
+        'status': 'not_found',
+        'message': f'No scores stored for niche {niche}',
+        'niche': niche
+    }), 404
+
+
+@api.route('/api/niches')
+def get_niches():
+    """List niche keys that can be passed as ?niche= to the user and search endpoints"""
+    return jsonify({'niches': list_niches(get_db())})
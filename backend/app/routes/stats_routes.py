@@ -0,0 +1,19 @@
+import os
+from flask import jsonify
+from app.db import statement_stats
+from app.jobs import analysis_queue
+from app.remote_cache import remote_cache
+from app.response_cache import response_cache
+from . import api
+
+
+@api.route('/api/stats')
+def get_stats():
+    """Response and remote caches, analysis queue and SQL timing counters for the worker that serves this request"""
+    return jsonify({
+        'pid': os.getpid(),
+        'response_cache': response_cache.stats(),
+        'analysis_jobs': analysis_queue.stats(),
+        'remote_cache': remote_cache.stats(),
+        'statements': statement_stats()[:20],
+    })
@@ -1,8 +1,18 @@
 from flask import jsonify, request
-from app import get_db
+from app import get_db, get_write_db
 import json
 from . import api
-from .handle_user_not_in_db import handle_user_not_in_db
+from .job_routes import enqueue_analysis
+from app.latest_metrics import get_reciprocal_connections
+from app.niches import get_niche_metrics, niche_exists
+from app.queries import (
+    NICHE_USER_HISTORY_SQL, USER_EXISTS_SQL, USER_FIELDS_SQL, USER_HISTORY_SQL,
+    USER_NAME_SQL, USER_WITH_METRICS_SQL,
+)
+from app.response_cache import cached_user_response
+from app.snapshots import fill_history
+from app.top_followers import get_top_followers
+from .niche_routes import niche_not_found
 
 # Use this to check if a user exists
 @api.route('/api/userExists/<identifier>')
@@ -10,16 +20,7 @@ def check_user_exists(identifier):
     """Check if user exists in database"""
     db = get_db()
     
-    exists = db.execute("""
-        SELECT 1 as user_exists
-        FROM users 
-        WHERE user_id = ?
-            UNION
-        SELECT 1
-        FROM users 
-        WHERE LOWER(username) = LOWER(?)
-        LIMIT 1
-    """, (identifier, identifier)).fetchone() is not None
+    exists = db.execute(USER_EXISTS_SQL, (identifier, identifier)).fetchone() is not None
     
     if not exists:
         print(f"\033[93mUser {identifier} not found in database\033[0m")
@@ -38,27 +39,23 @@ def check_user_exists(identifier):
 
 
 @api.route('/api/user/<identifier>')
+@cached_user_response
 def get_user_data(identifier):
     """Get user data and network statistics"""
-    db = get_db()
-
     not_in_database = request.args.get('not_in_database', 'false').lower() == 'true'
 
     if not_in_database:
-        return handle_user_not_in_db(identifier, db)
+        # Runs in the background; the client polls the returned job
+        return enqueue_analysis(identifier, get_write_db())
+
+    db = get_db()
+
+    niche = request.args.get('niche')
+    if niche and not niche_exists(db, niche):
+        return niche_not_found(niche)
 
     # Get user with latest metrics in one query
-    user = db.execute("""
-        SELECT u.*, m.pagerank_score, m.pagerank_percentile, 
-                m.inbound_edges, m.outbound_edges
-        FROM users u
-        LEFT JOIN (
-            SELECT *
-            FROM user_daily_metrics
-            WHERE date = (SELECT MAX(date) FROM user_daily_metrics)
-        ) m ON m.user_id = u.user_id
-        WHERE u.user_id = ? OR LOWER(u.username) = LOWER(?)
-    """, (identifier, identifier)).fetchone()
+    user = db.execute(USER_WITH_METRICS_SQL, (identifier, identifier)).fetchone()
 
 
     if not user:
@@ -69,28 +66,18 @@ def get_user_data(identifier):
             'identifier': identifier
         }), 200
 
+    if niche:
+        # Rank within the niche; counts and degrees are the same for every niche
+        user = dict(user)
+        niche_metrics = get_niche_metrics(db, niche, user['user_id'])
+        user['pagerank_score'] = niche_metrics['pagerank_score'] if niche_metrics else None
+        user['pagerank_percentile'] = niche_metrics['pagerank_percentile'] if niche_metrics else None
+
     # Get top followers with their latest metrics
-    followers = db.execute("""
-        SELECT u.*, m.pagerank_score, m.pagerank_percentile
-        FROM users u
-        JOIN following_relationships f ON f.user_id = u.user_id
-        LEFT JOIN (
-            SELECT *
-            FROM user_daily_metrics
-            WHERE date = (SELECT MAX(date) FROM user_daily_metrics)
-        ) m ON m.user_id = u.user_id
-        WHERE f.following_id = ?
-        ORDER BY m.pagerank_score DESC
-        LIMIT 10
-    """, (user['user_id'],)).fetchall()
+    followers = get_top_followers(db, user['user_id'], user['metrics_date'], niche=niche)
 
     # Get reciprocal connections
-    reciprocal = db.execute("""
-        SELECT COUNT(*) as count
-        FROM following_relationships f1
-        JOIN following_relationships f2 ON f1.following_id = f2.user_id
-        WHERE f1.user_id = ? AND f2.following_id = ?
-    """, (user['user_id'], user['user_id'])).fetchone()['count']
+    reciprocal = get_reciprocal_connections(db, user['user_id'])
 
     print(json.dumps(dict(user), indent=2), 'THIS INBOUND')
 
@@ -133,11 +120,7 @@ def get_user_fields(identifier):
     db = get_db()
     
     # Get all user fields
-    user = db.execute("""
-        SELECT *
-        FROM users
-        WHERE user_id = ? OR LOWER(username) = LOWER(?)
-    """, (identifier, identifier)).fetchone()
+    user = db.execute(USER_FIELDS_SQL, (identifier, identifier)).fetchone()
 
     if not user:
         return jsonify({
@@ -157,31 +140,31 @@ def get_user_fields(identifier):
 
 
 @api.route('/api/user/<identifier>/history')
+@cached_user_response
 def get_user_history(identifier):
    """Get user's historical metrics"""
    db = get_db()
    
-   user = db.execute("""
-       SELECT user_id, username 
-       FROM users
-       WHERE user_id = ? OR LOWER(username) = LOWER(?)
-   """, (identifier, identifier)).fetchone()
+   user = db.execute(USER_NAME_SQL, (identifier, identifier)).fetchone()
    
    if not user:
        return jsonify({'error': 'User not found'}), 404
+
+   niche = request.args.get('niche')
+   if niche and not niche_exists(db, niche):
+       return niche_not_found(niche)
+
+   if niche:
+       history = db.execute(NICHE_USER_HISTORY_SQL, (niche, user['user_id'])).fetchall()
+   else:
+       history = db.execute(USER_HISTORY_SQL, (user['user_id'],)).fetchall()
    
-   history = db.execute("""
-       SELECT date, pagerank_score, pagerank_percentile,
-              follower_count, following_count,
-              inbound_edges, outbound_edges
-       FROM user_daily_metrics
-       WHERE user_id = ?
-       ORDER BY date DESC
-       LIMIT 30
-   """, (user['user_id'],)).fetchall()
-   
+   # Dates compacted out of user_daily_metrics come from the snapshots; those
+   # only hold global scores, so a niche history gets counts filled in, no rows
+   history = fill_history([dict(row) for row in history], user['user_id'], append=not niche)
+
    return jsonify({
        'user_id': user['user_id'],
        'username': user['username'],
-       'history': [dict(row) for row in history]
+       'history': history
    })
@@ -0,0 +1,116 @@
+"""
+Trigram username index for /api/search.
+
+Usernames are mirrored into an FTS5 table using the trigram tokenizer, so a
+substring search only visits rows that share the query's trigrams instead of
+scanning every user. The FTS rowid is the numeric user_id, which lets single
+users be replaced in O(log n) when they are (re)inserted.
+"""
+
+from app.app_state import bump_metrics_epoch, ensure_app_state_table
+from app.niches import metrics_join
+
+SEARCH_INDEX_TABLE = 'users_search'
+
+# The trigram tokenizer cannot match anything shorter than one trigram
+MIN_INDEXED_QUERY_LENGTH = 3
+
+SEARCH_SQL = """
+    SELECT u.user_id, u.username, u.profile_pic_url,
+           m.pagerank_score, m.pagerank_percentile,
+           u.follower_count
+    FROM users_search s
+    JOIN users u ON u.user_id = s.user_id
+    {metrics_join}
+    WHERE users_search MATCH :match
+    ORDER BY m.pagerank_score DESC NULLS LAST
+    LIMIT :limit
+"""
+
+LIKE_SEARCH_SQL = """
+    SELECT u.user_id, u.username, u.profile_pic_url,
+           m.pagerank_score, m.pagerank_percentile,
+           u.follower_count
+    FROM users u
+    {metrics_join}
+    WHERE LOWER(username) LIKE LOWER(:pattern)
+    ORDER BY m.pagerank_score DESC NULLS LAST
+    LIMIT :limit
+"""
+
+
+def search_index_exists(db):
+    """Check whether the search index has been built in this database"""
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (SEARCH_INDEX_TABLE,)
+    ).fetchone() is not None
+
+
+def rebuild_search_index(db):
+    """
+    (Re)build the username index from the users table.
+
+    Returns:
+        int: Number of usernames indexed
+    """
+    db.execute(f"DROP TABLE IF EXISTS {SEARCH_INDEX_TABLE}")
+    db.execute(f"""
+        CREATE VIRTUAL TABLE {SEARCH_INDEX_TABLE} USING fts5(
+            username,
+            user_id UNINDEXED,
+            tokenize = 'trigram'
+        )
+    """)
+    db.execute(f"""
+        INSERT INTO {SEARCH_INDEX_TABLE} (rowid, username, user_id)
+        SELECT CAST(user_id AS INTEGER), username, user_id
+        FROM users
+        WHERE username IS NOT NULL
+    """)
+    db.execute(f"INSERT INTO {SEARCH_INDEX_TABLE} ({SEARCH_INDEX_TABLE}) VALUES ('optimize')")
+    ensure_app_state_table(db)
+    bump_metrics_epoch(db)
+    db.commit()
+
+    return db.execute(f"SELECT COUNT(*) FROM {SEARCH_INDEX_TABLE}").fetchone()[0]
+
+
+def index_user(db, user_id, username):
+    """
+    Add or replace a single user in the search index.
+
+    Does nothing if the index has not been built yet, so a partial index is
+    never created behind the search route's back. The caller commits.
+    """
+    if not username or not search_index_exists(db):
+        return
+
+    db.execute(f"DELETE FROM {SEARCH_INDEX_TABLE} WHERE rowid = CAST(? AS INTEGER)", (user_id,))
+    db.execute(f"""
+        INSERT INTO {SEARCH_INDEX_TABLE} (rowid, username, user_id)
+        VALUES (CAST(? AS INTEGER), ?, ?)
+    """, (user_id, username, user_id))
+
+
+def _match_expression(query):
+    """Quote the query as a single FTS5 phrase so it matches as a substring"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def search_users(db, query, limit=10, niche=None):
+    """
+    Find users whose username contains query, ranked by latest pagerank.
+
+    Ranks by the niche's pagerank when a niche key is given. Falls back to
+    the LIKE scan for queries too short to have a trigram or when the index
+    has not been built.
+    """
+    join = metrics_join(niche)
+    params = {'limit': limit, 'niche': niche}
+    if len(query) >= MIN_INDEXED_QUERY_LENGTH and search_index_exists(db):
+        params['match'] = _match_expression(query)
+        return db.execute(SEARCH_SQL.format(metrics_join=join), params).fetchall()
+
+    params['pattern'] = f'%{query}%'
+    return db.execute(LIKE_SEARCH_SQL.format(metrics_join=join), params).fetchall()
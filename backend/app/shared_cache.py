@@ -0,0 +1,255 @@
+"""
+Byte cache in a memory-mapped file, shared by every gunicorn worker.
+
+Per-process caches are duplicated in each worker and start cold after every
+restart. This one lives in a single file next to the database. All workers
+map the same pages, and because the file sits on the volume, a restarted
+machine comes back with a warm cache. Keys include whatever version they
+depend on (the metrics epoch for API responses), so surviving entries are
+never stale.
+
+Layout: a fixed header followed by n_sets * ways fixed-size slots. The
+cache is set-associative: a key's hash picks one set of `ways` consecutive
+slots, and the key may live in any slot of that set. A full set evicts its
+least recently used slot (or an expired one). Each set is guarded by an
+fcntl record lock on its byte range, shared for reads and exclusive for
+writes, plus a per-set mutex because fcntl locks do not exclude threads of
+the same process. Values that do not fit in a slot are not cached.
+
+A file with another geometry is never resized in place, since workers that
+still map it would fault on the truncated pages. Under an exclusive lock
+on the whole file, a fresh file is written next to it and renamed over it.
+Old workers keep their mapping of the old file until they restart.
+"""
+import errno
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MAGIC = b'TCSHMC01'
+HEADER = struct.Struct('<8sIII')        # magic, n_sets, ways, slot_size
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct('<QddHI')   # key hash (0 = empty), expires, last_used, key_len, value_len
+SLOT_HEADER_SIZE = 32
+MAX_KEY_SIZE = 256
+LOCK_RETRY_SECONDS = 0.0005
+
+SHARED_CACHE_SETS = int(os.getenv('SHARED_CACHE_SETS', 1024))
+SHARED_CACHE_WAYS = int(os.getenv('SHARED_CACHE_WAYS', 8))
+SHARED_CACHE_SLOT_SIZE = int(os.getenv('SHARED_CACHE_SLOT_SIZE', 8192))
+
+
+def _hash(key):
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+
+class SharedCache:
+    """
+    Set-associative LRU byte cache in an mmap'd file.
+
+    get/set take bytes keys and values; ttl is in seconds of wall-clock time
+    so entries keep their expiry across restarts.
+    """
+
+    def __init__(self, path, n_sets=SHARED_CACHE_SETS, ways=SHARED_CACHE_WAYS,
+                 slot_size=SHARED_CACHE_SLOT_SIZE):
+        if fcntl is None:
+            raise RuntimeError("SharedCache needs fcntl (POSIX only)")
+        self.path = path
+        self.n_sets = n_sets
+        self.ways = ways
+        self.slot_size = slot_size
+        self.max_value_size = slot_size - SLOT_HEADER_SIZE - MAX_KEY_SIZE
+        self.size = HEADER_SIZE + n_sets * ways * slot_size
+        self._set_mutexes = [threading.Lock() for _ in range(n_sets)]
+        self._fd, self._map = self._open_map()
+
+    def _open_map(self):
+        """(fd, mmap) of a file with this geometry, creating or replacing it"""
+        header = HEADER.pack(MAGIC, self.n_sets, self.ways, self.slot_size)
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.lockf(fd, fcntl.LOCK_EX, 0, 0)
+            try:
+                if os.fstat(fd).st_ino != os.stat(self.path).st_ino:
+                    # Another process renamed a new file in while we waited
+                    os.close(fd)
+                    continue
+                size = os.fstat(fd).st_size
+                if size == 0:
+                    # Just created; nobody can have mapped an empty file
+                    self._init_file(fd, header)
+                elif size != self.size or os.pread(fd, HEADER.size, 0) != header:
+                    new_fd = self._replace_file(header)
+                    os.close(fd)
+                    fd = new_fd
+                shared_map = mmap.mmap(fd, self.size)
+                fcntl.lockf(fd, fcntl.LOCK_UN, 0, 0)
+                return fd, shared_map
+            except BaseException:
+                os.close(fd)
+                raise
+
+    def _init_file(self, fd, header):
+        os.ftruncate(fd, self.size)
+        os.pwrite(fd, header, 0)
+
+    def _replace_file(self, header):
+        """Rename a fresh empty file over self.path; returns its fd"""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, 0, 0)
+            self._init_file(fd, header)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.close(fd)
+            os.unlink(tmp_path)
+            raise
+        return fd
+
+    def _set_range(self, key_hash):
+        set_index = key_hash % self.n_sets
+        start = HEADER_SIZE + set_index * self.ways * self.slot_size
+        return start, self.ways * self.slot_size
+
+    def _lock(self, start, length, exclusive):
+        mutex = self._set_mutexes[(start - HEADER_SIZE) // length]
+        mutex.acquire()
+        try:
+            while True:
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, length, start)
+                    return
+                except OSError as e:
+                    # The kernel checks for deadlocks per process, so two workers
+                    # each holding one set while another of their threads waits
+                    # on the other's set look deadlocked. Holders never take a
+                    # second set lock, so the wait always ends; try again.
+                    if e.errno != errno.EDEADLK:
+                        raise
+                    time.sleep(LOCK_RETRY_SECONDS)
+        except BaseException:
+            mutex.release()
+            raise
+
+    def _unlock(self, start, length):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+        self._set_mutexes[(start - HEADER_SIZE) // length].release()
+
+    def _find(self, start, key_hash, key):
+        """Offset of the slot holding key in the set starting at start, or None"""
+        for way in range(self.ways):
+            offset = start + way * self.slot_size
+            slot_hash, _, _, key_len, _ = SLOT_HEADER.unpack_from(self._map, offset)
+            if slot_hash != key_hash or key_len != len(key):
+                continue
+            key_start = offset + SLOT_HEADER_SIZE
+            if self._map[key_start:key_start + key_len] == key:
+                return offset
+        return None
+
+    def get(self, key):
+        if len(key) > MAX_KEY_SIZE:
+            return None
+        key_hash = _hash(key)
+        start, length = self._set_range(key_hash)
+        self._lock(start, length, exclusive=False)
+        try:
+            offset = self._find(start, key_hash, key)
+            if offset is None:
+                return None
+            _, expires, _, key_len, value_len = SLOT_HEADER.unpack_from(self._map, offset)
+            now = time.time()
+            if expires < now:
+                return None
+            # Benign race: concurrent readers may both stamp last_used
+            struct.pack_into('<d', self._map, offset + 16, now)
+            value_start = offset + SLOT_HEADER_SIZE + MAX_KEY_SIZE
+            return self._map[value_start:value_start + value_len]
+        finally:
+            self._unlock(start, length)
+
+    def set(self, key, value, ttl):
+        """Store value under key; returns False if it does not fit in a slot"""
+        if len(key) > MAX_KEY_SIZE or len(value) > self.max_value_size:
+            return False
+        key_hash = _hash(key)
+        start, length = self._set_range(key_hash)
+        self._lock(start, length, exclusive=True)
+        try:
+            offset = self._find(start, key_hash, key)
+            if offset is None:
+                offset = self._victim(start)
+            now = time.time()
+            # Clear the hash first so a torn write is never matched
+            struct.pack_into('<Q', self._map, offset, 0)
+            key_start = offset + SLOT_HEADER_SIZE
+            self._map[key_start:key_start + len(key)] = key
+            value_start = key_start + MAX_KEY_SIZE
+            self._map[value_start:value_start + len(value)] = value
+            SLOT_HEADER.pack_into(self._map, offset, key_hash, now + ttl, now,
+                                  len(key), len(value))
+            return True
+        finally:
+            self._unlock(start, length)
+
+    def _victim(self, start):
+        """Empty or expired slot of the set if there is one, else its LRU slot"""
+        now = time.time()
+        victim, oldest = start, None
+        for way in range(self.ways):
+            offset = start + way * self.slot_size
+            slot_hash, expires, last_used, _, _ = SLOT_HEADER.unpack_from(self._map, offset)
+            if slot_hash == 0 or expires < now:
+                return offset
+            if oldest is None or last_used < oldest:
+                victim, oldest = offset, last_used
+        return victim
+
+    def clear(self):
+        # Every set's mutex first: unlocking the whole file also drops the
+        # set locks other threads of this process hold
+        for mutex in self._set_mutexes:
+            mutex.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 0, 0)
+            try:
+                for slot in range(self.n_sets * self.ways):
+                    struct.pack_into('<Q', self._map, HEADER_SIZE + slot * self.slot_size, 0)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 0, 0)
+        finally:
+            for mutex in self._set_mutexes:
+                mutex.release()
+
+    def stats(self):
+        """Occupancy read without locks, so it is approximate under writes"""
+        now = time.time()
+        entries = size_bytes = 0
+        for slot in range(self.n_sets * self.ways):
+            slot_hash, expires, _, key_len, value_len = SLOT_HEADER.unpack_from(
+                self._map, HEADER_SIZE + slot * self.slot_size)
+            if slot_hash and expires >= now:
+                entries += 1
+                size_bytes += key_len + value_len
+        return {
+            'path': self.path,
+            'entries': entries,
+            'size_bytes': size_bytes,
+            'slots': self.n_sets * self.ways,
+            'file_bytes': self.size,
+        }
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,159 @@
+"""
+Per-user top followers, precomputed by the daily job.
+
+Pagerank only changes when the daily job runs, so instead of sorting every
+follower of a user on each request, the job ranks each user's followers once
+and stores the top K ids as a JSON array keyed by user_id. The route then does
+a single keyed lookup and falls back to the live query when the stored list is
+older than the user's latest metrics.
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+from scipy.sparse import diags
+
+from app.app_state import bump_metrics_epoch, ensure_app_state_table
+from app.csr_graph import as_csr_graph
+from app.niches import metrics_join
+
+TOP_FOLLOWERS_K = int(os.getenv('TOP_FOLLOWERS_K', 10))
+
+TOP_FOLLOWERS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_top_followers (
+        user_id TEXT PRIMARY KEY,
+        date DATE,
+        follower_ids TEXT
+    )
+"""
+
+PRECOMPUTED_TOP_FOLLOWERS_SQL = """
+    SELECT u.*, m.pagerank_score, m.pagerank_percentile
+    FROM json_each(?) j
+    JOIN users u ON u.user_id = j.value
+    LEFT JOIN user_latest_metrics m ON m.user_id = u.user_id
+    ORDER BY j.key
+    LIMIT ?
+"""
+
+LIVE_TOP_FOLLOWERS_SQL = """
+    SELECT u.*, m.pagerank_score, m.pagerank_percentile
+    FROM users u
+    JOIN following_relationships f ON f.user_id = u.user_id
+    {metrics_join}
+    WHERE f.following_id = :user_id
+    ORDER BY m.pagerank_score DESC
+    LIMIT :limit
+"""
+
+
+def top_k_followers(A, scores, k, listable=None):
+    """
+    Rank every node's followers by score in one vectorized pass.
+
+    Args:
+        A: Sparse adjacency matrix where A[i, j] means i follows j
+        scores: Score per node, in the same order as A's rows
+        k: Number of followers to keep per node
+        listable: Optional bool per node; followers where it is False are
+            left out of every ranking
+
+    Returns:
+        tuple: (indptr, followers) in CSR layout, where
+        followers[indptr[j]:indptr[j + 1]] are node j's top followers,
+        highest score first
+    """
+    if listable is not None:
+        # Zero the rows of followers that cannot be listed, then drop them
+        A = diags(np.asarray(listable, dtype=A.dtype)) @ A
+        A.eliminate_zeros()
+    csc = A.tocsc()
+    n = csc.shape[1]
+    counts = np.diff(csc.indptr)
+    followed = np.repeat(np.arange(n), counts)
+
+    # Group entries by followed node, highest follower score first within each group
+    order = np.lexsort((-scores[csc.indices], followed))
+    rank = np.arange(len(order)) - csc.indptr[followed]
+    keep = order[rank < k]
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.minimum(counts, k), out=indptr[1:])
+    return indptr, csc.indices[keep]
+
+
+def save_top_followers(scores, G, k=TOP_FOLLOWERS_K, db_path='data/twitter.db'):
+    """
+    Precompute and store each user's top-k followers by pagerank score
+
+    Args:
+        scores: user_id -> score dict, or a score array in G's node order
+    """
+    print(f"Computing top {k} followers per user...")
+    G = as_csr_graph(G)
+    node_ids = G.node_ids
+    if isinstance(scores, dict):
+        score_array = np.array([scores[node] for node in node_ids])
+    else:
+        score_array = np.asarray(scores, dtype=np.float64)
+
+    # The route joins the stored ids to users, so only followers with a
+    # profile are ranked; otherwise a stored list could come back short
+    indptr, followers = top_k_followers(G.adjacency(), score_array, k, listable=G.has_profile)
+
+    today = datetime.now().date()
+    rows = (
+        (node_ids[j], today, json.dumps(node_ids[followers[indptr[j]:indptr[j + 1]]].tolist()))
+        for j in range(len(node_ids))
+        if indptr[j + 1] > indptr[j]
+    )
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(TOP_FOLLOWERS_SCHEMA)
+    ensure_app_state_table(c)
+    c.execute('BEGIN TRANSACTION')
+    try:
+        c.execute('DELETE FROM user_top_followers')
+        c.executemany("""
+            INSERT INTO user_top_followers (user_id, date, follower_ids)
+            VALUES (?, ?, ?)
+        """, rows)
+        bump_metrics_epoch(c)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error saving top followers: {e}")
+        raise
+    finally:
+        conn.close()
+
+    print(f"Saved top followers for {today}")
+
+
+def get_top_followers(db, user_id, metrics_date, limit=10, niche=None):
+    """
+    Top followers of a user with their latest metrics.
+
+    Uses the precomputed list when it was written for the same date as the
+    user's latest metrics, otherwise runs the live join. Niche rankings are
+    not precomputed and always use the live join.
+    """
+    top = None
+    if metrics_date is not None and niche is None:
+        try:
+            top = db.execute(
+                "SELECT date, follower_ids FROM user_top_followers WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # Table not created yet (daily job has not run since this was added)
+            top = None
+
+    if top and str(top['date']) == str(metrics_date):
+        return db.execute(PRECOMPUTED_TOP_FOLLOWERS_SQL, (top['follower_ids'], limit)).fetchall()
+
+    return db.execute(LIVE_TOP_FOLLOWERS_SQL.format(metrics_join=metrics_join(niche)),
+                      {'user_id': user_id, 'limit': limit, 'niche': niche}).fetchall()
@@ -0,0 +1,114 @@
+"""
+Daily metrics write throughput and API reader latency while the write runs.
+
+    python -m bench.bench_bulk_write --db data/twitter.db
+    python -m bench.bench_bulk_write --users 300000 --readers 4
+
+For each write mode (the default in-place transaction and bulk=True) a copy
+of the database is written while reader processes run the /api/user lookup
+in a loop. Reports rows/s for the writer and p50/p99/max latency for the
+readers, counting lock errors separately.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from app.graph_builder import build_graph, calculate_pagerank, save_daily_metrics
+from app.latest_metrics import backfill_latest_metrics
+from bench.synthetic import generate
+
+READ_SQL = """
+    SELECT u.*, m.pagerank_score, m.pagerank_percentile,
+            m.inbound_edges, m.outbound_edges, m.date AS metrics_date
+    FROM users u
+    LEFT JOIN user_latest_metrics m ON m.user_id = u.user_id
+    WHERE u.user_id = ?
+"""
+
+
+def reader(db_path, user_ids, stop, results, seed):
+    rng = random.Random(seed)
+    db = sqlite3.connect(db_path, timeout=30)
+    latencies = []
+    errors = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            db.execute(READ_SQL, (rng.choice(user_ids),)).fetchall()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    results.put((latencies, errors))
+
+
+def run_mode(name, db_path, scores, G, n_readers):
+    conn = sqlite3.connect(db_path)
+    user_ids = [row[0] for row in conn.execute("SELECT user_id FROM users LIMIT 50000")]
+    conn.close()
+
+    ctx = multiprocessing.get_context('spawn')
+    stop = ctx.Event()
+    results = ctx.Queue()
+    readers = [ctx.Process(target=reader, args=(db_path, user_ids, stop, results, i))
+               for i in range(n_readers)]
+    for proc in readers:
+        proc.start()
+    time.sleep(1)
+
+    start = time.perf_counter()
+    save_daily_metrics(scores, G, db_path=db_path, bulk=(name == 'bulk'))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    latencies, errors = [], 0
+    for _ in readers:
+        part, part_errors = results.get()
+        latencies.extend(part)
+        errors += part_errors
+    for proc in readers:
+        proc.join()
+
+    return elapsed, np.array(latencies), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--readers', type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    source = args.db
+    if not source:
+        source = os.path.join(workdir, 'source.db')
+        generate(source, n_users=args.users, n_edges=args.users * 5, days=1)
+        backfill_latest_metrics(sqlite3.connect(source))
+
+    G = build_graph(source)
+    scores = calculate_pagerank(G)
+
+    report = []
+    for name in ('default', 'bulk'):
+        db_path = os.path.join(workdir, f'{name}.db')
+        shutil.copy(source, db_path)
+        elapsed, latencies, errors = run_mode(name, db_path, scores, G, args.readers)
+        report.append((name, len(scores) / elapsed, latencies, errors))
+
+    print(f"{'':10}{'rows/s':>10}{'reads':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>10}{'errors':>8}")
+    for name, rate, latencies, errors in report:
+        print(f"{name:10}{rate:10,.0f}{len(latencies):9}{np.percentile(latencies, 50):9.2f}"
+              f"{np.percentile(latencies, 99):9.2f}{latencies.max():10.1f}{errors:8}")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
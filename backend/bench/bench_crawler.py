@@ -0,0 +1,141 @@
+"""
+Follower crawl time: the old sequential client vs app.crawler, against the
+local mock API.
+
+    python -m bench.bench_crawler --db data/twitter.db
+    python -m bench.bench_crawler --latency 0.3 --error-rate 0.1
+
+Both crawlers fetch the same user's followers from bench.mock_twitter_api,
+then count how many followers have metrics in the database. The old one
+waits a fixed 0.1 s between pages, opens a connection per call and looks
+all followers up at the end; the new one paces requests with a token bucket
+over one pooled client and scores each page while the next one is in
+flight. Fails if the two return different followers or counts. A last pass repeats the async
+crawls, which app.remote_cache now answers without calling the mock.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+MOCK_PORT = 8911
+os.environ['RAPID_API_BASE'] = f'http://127.0.0.1:{MOCK_PORT}'
+os.environ.setdefault('RAPID_API_KEY', 'bench')
+# A fresh remote cache, so the first async pass really goes to the mock
+os.environ['REMOTE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'remote_cache.db')
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from app.crawler import API_BASE, HEADERS, get_user_details, stream_followers  # noqa: E402
+from app.latest_metrics import backfill_latest_metrics  # noqa: E402
+from app.remote_cache import remote_cache  # noqa: E402
+from app.routes.handle_user_not_in_db import FollowerScores  # noqa: E402
+from bench.bench_follower_scores import LEGACY_FOLLOWER_METRICS_SQL  # noqa: E402
+from bench.mock_twitter_api import create_mock_app, load_follower_pool  # noqa: E402
+from bench.synthetic import generate  # noqa: E402
+
+
+def legacy_make_request(url, params):
+    """make_request before the crawler: a new client per call, 2**attempt on 429"""
+    response = None
+    for attempt in range(5):
+        try:
+            with httpx.Client() as client:
+                response = client.get(url, headers=HEADERS, params=params)
+                response.raise_for_status()
+                return response.json()
+        except httpx.HTTPStatusError as e:
+            if response and response.status_code == 429:
+                time.sleep(2 ** attempt)
+                continue
+            raise Exception(f"HTTP Error: {str(e)}")
+        except Exception:
+            if attempt == 4:
+                raise
+            time.sleep(1 * attempt)
+    raise Exception("Max retry attempts reached")
+
+
+def legacy_crawl(db, username, max_limit=2500):
+    details = legacy_make_request(f"{API_BASE}/user/details", {"username": username})
+    followers = []
+    continuation_token = ""
+    while len(followers) < max_limit:
+        url = f"{API_BASE}/user/followers"
+        if continuation_token:
+            url += "/continuation"
+        response = legacy_make_request(url, {
+            "user_id": str(details["user_id"]), "limit": 100,
+            "continuation_token": continuation_token,
+        })
+        if not response.get("results"):
+            break
+        followers.extend({'user_id': str(user['user_id'])} for user in response['results'])
+        continuation_token = response.get("continuation_token")
+        time.sleep(0.1)
+    ids = [f['user_id'] for f in followers]
+    sql = LEGACY_FOLLOWER_METRICS_SQL.format(placeholders=','.join('?' * len(ids)))
+    return ids, len(db.execute(sql, ids).fetchall())
+
+
+def crawl(db, username, max_limit=2500):
+    details = get_user_details(username)
+    ids, scores = [], FollowerScores(db)
+    for page in stream_followers(details["user_id"], max_limit):
+        ids.extend(f['user_id'] for f in page)
+        scores.add(page)
+    return ids, scores.result()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--latency', type=float, default=0.15)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--followers', type=int, default=2500)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'twitter.db')
+        generate(db_path, n_users=100_000, n_edges=500_000, days=1)
+        backfill_latest_metrics(sqlite3.connect(db_path))
+
+    mock = create_mock_app(load_follower_pool(db_path), args.followers, args.latency,
+                           args.error_rate)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', MOCK_PORT, mock, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+
+    print(f"{'':12}{'seconds':>10}{'followers':>11}{'with metrics':>14}")
+    results = {}
+    for name, crawler in (('sequential', legacy_crawl), ('async', crawl), ('cached', crawl)):
+        timings = []
+        for run in range(args.runs):
+            start = time.perf_counter()
+            results[name] = crawler(db, f'benchuser{run}', args.followers)
+            timings.append(time.perf_counter() - start)
+        ids, matched = results[name]
+        print(f"{name:12}{sum(timings) / len(timings):10.2f}{len(ids):11}{matched:14}")
+    print(f"mock: {mock.config['stats']['requests']} requests, "
+          f"{mock.config['stats']['throttled']} answered 429")
+    print(f"remote cache: {remote_cache.stats()}")
+    server.shutdown()
+
+    if not results['sequential'] == results['async'] == results['cached']:
+        print("MISMATCH: crawlers returned different followers or counts")
+        sys.exit(1)
+    print("Followers and counts match")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Daily job on TEXT user_ids vs dense integer ids: on-disk size, wall time and
+peak RSS.
+
+    python -m bench.bench_dense_ids --db data/twitter.db
+    python -m bench.bench_dense_ids --users 300000 --edges 3000000
+
+Syncs dense_user_ids / following_edges (timing the first, full sync and a
+no-op incremental one), then reports the size of the edge tables and their
+indexes from dbstat, and how much the database grows by. Each job path then
+runs in a fresh process and builds the graph, runs PageRank and computes the
+metrics columns. The string path
+returns the user_id score dict; the dense path keeps the scores as an array.
+Fails if the two paths score any user differently.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.dense_ids import sync_dense_ids, table_sizes
+from bench.bench_graph_build import peak_rss_mib
+from bench.synthetic import generate
+
+TABLES = ('following_relationships', 'following_edges', 'dense_user_ids')
+
+
+def run_job(db_path, dense, seeds, results):
+    from app.graph_builder import build_graph, calculate_pagerank, metrics_columns
+
+    baseline = peak_rss_mib()
+    start = time.perf_counter()
+    G = build_graph(db_path, dense_ids=dense)
+    scores = calculate_pagerank(G, seed_nodes=seeds, as_array=dense)
+    columns = metrics_columns(scores, G)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mib()
+
+    order = np.argsort(columns['user_id'].astype(str))
+    results['dense' if dense else 'text'] = (
+        elapsed, peak, peak - baseline, columns['pagerank_score'][order].tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--edges', type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'twitter.db')
+        print(f"Generating synthetic database with {args.users} users and ~{args.edges} edges...")
+        generate(db_path, n_users=args.users, n_edges=args.edges, days=0)
+
+    conn = sqlite3.connect(db_path)
+    seeds = [row[0] for row in conn.execute("SELECT user_id FROM users LIMIT 100")]
+    for full in (True, False):
+        start = time.perf_counter()
+        synced = sync_dense_ids(conn, full=full)
+        print(f"{'full' if full else 'incremental'} sync: {time.perf_counter() - start:.1f}s, "
+              f"{synced['ids_added']} ids and {synced['edges_added']} edges added")
+
+    sizes = table_sizes(conn, TABLES)
+    conn.close()
+    if sizes is None:
+        print("This SQLite build has no dbstat; skipping table sizes")
+    else:
+        print(f"\n{'':26}{'table MiB':>12}{'index MiB':>12}")
+        for table in TABLES:
+            print(f"{table:26}{sizes[table]['table'] / 2**20:12.1f}{sizes[table]['indexes'] / 2**20:12.1f}")
+        # following_relationships stays (the crawler and API use it), so the
+        # dense tables are added on top of it
+        before = sum(sizes[TABLES[0]].values())
+        added = sum(sum(sizes[table].values()) for table in TABLES[1:])
+        print(f"Database grows by {added / 2**20:.1f} MiB: edge storage goes from "
+              f"{before / 2**20:.1f} to {(before + added) / 2**20:.1f} MiB (+{100 * added / before:.0f}%)")
+
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Manager() as manager:
+        results = manager.dict()
+        for dense in (False, True):
+            proc = ctx.Process(target=run_job, args=(db_path, dense, seeds, results))
+            proc.start()
+            proc.join()
+
+        print(f"\n{'':10}{'wall s':>10}{'peak MiB':>12}{'growth MiB':>12}")
+        for name in ('text', 'dense'):
+            elapsed, peak, growth, _ = results[name]
+            print(f"{name:10}{elapsed:10.2f}{peak:12.1f}{growth:12.1f}")
+
+        if not np.allclose(results['text'][3], results['dense'][3], rtol=1e-9, atol=1e-12):
+            print("MISMATCH: dense and text paths scored users differently")
+            sys.exit(1)
+    print("Scores match")
+
+
+if __name__ == '__main__':
+    main()
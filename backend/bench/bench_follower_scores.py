@@ -0,0 +1,145 @@
+"""
+New-user follower scoring: IN (...) over user_daily_metrics plus a Python
+loop, vs the set-based json_each query in score_followers, run once or once
+per 100-follower page as the not-in-db path does.
+
+    python -m bench.bench_follower_scores --db data/twitter.db
+    python -m bench.bench_follower_scores --sizes 100 2500 25000 --repeat 5
+
+For each follower count, samples that many follower ids from the database
+(with 10% ids it does not have), scores them each way, and fails if the
+score sums, match counts or top-10 lists differ. The old lookup binds one
+variable per follower, so on SQLite builds with a low variable limit (999
+before 3.32) it fails outright; that is reported instead of a time.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from app.latest_metrics import backfill_latest_metrics
+from app.queries import create_indexes
+from app.crawler import FOLLOWERS_PAGE_SIZE
+from app.routes.handle_user_not_in_db import FollowerScores, score_followers
+from bench.synthetic import generate
+
+LEGACY_FOLLOWER_METRICS_SQL = """
+    WITH LatestDates AS (
+        SELECT user_id, MAX(date) as max_date
+        FROM user_daily_metrics
+        WHERE user_id IN ({placeholders})
+        GROUP BY user_id
+    )
+    SELECT m.user_id, m.pagerank_score, m.pagerank_percentile, m.outbound_edges
+    FROM user_daily_metrics m
+    INNER JOIN LatestDates ld
+        ON m.user_id = ld.user_id
+        AND m.date = ld.max_date
+    WHERE m.outbound_edges > 0
+"""
+
+
+def legacy_score_followers(db, followers, limit=10):
+    """The follower scoring from handle_user_not_in_db before score_followers"""
+    ids = [f['user_id'] for f in followers]
+    sql = LEGACY_FOLLOWER_METRICS_SQL.format(placeholders=','.join('?' * len(ids)))
+    metrics_dict = {str(row['user_id']): row for row in db.execute(sql, ids).fetchall()}
+
+    follower_scores_sum = 0
+    top_followers = []
+    for follower in followers:
+        follower_id = follower['user_id']
+        if follower_id in metrics_dict:
+            metrics = metrics_dict[follower_id]
+            follower_scores_sum += (metrics['pagerank_score'] / (metrics['outbound_edges'] + 1))
+            top_followers.append({
+                'user_id': follower_id,
+                'username': follower['username'],
+                'follower_count': follower['follower_count'],
+                'profile_pic_url': follower['profile_pic_url'],
+                'pagerank_score': metrics['pagerank_score'],
+                'pagerank_percentile': metrics['pagerank_percentile']
+            })
+    top_followers.sort(key=lambda x: x['pagerank_score'], reverse=True)
+    return follower_scores_sum, len(metrics_dict), top_followers[:limit]
+
+
+def score_followers_paged(db, followers, limit=10):
+    """score_followers one crawler page at a time, as analyze_new_user runs it"""
+    scores = FollowerScores(db, limit)
+    for start in range(0, len(followers), FOLLOWERS_PAGE_SIZE):
+        scores.add(followers[start:start + FOLLOWERS_PAGE_SIZE])
+    return scores.result()
+
+
+def sample_followers(db, n, seed):
+    rng = random.Random(seed)
+    known = [row[0] for row in db.execute(
+        "SELECT user_id FROM users ORDER BY RANDOM() LIMIT ?", (n - n // 10,))]
+    unknown = [str(10 ** 15 + rng.randrange(10 ** 9)) for _ in range(n // 10)]
+    ids = known + unknown
+    rng.shuffle(ids)
+    return [{'user_id': user_id, 'username': f'user{user_id}', 'follower_count': 0,
+             'profile_pic_url': None} for user_id in ids]
+
+
+def best_of(repeat, fn, *args):
+    best, result = math.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 2500, 25000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'twitter.db')
+        generate(db_path, n_users=200_000, n_edges=1_000_000, days=5)
+        conn = sqlite3.connect(db_path)
+        backfill_latest_metrics(conn)
+        create_indexes(conn)
+        conn.close()
+
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+
+    print(f"{'followers':>10}{'old ms':>10}{'new ms':>10}{'speedup':>9}{'paged ms':>10}{'matched':>9}")
+    mismatches = 0
+    for n in args.sizes:
+        followers = sample_followers(db, n, seed=n)
+        new_ms, new = best_of(args.repeat, score_followers, db, followers)
+        paged_ms, paged = best_of(args.repeat, score_followers_paged, db, followers)
+        try:
+            old_ms, old = best_of(args.repeat, legacy_score_followers, db, followers)
+        except sqlite3.OperationalError as e:
+            print(f"{n:10}{'-':>10}{new_ms:10.1f}{'':>9}{paged_ms:10.1f}{new[1]:9}  old lookup failed: {e}")
+            continue
+        print(f"{n:10}{old_ms:10.1f}{new_ms:10.1f}{old_ms / new_ms:8.1f}x{paged_ms:10.1f}{new[1]:9}")
+
+        for got in (new, paged):
+            same = (math.isclose(old[0], got[0], rel_tol=1e-9) and old[1] == got[1]
+                    and json.dumps(old[2]) == json.dumps(got[2]))
+            if not same:
+                mismatches += 1
+                print(f"    MISMATCH: sum {old[0]} vs {got[0]}, matched {old[1]} vs {got[1]}")
+
+    if mismatches:
+        sys.exit(1)
+    print("Scores, counts and top followers match")
+
+
+if __name__ == '__main__':
+    main()
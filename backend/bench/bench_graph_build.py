@@ -0,0 +1,120 @@
+"""
+Peak RSS and wall time of graph construction: pandas + networkx vs CSRGraph.
+
+    python -m bench.bench_graph_build --db data/twitter.db
+    python -m bench.bench_graph_build --users 300000 --edges 3000000
+
+Each path runs in a fresh process so peak RSS is not shared between them.
+Both stop once they hold the sparse adjacency matrix PageRank iterates on.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sqlite3
+import tempfile
+import time
+
+from bench.synthetic import generate
+
+
+def build_networkx_graph(db_path, chunk_size):
+    """The build_graph + nx.adjacency_matrix path the daily job used before CSRGraph"""
+    import networkx as nx
+    import pandas as pd
+
+    conn = sqlite3.connect(db_path)
+    users_df = pd.read_sql_query("""
+        SELECT user_id, username, follower_count, following_count,
+               is_verified, profile_pic_url
+        FROM users
+    """, conn)
+    relationships_df = pd.read_sql_query("""
+        SELECT user_id, following_id
+        FROM following_relationships
+    """, conn)
+    conn.close()
+
+    G = nx.DiGraph()
+    for _, user in users_df.iterrows():
+        G.add_node(user['user_id'], **{
+            'username': user['username'],
+            'follower_count': user['follower_count'],
+            'following_count': user['following_count'],
+            'is_verified': user['is_verified'],
+            'profile_pic_url': user['profile_pic_url']
+        })
+    G.add_edges_from(relationships_df.values)
+    return G, nx.adjacency_matrix(G)
+
+
+def build_csr_graph(db_path, chunk_size):
+    from app.graph_builder import build_graph
+
+    G = build_graph(db_path, chunk_size=chunk_size)
+    return G, G.adjacency()
+
+
+PATHS = {
+    'networkx': build_networkx_graph,
+    'csr': build_csr_graph,
+}
+
+
+def peak_rss_mib():
+    """
+    Peak RSS of this process in MiB.
+
+    Prefers VmHWM, because ru_maxrss survives exec and would report the
+    parent's peak in a freshly spawned child.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(name, db_path, chunk_size, results):
+    baseline = peak_rss_mib()
+    start = time.perf_counter()
+    _, A = PATHS[name](db_path, chunk_size)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mib()
+    results[name] = (elapsed, peak, peak - baseline, A.shape[0], A.nnz)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--edges', type=int, default=2_000_000)
+    parser.add_argument('--chunk-size', type=int, default=500_000,
+                        help='Edge rows per fetchmany for the CSR loader')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'twitter.db')
+        print(f"Generating synthetic database with {args.users} users and ~{args.edges} edges...")
+        generate(db_path, n_users=args.users, n_edges=args.edges, days=0)
+
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Manager() as manager:
+        results = manager.dict()
+        for name in PATHS:
+            proc = ctx.Process(target=_measure, args=(name, db_path, args.chunk_size, results))
+            proc.start()
+            proc.join()
+
+        print(f"{'':10}{'wall s':>10}{'peak MiB':>12}{'growth MiB':>12}{'nodes':>12}{'edges':>12}")
+        for name, (elapsed, peak, growth, nodes, edges) in results.items():
+            print(f"{name:10}{elapsed:10.2f}{peak:12.1f}{growth:12.1f}{nodes:12}{edges:12}")
+
+
+if __name__ == '__main__':
+    main()
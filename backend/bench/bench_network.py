@@ -0,0 +1,113 @@
+"""
+Network listings: SQLite joins over following_relationships vs the
+memory-mapped adjacency index.
+
+    python -m bench.bench_network
+    python -m bench.bench_network --users 300000 --edges 3000000 --accounts 20
+
+Builds a synthetic database (the most-followed accounts follow back half of
+their followers), runs the daily job steps, then for the accounts with the
+most followers times: one page of followers by pagerank at offset 0 and deep
+in the list, and the accounts two users both follow. Fails if the index and
+SQLite disagree.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.adjacency_index import AdjacencyIndexStore
+from app.graph_builder import (
+    build_graph, calculate_pagerank, save_adjacency_index, save_daily_metrics,
+)
+from app.queries import create_indexes
+from bench.bench_reciprocal import add_follow_backs
+from bench.synthetic import generate
+
+FOLLOWERS_PAGE_SQL = """
+    SELECT f.user_id
+    FROM following_relationships f
+    JOIN user_latest_metrics m ON m.user_id = f.user_id
+    WHERE f.following_id = ?
+    ORDER BY m.pagerank_score DESC, CAST(f.user_id AS INTEGER)
+    LIMIT ? OFFSET ?
+"""
+
+COMMON_FOLLOWING_SQL = """
+    SELECT COUNT(*)
+    FROM following_relationships f1
+    JOIN following_relationships f2 ON f2.following_id = f1.following_id
+    WHERE f1.user_id = ? AND f2.user_id = ?
+"""
+
+
+def mean_ms(fn, items):
+    start = time.perf_counter()
+    results = [fn(*item) for item in items]
+    return (time.perf_counter() - start) * 1000 / len(items), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--edges', type=int, default=2_000_000)
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--page', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'twitter.db')
+    generate(db_path, n_users=args.users, n_edges=args.edges, days=0)
+    add_follow_backs(db_path, args.accounts, 0.5)
+
+    G = build_graph(db_path)
+    scores = calculate_pagerank(G, as_array=True)
+    save_daily_metrics(scores, G, db_path=db_path)
+    start = time.perf_counter()
+    save_adjacency_index(scores, G, db_path=db_path)
+    print(f"Index written in {time.perf_counter() - start:.1f}s")
+
+    db = sqlite3.connect(db_path)
+    create_indexes(db)
+    index = AdjacencyIndexStore(os.path.join(workdir, 'adjacency')).current()
+    top = G.node_ids[G.in_degree().argsort()[::-1][:args.accounts]].tolist()
+    nodes = [index.node(user_id) for user_id in top]
+
+    def sqlite_page(user_id, offset):
+        return [row[0] for row in db.execute(FOLLOWERS_PAGE_SQL, (user_id, args.page, offset))]
+
+    def index_page(node, offset):
+        return index.user_ids(index.page(node, 'followers', offset, args.page)[0])
+
+    print(f"\n{'':28}{'sqlite ms':>12}{'index ms':>12}")
+    mismatches = 0
+    for label, fraction in (('followers page, offset 0', 0), ('followers page, middle', 0.5)):
+        offsets = [int(index.degree(node, 'followers') * fraction) for node in nodes]
+        sqlite_ms, expected = mean_ms(sqlite_page, list(zip(top, offsets)))
+        index_ms, got = mean_ms(index_page, list(zip(nodes, offsets)))
+        print(f"{label:28}{sqlite_ms:12.3f}{index_ms:12.3f}")
+        mismatches += sum(a != b for a, b in zip(expected, got))
+
+    pairs = list(zip(top, top[1:]))
+    node_pairs = list(zip(nodes, nodes[1:]))
+    sqlite_ms, expected = mean_ms(lambda a, b: db.execute(COMMON_FOLLOWING_SQL, (a, b)).fetchone()[0], pairs)
+    index_ms, got = mean_ms(lambda a, b: len(index.common(a, b, 'following')), node_pairs)
+    print(f"{'common following':28}{sqlite_ms:12.3f}{index_ms:12.3f}")
+    mismatches += sum(a != b for a, b in zip(expected, got))
+
+    index_ms, samples = mean_ms(lambda node: index.ego_sample(node), [(node,) for node in nodes])
+    print(f"{'ego sample (20 x 5)':28}{'-':>12}{index_ms:12.3f}   "
+          f"{np.mean([len(s[0]) for s in samples]):.0f} nodes")
+
+    if mismatches:
+        print(f"MISMATCH: {mismatches} results differ between SQLite and the index")
+        sys.exit(1)
+    print("Index matches SQLite")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Percentile estimation for new users: the JSON anchor file vs the per-date
+quantile sketch in app/percentiles.py.
+
+    python -m bench.bench_percentiles
+    python -m bench.bench_percentiles --users 3000000 --queries 200000
+
+Builds a pagerank-like score distribution (most users tied at the minimum,
+a lognormal tail), saves its sketch to a scratch database, and compares both
+estimators with the exact strict-below percentile. It reports calls/s for
+single scores and for the batch API, and the worst and mean error in
+percentile points. Exits 1 if the sketch is off by more than --max-error
+anywhere.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.percentiles import (
+    ensure_percentile_sketch_table, estimate_percentile, estimate_percentiles,
+    save_percentile_sketch,
+)
+
+
+def legacy_estimate(score):
+    """estimate_pagerank_percentile_fast before the sketch (reads the file every call)"""
+    json_path = os.path.join(os.getcwd(), 'data', 'hardcoded_percentiles.json')
+    with open(json_path) as f:
+        anchors = json.load(f)
+    if score <= anchors[0][0]:
+        return max(1, (score / anchors[0][0]) * anchors[0][1])
+    elif score >= anchors[-1][0]:
+        remaining_range = 100 - anchors[-1][1]
+        overshoot = (score - anchors[-1][0]) / anchors[-1][0]
+        return min(99.9, anchors[-1][1] + (overshoot * remaining_range))
+    for i in range(len(anchors) - 1):
+        if anchors[i][0] <= score <= anchors[i + 1][0]:
+            score_range = anchors[i + 1][0] - anchors[i][0]
+            percentile_range = anchors[i + 1][1] - anchors[i][1]
+            progress = (score - anchors[i][0]) / score_range
+            return anchors[i][1] + (progress * percentile_range)
+    return 50.0
+
+
+def pagerank_like_scores(n, rng):
+    floor = 0.15 / n
+    tail = floor * (1 + rng.lognormal(0, 2, size=n - int(n * 0.6)))
+    return np.concatenate([np.full(int(n * 0.6), floor), tail])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_500_000)
+    parser.add_argument('--queries', type=int, default=100_000)
+    parser.add_argument('--max-error', type=float, default=0.2, help='Percentile points')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    scores = pagerank_like_scores(args.users, rng)
+    sorted_scores = np.sort(scores)
+    queries = np.concatenate([
+        rng.choice(scores, args.queries // 2),
+        rng.uniform(sorted_scores[0], sorted_scores[int(args.users * 0.999)], args.queries // 2),
+    ])
+    exact = np.searchsorted(sorted_scores, queries) / len(sorted_scores) * 100
+
+    workdir = tempfile.mkdtemp()
+    db = sqlite3.connect(os.path.join(workdir, 'twitter.db'))
+    ensure_percentile_sketch_table(db)
+    save_percentile_sketch(db, '2025-01-01', scores)
+    db.commit()
+
+    # A hand-made-style anchor file: 20 points of the same distribution
+    os.makedirs(os.path.join(workdir, 'data'))
+    anchor_pcts = np.linspace(62, 99.5, 20)
+    anchors = [[float(np.percentile(scores, p)), float(p)] for p in anchor_pcts]
+    with open(os.path.join(workdir, 'data', 'hardcoded_percentiles.json'), 'w') as f:
+        json.dump(anchors, f)
+    os.chdir(workdir)
+
+    single = queries[:2000]
+    start = time.perf_counter()
+    legacy = np.array([legacy_estimate(score) for score in single])
+    legacy_rate = len(single) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for score in single:
+        estimate_percentile(db, score)
+    single_rate = len(single) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batch = estimate_percentiles(db, queries)
+    batch_rate = len(queries) / (time.perf_counter() - start)
+
+    legacy_error = np.abs(legacy - exact[:len(single)])
+    sketch_error = np.abs(batch - exact)
+    print(f"{'':22}{'scores/s':>12}{'max err':>10}{'mean err':>10}")
+    print(f"{'anchor file':22}{legacy_rate:12,.0f}{legacy_error.max():10.3f}{legacy_error.mean():10.3f}")
+    print(f"{'sketch, one score':22}{single_rate:12,.0f}")
+    print(f"{'sketch, batch':22}{batch_rate:12,.0f}{sketch_error.max():10.3f}{sketch_error.mean():10.3f}")
+
+    if sketch_error.max() > args.max_error:
+        print(f"Sketch error above {args.max_error} percentile points")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Reciprocal connection counts: the per-request self-join vs the count the
+daily job stores in user_latest_metrics.
+
+    python -m bench.bench_reciprocal --db data/twitter.db
+    python -m bench.bench_reciprocal --users 300000 --edges 3000000 --accounts 50
+
+On a synthetic database the most-followed accounts follow back
+--follow-back of their followers, since the self-join costs one probe per
+account the user follows. Times the batch pass (row sums of A ∘ Aᵀ for
+every node), then compares the self-join with get_reciprocal_connections for
+the accounts that follow the most users and for random ones. Fails if a
+stored count differs from the self-join.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from app.graph_builder import build_graph, metrics_columns, save_daily_metrics
+from app.latest_metrics import get_reciprocal_connections
+from app.queries import RECIPROCAL_COUNT_SQL, create_indexes
+from bench.synthetic import generate
+
+
+def add_follow_backs(db_path, accounts, share):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        INSERT OR IGNORE INTO following_relationships (user_id, following_id)
+        SELECT f.following_id, f.user_id
+        FROM following_relationships f
+        JOIN (
+            SELECT following_id FROM following_relationships
+            GROUP BY following_id ORDER BY COUNT(*) DESC LIMIT ?
+        ) top ON top.following_id = f.following_id
+        WHERE abs(random()) % 1000 < ?
+    """, (accounts, int(share * 1000)))
+    conn.commit()
+    conn.close()
+
+
+def mean_ms(fn, user_ids):
+    start = time.perf_counter()
+    results = [fn(user_id) for user_id in user_ids]
+    return (time.perf_counter() - start) * 1000 / len(user_ids), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database, written to (default: generate a synthetic one)')
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--edges', type=int, default=2_000_000)
+    parser.add_argument('--accounts', type=int, default=50, help='Accounts per group')
+    parser.add_argument('--follow-back', type=float, default=0.5,
+                        help='Share of followers the top synthetic accounts follow back')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'twitter.db')
+        generate(db_path, n_users=args.users, n_edges=args.edges, days=0)
+        add_follow_backs(db_path, args.accounts, args.follow_back)
+
+    G = build_graph(db_path)
+    start = time.perf_counter()
+    reciprocal = G.reciprocal_degree()
+    print(f"A ∘ Aᵀ row sums for {G.n:,} nodes: {time.perf_counter() - start:.2f}s")
+    scores = metrics_columns(G.in_degree() / max(G.number_of_edges(), 1), G)['pagerank_score']
+    save_daily_metrics(scores, G, db_path=db_path)
+
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    create_indexes(db)
+    top = G.node_ids[G.out_degree().argsort()[::-1][:args.accounts]].tolist()
+    rand = [row[0] for row in db.execute("SELECT user_id FROM users ORDER BY RANDOM() LIMIT ?",
+                                         (args.accounts,))]
+
+    def live(user_id):
+        return db.execute(RECIPROCAL_COUNT_SQL, (user_id, user_id)).fetchone()['count']
+
+    def stored(user_id):
+        return get_reciprocal_connections(db, user_id)
+
+    print(f"\n{'':18}{'self-join ms':>14}{'stored ms':>12}{'max count':>12}")
+    mismatches = 0
+    for name, user_ids in (('most following', top), ('random', rand)):
+        live_ms, expected = mean_ms(live, user_ids)
+        stored_ms, got = mean_ms(stored, user_ids)
+        print(f"{name:18}{live_ms:14.3f}{stored_ms:12.3f}{max(expected):12}")
+        mismatches += sum(a != b for a, b in zip(expected, got))
+
+    if mismatches or int(reciprocal.sum()) != db.execute("""
+        SELECT COUNT(*) FROM following_relationships f1
+        JOIN following_relationships f2
+            ON f2.user_id = f1.following_id AND f2.following_id = f1.user_id
+    """).fetchone()[0]:
+        print("MISMATCH: stored reciprocal counts differ from the self-join")
+        sys.exit(1)
+    print("Stored counts match the self-join")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Rows/s of save_daily_metrics: per-row pandas loop vs column arrays.
+
+    python -m bench.bench_save_metrics --db data/twitter.db
+    python -m bench.bench_save_metrics --users 500000
+
+Runs both writers on separate copies of the database (the original is never
+written), then fails if the two user_daily_metrics tables differ in any value
+or SQLite type.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.graph_builder import build_graph, calculate_pagerank, save_daily_metrics
+from app.latest_metrics import UPSERT_LATEST_METRICS_SQL, ensure_latest_metrics_table
+from bench.synthetic import generate
+
+
+def legacy_save_daily_metrics(scores, G, db_path):
+    """save_daily_metrics before it was vectorized (iterrows + percentile dict)"""
+    import pandas as pd
+
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    ensure_latest_metrics_table(c)
+    today = datetime.now().date()
+    in_degrees = G.in_degree()
+    out_degrees = G.out_degree()
+
+    df = pd.DataFrame(list(scores.items()), columns=['user_id', 'pagerank_score'])
+    sorted_scores = np.sort(df['pagerank_score'].values)
+    score_to_percentile = {}
+    for score in df['pagerank_score'].unique():
+        position = np.searchsorted(sorted_scores, score)
+        score_to_percentile[score] = (position / len(sorted_scores)) * 100
+
+    def count_or_none(value):
+        return None if np.isnan(value) else int(value)
+
+    data = []
+    chunk_size = 100000
+    c.execute('BEGIN TRANSACTION')
+    c.execute('DELETE FROM user_latest_metrics')
+    for i in range(0, len(df), chunk_size):
+        for _, row in df.iloc[i:i + chunk_size].iterrows():
+            user_id = row['user_id']
+            score = row['pagerank_score']
+            idx = G.node_index[user_id]
+            data.append((
+                user_id, today, float(score), float(score_to_percentile[score]),
+                count_or_none(G.follower_count[idx]) if G.has_profile[idx] else 0,
+                count_or_none(G.following_count[idx]) if G.has_profile[idx] else 0,
+                int(in_degrees[idx]), int(out_degrees[idx]),
+            ))
+        c.executemany('''
+            INSERT OR REPLACE INTO user_daily_metrics
+            (user_id, date, pagerank_score, pagerank_percentile,
+            follower_count, following_count, inbound_edges, outbound_edges)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', data)
+        c.executemany(UPSERT_LATEST_METRICS_SQL, data)
+        data = []
+    conn.commit()
+    conn.close()
+
+
+def todays_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT user_id, pagerank_score, pagerank_percentile, follower_count,
+               typeof(follower_count), following_count, typeof(following_count),
+               inbound_edges, outbound_edges
+        FROM user_daily_metrics
+        WHERE date = ?
+        ORDER BY user_id
+    """, (datetime.now().date(),)).fetchall()
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--users', type=int, default=200_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    source = args.db
+    if not source:
+        source = os.path.join(workdir, 'source.db')
+        generate(source, n_users=args.users, n_edges=args.users * 5, days=0)
+
+    G = build_graph(source)
+    scores = calculate_pagerank(G)
+
+    timings = {}
+    paths = {}
+    for name, writer in (('iterrows', legacy_save_daily_metrics), ('columns', save_daily_metrics)):
+        paths[name] = os.path.join(workdir, f'{name}.db')
+        shutil.copy(source, paths[name])
+        start = time.perf_counter()
+        writer(scores, G, db_path=paths[name])
+        timings[name] = time.perf_counter() - start
+
+    print(f"{'':10}{'seconds':>10}{'rows/s':>12}")
+    for name, elapsed in timings.items():
+        print(f"{name:10}{elapsed:10.2f}{len(scores) / elapsed:12,.0f}")
+
+    if todays_rows(paths['iterrows']) != todays_rows(paths['columns']):
+        print("MISMATCH: user_daily_metrics contents differ")
+        sys.exit(1)
+    print("Tables identical")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare /api/search latency: LIKE '%q%' scan vs the trigram username index.
+
+    python -m bench.bench_search --db data/twitter.db
+    python -m bench.bench_search --users 500000      # synthetic database
+
+Queries are random substrings of real usernames, run through the same SQL
+the route uses, and reported as p50/p99 in milliseconds.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from app.latest_metrics import backfill_latest_metrics
+from app.search_index import rebuild_search_index, search_users
+from bench.synthetic import generate
+
+# The query /api/search ran before the index and the latest-metrics table
+LEGACY_SEARCH_SQL = """
+    SELECT u.user_id, u.username, u.profile_pic_url,
+           m.pagerank_score, m.pagerank_percentile,
+           u.follower_count
+    FROM users u
+    LEFT JOIN (
+        SELECT *
+        FROM user_daily_metrics
+        WHERE date = (SELECT MAX(date) FROM user_daily_metrics)
+    ) m ON m.user_id = u.user_id
+    WHERE LOWER(username) LIKE LOWER(?)
+    ORDER BY m.pagerank_score DESC NULLS LAST
+    LIMIT ?
+"""
+
+
+def sample_queries(db, count, seed=0):
+    rng = random.Random(seed)
+    usernames = [row[0] for row in db.execute(
+        "SELECT username FROM users WHERE username IS NOT NULL ORDER BY RANDOM() LIMIT ?",
+        (count,))]
+    queries = []
+    for name in usernames:
+        length = rng.randint(3, min(8, max(3, len(name))))
+        start = rng.randint(0, max(0, len(name) - length))
+        queries.append(name[start:start + length])
+    return queries
+
+
+def time_queries(run, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        run(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'twitter.db')
+        print(f"Generating synthetic database with {args.users} users...")
+        generate(db_path, n_users=args.users, n_edges=args.users * 5, days=2)
+
+    db = sqlite3.connect(db_path)
+    backfill_latest_metrics(db)
+    start = time.perf_counter()
+    count = rebuild_search_index(db)
+    print(f"Built index over {count} usernames in {time.perf_counter() - start:.2f}s")
+
+    queries = sample_queries(db, args.queries)
+    legacy = time_queries(lambda q: db.execute(LEGACY_SEARCH_SQL, (f'%{q}%', 10)).fetchall(), queries)
+    indexed = time_queries(lambda q: search_users(db, q), queries)
+
+    print(f"{'':12}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'LIKE scan':12}{legacy[0]:10.2f}{legacy[1]:10.2f}")
+    print(f"{'trigram':12}{indexed[0]:10.2f}{indexed[1]:10.2f}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Daily metrics history: SQLite rows vs columnar snapshots.
+
+    python -m bench.bench_snapshots
+    python -m bench.bench_snapshots --users 500000 --days 30 --lookups 2000
+
+Generates a synthetic database with --days of metrics, snapshots every date,
+then compares bytes per day (SQLite table + its primary key index, from
+dbstat, vs the .npy files). It also times 30-day history reads for random
+users and point lookups of one column for one date. Fails if any history
+read from the snapshots differs from SQLite.
+
+Then gives the sampled users a niche score on the newest date only, compacts
+every date out of user_daily_metrics and checks that niche histories
+keep their one row, with counts filled from the snapshot, and never pick up
+the global scores of older snapshots.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from app.niches import ensure_niche_tables
+from app.queries import NICHE_USER_HISTORY_SQL, USER_HISTORY_SQL
+from app.snapshots import SnapshotStore, fill_history, snapshot_from_db
+from bench.synthetic import generate
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'twitter.db')
+    snapshot_dir = os.path.join(workdir, 'snapshots')
+    generate(db_path, n_users=args.users, n_edges=args.users * 5, days=args.days)
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+
+    start = time.perf_counter()
+    dates = [row[0] for row in db.execute("SELECT DISTINCT date FROM user_daily_metrics")]
+    for date in dates:
+        snapshot_from_db(db, date, snapshot_dir)
+    print(f"Snapshotted {len(dates)} dates in {time.perf_counter() - start:.1f}s")
+
+    sqlite_bytes = db.execute("""
+        SELECT SUM(pgsize) FROM dbstat
+        WHERE name IN ('user_daily_metrics', 'sqlite_autoindex_user_daily_metrics_1')
+    """).fetchone()[0]
+    snapshot_bytes = dir_size(snapshot_dir)
+    print(f"bytes per day:  sqlite {sqlite_bytes / len(dates):,.0f}   "
+          f"snapshots {snapshot_bytes / len(dates):,.0f}")
+
+    store = SnapshotStore(snapshot_dir)
+    user_ids = [row[0] for row in db.execute(
+        "SELECT user_id FROM users ORDER BY RANDOM() LIMIT ?", (args.lookups,))]
+
+    start = time.perf_counter()
+    from_sqlite = [[dict(row) for row in db.execute(USER_HISTORY_SQL, (user_id,))]
+                   for user_id in user_ids]
+    sqlite_ms = (time.perf_counter() - start) * 1000 / len(user_ids)
+
+    start = time.perf_counter()
+    from_snapshots = [store.history(user_id) for user_id in user_ids]
+    snapshot_ms = (time.perf_counter() - start) * 1000 / len(user_ids)
+    print(f"30-day history: sqlite {sqlite_ms:.3f} ms   snapshots {snapshot_ms:.3f} ms")
+
+    date = random.choice(dates)
+    start = time.perf_counter()
+    for user_id in user_ids:
+        db.execute("SELECT pagerank_score FROM user_daily_metrics WHERE user_id = ? AND date = ?",
+                   (user_id, date)).fetchone()
+    sqlite_ms = (time.perf_counter() - start) * 1000 / len(user_ids)
+    snapshot = store.get(date)
+    start = time.perf_counter()
+    for user_id in user_ids:
+        snapshot.lookup(user_id, ('pagerank_score',))
+    snapshot_ms = (time.perf_counter() - start) * 1000 / len(user_ids)
+    print(f"point lookup:   sqlite {sqlite_ms:.3f} ms   snapshots {snapshot_ms:.3f} ms")
+
+    if from_sqlite != from_snapshots:
+        print("MISMATCH: snapshot history differs from SQLite")
+        sys.exit(1)
+    print("Histories match")
+
+    newest = max(dates)
+    ensure_niche_tables(db)
+    db.executemany("""
+        INSERT OR REPLACE INTO user_niche_daily_metrics
+            (niche, user_id, date, pagerank_score, pagerank_percentile)
+        VALUES ('bench', ?, ?, 0.001, 50.0)
+    """, [(user_id, newest) for user_id in user_ids])
+    db.execute("DELETE FROM user_daily_metrics")
+    db.commit()
+
+    bad = 0
+    for user_id in user_ids:
+        niche_history = fill_history(
+            [dict(row) for row in db.execute(NICHE_USER_HISTORY_SQL, ('bench', user_id))],
+            user_id, store=store, append=False)
+        global_row = store.get(newest).lookup(user_id)
+        if (len(niche_history) != 1 or niche_history[0]['pagerank_score'] != 0.001
+                or (global_row and niche_history[0]['follower_count'] != global_row['follower_count'])):
+            bad += 1
+    if bad:
+        print(f"MISMATCH: {bad} niche histories picked up snapshot rows or lost their counts")
+        sys.exit(1)
+    print("Niche histories keep only their own dates")
+
+
+if __name__ == '__main__':
+    main()
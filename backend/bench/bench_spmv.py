@@ -0,0 +1,68 @@
+"""
+Scaling of the row-partitioned parallel SpMV used by power_iteration.
+
+    python -m bench.bench_spmv --nodes 2000000 --edges 40000000
+
+Builds the PageRank transition matrix of a synthetic power-law graph, checks
+that every worker count gives the same result as the serial kernel, and
+reports mat-vecs per second for 1/2/4/8 workers.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from app.pagerank import ParallelSpMV, spmv
+from bench.synthetic import power_law_edges
+
+
+def transition_matrix(n, src, dst):
+    A = coo_matrix((np.ones(len(src)), (src, dst)), shape=(n, n)).tocsr()
+    out_degrees = np.asarray(A.sum(axis=1)).ravel()
+    out_degrees[out_degrees == 0] = 1
+    return A.multiply(1 / out_degrees[:, None]).T.tocsr()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=1_000_000)
+    parser.add_argument('--edges', type=int, default=20_000_000)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"Building power-law graph with {args.nodes} nodes and ~{args.edges} edges...")
+    src, dst = power_law_edges(args.nodes, args.edges)
+    M = transition_matrix(args.nodes, src, dst)
+    x = np.random.default_rng(0).random(args.nodes)
+
+    expected = spmv(M, x, np.empty(args.nodes))
+    print(f"{M.nnz} nonzeros, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8}{'matvec/s':>12}{'speedup':>10}{'identical':>11}")
+
+    baseline = None
+    for workers in args.workers:
+        out = np.empty(args.nodes)
+        if workers == 1:
+            matvec = lambda x, out: spmv(M, x, out)
+            parallel = None
+        else:
+            matvec = parallel = ParallelSpMV(M, workers)
+
+        matvec(x, out)
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            matvec(x, out)
+        rate = args.repeats / (time.perf_counter() - start)
+        if parallel is not None:
+            parallel.close()
+
+        baseline = baseline or rate
+        identical = np.array_equal(out, expected)
+        print(f"{workers:8}{rate:12.1f}{rate / baseline:10.2f}{str(identical):>11}")
+
+
+if __name__ == '__main__':
+    main()
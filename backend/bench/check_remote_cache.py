@@ -0,0 +1,84 @@
+"""
+Behaviour check for the remote-lookup cache against the local mock API.
+
+    python -m bench.check_remote_cache
+
+Counts the requests that reach bench.mock_twitter_api while:
+  - several threads look up one new handle at once (one upstream call),
+  - the same handle is looked up again (served from the cache),
+  - a handle that does not exist is looked up twice (one 404 upstream),
+  - a lookup answered with a quota error body is repeated (not cached),
+  - a follower crawl is repeated (no upstream calls the second time).
+Exits 1 if any count is off.
+"""
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MOCK_PORT = 8913
+os.environ['RAPID_API_BASE'] = f'http://127.0.0.1:{MOCK_PORT}'
+os.environ.setdefault('RAPID_API_KEY', 'bench')
+os.environ['REMOTE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'remote_cache.db')
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from app.crawler import get_followers, get_user_details  # noqa: E402
+from app.remote_cache import remote_cache  # noqa: E402
+from bench.mock_twitter_api import create_mock_app, load_follower_pool  # noqa: E402
+
+
+def main():
+    mock = create_mock_app(load_follower_pool(), n_followers=450, latency=0.2, error_rate=0)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', MOCK_PORT, mock, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stats = mock.config['stats']
+    failures = []
+
+    def expect(name, upstream, expected):
+        status = 'ok' if upstream == expected else 'FAIL'
+        print(f"{status:5}{name}: {upstream} upstream requests (expected {expected})")
+        if upstream != expected:
+            failures.append(name)
+
+    def upstream_during(action):
+        before = stats['requests']
+        action()
+        return stats['requests'] - before
+
+    def concurrent_lookups():
+        with ThreadPoolExecutor(8) as pool:
+            users = list(pool.map(get_user_details, ['SameHandle'] * 8))
+        assert len({user['user_id'] for user in users}) == 1
+
+    def missing_lookup():
+        try:
+            get_user_details('missing_handle')
+        except Exception as e:
+            assert '404' in str(e), e
+        else:
+            raise AssertionError("expected a 404")
+
+    expect("8 concurrent lookups of a new handle", upstream_during(concurrent_lookups), 1)
+    expect("repeat lookup", upstream_during(lambda: get_user_details('samehandle')), 0)
+    expect("missing handle, first lookup", upstream_during(missing_lookup), 1)
+    expect("missing handle, second lookup", upstream_during(missing_lookup), 0)
+    expect("quota error, first lookup", upstream_during(lambda: get_user_details('quota_handle')), 1)
+    expect("quota error, second lookup", upstream_during(lambda: get_user_details('quota_handle')), 1)
+    followers = []
+    expect("first follower crawl", upstream_during(lambda: followers.append(get_followers('42'))), 5)
+    expect("repeat follower crawl", upstream_during(lambda: followers.append(get_followers('42'))), 0)
+    if followers[0] != followers[1] or len(followers[0]) != 450:
+        print("FAIL repeat crawl returned different followers")
+        failures.append('followers')
+
+    print(f"remote cache: {remote_cache.stats()}")
+    server.shutdown()
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
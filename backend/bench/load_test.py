@@ -0,0 +1,155 @@
+"""
+HTTP load test for the read API: a new connection per request, pooled
+read-only connections, and pooled connections plus the response cache.
+
+    python -m bench.load_test --db data/twitter.db
+    python -m bench.load_test --users 200000 --clients 8 --duration 20 --popular 500
+
+Starts the app in a threaded server process once per mode and has client
+threads hit a mix of /api/user, /api/user/<id>/history, /api/search and
+/api/userExists with random users for a fixed time. Reports requests/s and
+latency percentiles. The per-request mode swaps the pool for the old get_db
+(a fresh sqlite3.connect per request, never closed). The memory and shared
+modes add the response cache with each backend, starting cold. --popular limits the users to the N
+most-followed accounts, which is closer to real traffic.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from bench.synthetic import generate
+
+# mode -> RESPONSE_CACHE_BACKEND
+MODES = {
+    'per-request': 'none',
+    'pooled': 'none',
+    'memory': 'memory',
+    'shared': 'shared',
+}
+
+
+def legacy_connection():
+    """get_db before connections were pooled (still timed, so both modes pay for that)"""
+    from app.db import DB_PATH, TimedConnection
+
+    db = sqlite3.connect(DB_PATH, factory=TimedConnection)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+def serve(db_path, mode, port, ready):
+    import builtins
+    import logging
+    os.environ['DATABASE_PATH'] = db_path
+    os.environ['RESPONSE_CACHE_BACKEND'] = MODES[mode]
+    os.environ['SHARED_CACHE_PATH'] = f'{db_path}.{port}.cache'
+    builtins.print = lambda *args, **kwargs: None  # routes log every request
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    from werkzeug.serving import make_server
+
+    import app.db
+    from app import create_app
+
+    if mode == 'per-request':
+        app.db._pooled_reader = legacy_connection
+    server = make_server('127.0.0.1', port, create_app(), threaded=True)
+    ready.set()
+    server.serve_forever()
+
+
+def client(base_url, users, deadline, seed, latencies, errors):
+    rng = random.Random(seed)
+    with httpx.Client(base_url=base_url, timeout=30) as http:
+        while time.perf_counter() < deadline:
+            user_id, username = rng.choice(users)
+            path = rng.choice((
+                f'/api/user/{user_id}',
+                f'/api/user/{username}',
+                f'/api/user/{user_id}/history',
+                f'/api/search?q={username[:4]}',
+                f'/api/userExists/{username}',
+            ))
+            start = time.perf_counter()
+            try:
+                response = http.get(path)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors.append(path)
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+
+def run_mode(db_path, mode, port, users, clients, duration):
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Event()
+    server = ctx.Process(target=serve, args=(db_path, mode, port, ready), daemon=True)
+    server.start()
+    ready.wait(60)
+    base_url = f'http://127.0.0.1:{port}'
+
+    # Warm up both modes the same way before measuring
+    client(base_url, users, time.perf_counter() + 2, -1, [], [])
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(base_url, users, deadline, i, latencies, errors))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    server.terminate()
+    server.join()
+    if os.path.exists(f'{db_path}.{port}.cache'):
+        os.remove(f'{db_path}.{port}.cache')
+    return np.array(latencies), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', help='Existing database (default: generate a synthetic one)')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--popular', type=int, help='Only request the N most-followed users')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'twitter.db')
+        generate(db_path, n_users=args.users, n_edges=args.users * 5, days=1)
+        from app.latest_metrics import backfill_latest_metrics
+        backfill_latest_metrics(sqlite3.connect(db_path))
+    db_path = os.path.abspath(db_path)
+
+    conn = sqlite3.connect(db_path)
+    order = 'follower_count DESC' if args.popular else 'RANDOM()'
+    users = conn.execute(f"""
+        SELECT user_id, username FROM users
+        WHERE username IS NOT NULL
+        ORDER BY {order}
+        LIMIT ?
+    """, (args.popular or 10000,)).fetchall()
+    conn.close()
+
+    print(f"{'':12}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for offset, mode in enumerate(MODES):
+        latencies, errors = run_mode(db_path, mode, args.port + offset, users,
+                                     args.clients, args.duration)
+        print(f"{mode:12}{len(latencies) / args.duration:9.1f}{np.percentile(latencies, 50):9.2f}"
+              f"{np.percentile(latencies, 99):9.2f}{errors:8}")
+
+
+if __name__ == '__main__':
+    main()
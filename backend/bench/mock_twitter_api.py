@@ -0,0 +1,125 @@
+"""
+Local stand-in for the RapidAPI Twitter endpoints the not-in-db path calls.
+
+    python -m bench.mock_twitter_api --port 8900 --latency 0.25 --error-rate 0.05
+    RAPID_API_BASE=http://127.0.0.1:8900 RAPID_API_KEY=test python run.py
+
+Serves /user/details, /user/followers and /user/followers/continuation with
+deterministic users, 100-per-page continuation tokens, a random per-request
+delay, and a share of 429 responses with a Retry-After header. Usernames
+starting with "missing" get a 404, and usernames starting with "quota" a 200
+quota error body, as RapidAPI sends when a plan runs out. With --db, the followers are drawn from
+that database's users, so metrics lookups hit.
+"""
+import argparse
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+
+def create_mock_app(follower_pool, n_followers=2500, latency=0.25, error_rate=0.05,
+                    retry_after=0.2, seed=0):
+    """
+    Args:
+        follower_pool: user_ids followers are sampled from
+        latency: Mean response delay in seconds (uniform in [0.5x, 1.5x])
+        error_rate: Share of requests answered with 429
+    """
+    app = Flask(__name__)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    app.config['stats'] = {'requests': 0, 'throttled': 0}
+
+    def followers_of(user_id):
+        local = random.Random(int(hashlib.md5(user_id.encode()).hexdigest(), 16))
+        ids = local.sample(follower_pool, min(n_followers, len(follower_pool)))
+        return [{
+            'user_id': int(follower_id) if follower_id.isdigit() else follower_id,
+            'username': f'follower{follower_id}',
+            'follower_count': local.randint(0, 50000),
+            'profile_pic_url': f'https://pbs.twimg.com/{follower_id}.jpg',
+        } for follower_id in ids]
+
+    @app.before_request
+    def simulate_network():
+        if not request.headers.get('x-rapidapi-key'):
+            return jsonify({'message': 'missing key'}), 401
+        with rng_lock:
+            delay = latency * rng.uniform(0.5, 1.5)
+            throttled = rng.random() < error_rate
+        app.config['stats']['requests'] += 1
+        time.sleep(delay)
+        if throttled:
+            app.config['stats']['throttled'] += 1
+            return jsonify({'message': 'Too many requests'}), 429, {'Retry-After': str(retry_after)}
+
+    @app.route('/user/details')
+    def user_details():
+        username = request.args['username']
+        if username.lower().startswith('missing'):
+            return jsonify({'detail': 'Not Found'}), 404
+        if username.lower().startswith('quota'):
+            return jsonify({'message': 'You have exceeded the MONTHLY quota for Requests on your current plan'})
+        user_id = int(hashlib.md5(username.lower().encode()).hexdigest()[:12], 16)
+        return jsonify({
+            'user_id': user_id,
+            'username': username,
+            'name': username,
+            'follower_count': n_followers * 40,
+            'following_count': 321,
+            'description': 'mock user',
+            'creation_date': 'Mon Jan 01 00:00:00 +0000 2020',
+            'is_private': False,
+            'is_verified': False,
+            'location': '',
+            'profile_pic_url': f'https://pbs.twimg.com/{user_id}.jpg',
+            'number_of_tweets': 1000,
+        })
+
+    @app.route('/user/followers')
+    @app.route('/user/followers/continuation')
+    def user_followers():
+        followers = followers_of(request.args['user_id'])
+        offset = int(request.args.get('continuation_token') or 0)
+        limit = int(request.args.get('limit', 100))
+        page = followers[offset:offset + limit]
+        next_offset = offset + len(page)
+        return jsonify({
+            'results': page,
+            'continuation_token': str(next_offset) if next_offset < len(followers) else None,
+        })
+
+    return app
+
+
+def load_follower_pool(db_path=None, size=50000):
+    if not db_path:
+        return [str(10 ** 9 + i) for i in range(size)]
+    conn = sqlite3.connect(db_path)
+    pool = [row[0] for row in conn.execute(
+        "SELECT user_id FROM users ORDER BY RANDOM() LIMIT ?", (size,))]
+    conn.close()
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--db', help='Draw followers from this database')
+    parser.add_argument('--followers', type=int, default=2500)
+    parser.add_argument('--latency', type=float, default=0.25)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--retry-after', type=float, default=0.2)
+    args = parser.parse_args()
+
+    app = create_mock_app(load_follower_pool(args.db), args.followers, args.latency,
+                          args.error_rate, args.retry_after)
+    app.run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
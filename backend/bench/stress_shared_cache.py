@@ -0,0 +1,119 @@
+"""
+Multi-process stress test for the memory-mapped shared cache.
+
+    python -m bench.stress_shared_cache
+    python -m bench.stress_shared_cache --processes 8 --threads 2 --seconds 20
+
+Several processes (each with a few threads) hammer one small cache file with
+a mix of gets and sets over more keys than it has slots, so sets constantly
+evict each other. Every value encodes its key and a checksum. A get that
+returns a value for another key, or a corrupted one, counts as an error, as
+does a thread dying on an exception.
+Reports operations/s and hit rate, and exits 1 on any error.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app.shared_cache import SharedCache
+
+
+def make_value(key, rng):
+    payload = rng.randbytes(rng.randint(0, 6000))
+    return key + b'|' + hashlib.blake2b(key + payload, digest_size=16).digest() + payload
+
+
+def check_value(key, value):
+    prefix = key + b'|'
+    if not value.startswith(prefix):
+        return False
+    digest, payload = value[len(prefix):len(prefix) + 16], value[len(prefix) + 16:]
+    return hashlib.blake2b(key + payload, digest_size=16).digest() == digest
+
+
+def worker(path, geometry, n_keys, threads, seconds, seed, results):
+    cache = SharedCache(path, *geometry)
+    totals = {'gets': 0, 'hits': 0, 'sets': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        counts = dict.fromkeys(totals, 0)
+        deadline = time.perf_counter() + seconds
+        try:
+            while time.perf_counter() < deadline:
+                # Zipf-ish key popularity, like API traffic
+                key = f'user:{int(n_keys ** rng.random()) - 1}'.encode()
+                if rng.random() < 0.8:
+                    value = cache.get(key)
+                    counts['gets'] += 1
+                    if value is not None:
+                        counts['hits'] += 1
+                        if not check_value(key, value):
+                            counts['errors'] += 1
+                else:
+                    cache.set(key, make_value(key, rng), ttl=60)
+                    counts['sets'] += 1
+        except Exception as e:
+            print(f"thread {thread_seed} failed: {e!r}")
+            counts['errors'] += 1
+        with lock:
+            for name, count in counts.items():
+                totals[name] += count
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    cache.close()
+    results.put(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--keys', type=int, default=5000)
+    parser.add_argument('--sets', type=int, default=64, help='Cache sets (ways are 8)')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'stress.mmap')
+    geometry = (args.sets, 8, 8192)
+    SharedCache(path, *geometry).close()
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(path, geometry, args.keys, args.threads,
+                                              args.seconds, i, results))
+             for i in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    totals = dict.fromkeys(('gets', 'hits', 'sets', 'errors'), 0)
+    for _ in procs:
+        for name, count in results.get().items():
+            totals[name] += count
+    for proc in procs:
+        proc.join()
+
+    cache = SharedCache(path, *geometry)
+    print(f"processes x threads: {args.processes} x {args.threads}, "
+          f"{args.keys} keys over {geometry[0] * geometry[1]} slots")
+    print(f"ops/s:    {(totals['gets'] + totals['sets']) / args.seconds:,.0f}")
+    print(f"hit rate: {totals['hits'] / max(totals['gets'], 1):.3f}")
+    print(f"entries:  {cache.stats()['entries']}")
+    print(f"errors:   {totals['errors']}")
+    cache.close()
+    os.remove(path)
+    if totals['errors']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Synthetic twitter.db generator used by the benchmark scripts.
+
+Builds a database with the same tables the app reads (users,
+following_relationships, user_daily_metrics) and a power-law follower
+graph, so benchmarks can run without a copy of the production volume.
+
+    python -m bench.synthetic /tmp/twitter.db --users 200000 --edges 2000000
+"""
+import argparse
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+
+USERS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        username TEXT,
+        name TEXT,
+        follower_count INTEGER,
+        following_count INTEGER,
+        description TEXT,
+        creation_date TEXT,
+        timestamp INTEGER,
+        is_private INTEGER,
+        is_verified INTEGER,
+        location TEXT,
+        profile_pic_url TEXT,
+        profile_banner_url TEXT,
+        external_url TEXT,
+        number_of_tweets INTEGER,
+        bot INTEGER,
+        has_nft_avatar INTEGER,
+        last_updated INTEGER,
+        followers_crawled INTEGER,
+        bfs_depth INTEGER,
+        is_in_niche INTEGER,
+        checked_in_niche INTEGER
+    )
+"""
+
+RELATIONSHIPS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS following_relationships (
+        user_id TEXT,
+        following_id TEXT,
+        PRIMARY KEY (user_id, following_id)
+    )
+"""
+
+METRICS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_daily_metrics (
+        user_id TEXT,
+        date DATE,
+        pagerank_score REAL,
+        pagerank_percentile REAL,
+        follower_count INTEGER,
+        following_count INTEGER,
+        inbound_edges INTEGER,
+        outbound_edges INTEGER,
+        PRIMARY KEY (user_id, date)
+    )
+"""
+
+SYLLABLES = ['sol', 'eth', 'btc', 'ape', 'moon', 'degen', 'chad', 'based', 'alpha',
+             'whale', 'pump', 'wagmi', 'nft', 'dao', 'labs', 'xyz', 'fi', 'ai', 'gm', 'dev']
+
+
+def power_law_edges(n_users, n_edges, exponent=1.2, seed=0):
+    """Return (src, dst) int arrays for a directed graph with heavy-tailed in-degrees."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_users + 1) ** exponent
+    weights /= weights.sum()
+    popularity = rng.permutation(n_users)
+
+    src = rng.integers(0, n_users, size=n_edges)
+    dst = popularity[rng.choice(n_users, size=n_edges, p=weights)]
+    keep = src != dst
+    pairs = np.unique(np.stack([src[keep], dst[keep]], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def generate(db_path, n_users=100_000, n_edges=1_000_000, days=3, seed=0):
+    """Write a synthetic database to db_path, replacing any existing file."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    rng = np.random.default_rng(seed)
+    user_ids = (rng.choice(10 ** 12, size=n_users, replace=False) + 10 ** 8).astype(str)
+    src, dst = power_law_edges(n_users, n_edges, seed=seed)
+    in_deg = np.bincount(dst, minlength=n_users)
+    out_deg = np.bincount(src, minlength=n_users)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(USERS_SCHEMA)
+    conn.execute(RELATIONSHIPS_SCHEMA)
+    conn.execute(METRICS_SCHEMA)
+
+    def users():
+        for i, user_id in enumerate(user_ids):
+            parts = rng.choice(SYLLABLES, size=2)
+            username = f"{parts[0]}{parts[1].capitalize()}{i}"
+            yield (user_id, username, username, int(in_deg[i] * 37 + rng.integers(0, 500)),
+                   int(out_deg[i] * 3 + rng.integers(0, 4000)), '', '', 0, 0,
+                   int(rng.random() < 0.05), '', f"https://pbs.twimg.com/{user_id}.jpg",
+                   None, None, 0, 0, 0, 1_700_000_000_000 + i, 0, 0, 0, 0)
+
+    conn.executemany(f"INSERT INTO users VALUES ({','.join('?' * 22)})", users())
+    conn.executemany("INSERT INTO following_relationships VALUES (?, ?)",
+                     zip(user_ids[src].tolist(), user_ids[dst].tolist()))
+
+    base = in_deg / max(in_deg.max(), 1)
+    for d in range(days):
+        day = date(2025, 1, 1) + timedelta(days=d)
+        scores = base * (1 + 0.05 * rng.standard_normal(n_users)) + 1e-9
+        order = np.argsort(np.argsort(scores))
+        percentiles = order / n_users * 100
+        conn.executemany(
+            "INSERT INTO user_daily_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((user_ids[i], day, float(scores[i]), float(percentiles[i]), 0, 0,
+              int(in_deg[i]), int(out_deg[i])) for i in range(n_users)))
+
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('db_path')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--edges', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=3)
+    args = parser.parse_args()
+    generate(args.db_path, args.users, args.edges, args.days)
+    print(f"Wrote {args.db_path}")
@@ -5,5 +5,12 @@
 #     cp /data/twitter.db /app/data/twitter.db
 # fi
 
+# Create any missing indexes (no-op once they exist). On a large database the
+# first build takes minutes, so it runs beside gunicorn instead of before it:
+# reads keep working in WAL mode and health checks pass, while writes may
+# time out with "database is locked" until each index is built.
+# ANALYZE is left to a one-off `flask --app run.py create-indexes --analyze`.
+flask --app run.py create-indexes --no-analyze &
+
 # Start the Flask application
-exec gunicorn --bind 0.0.0.0:8080 "run:app" --workers 2 --threads 2 --timeout 60
\ No newline at end of file
+exec gunicorn --bind 0.0.0.0:8080 "run:app" --workers 2 --threads 2 --timeout 60
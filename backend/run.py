@@ -1,5 +1,9 @@
 from app import create_app
-from app.graph_builder import build_graph, calculate_pagerank, save_daily_metrics
+from app.graph_builder import (
+    build_graph, calculate_niche_pageranks, calculate_pagerank, save_adjacency_index,
+    save_daily_metrics, save_niche_metrics,
+)
+from app.top_followers import save_top_followers
 import sqlite3
 from dotenv import load_dotenv
 import os
@@ -122,6 +126,46 @@ SEED_NODES = [
     "1392124029914566666", # metaversejoji
 ]
 
+# Seed sets for niche rankings, stored under these keys and selected with ?niche=
+NICHE_SEED_NODES = {
+    "solana": [
+        "951329744804392960", # solana
+        "2327407569", # aeyakovenko
+        "101833150", # rajgokal
+        "1379053041995890695", # phantom
+        "1446489618208067586", # JupiterExchange
+        "1358454920299433985", # RaydiumProtocol
+        "1622243071806128131", # pumpdotfun
+        "1309886201944473600", # 0xMert_
+        "1424905944857722887", # SOLBigBrain
+        "1572090499229487104", # ellipsis_labs
+    ],
+    "ethereum": [
+        "2312333412", # ethereum
+        "295218901", # VitalikButerin
+        "1163550920485015558", # ethdotorg
+        "1628067904083181570", # base
+        "18876842", # jessepollak
+        "1332033418088099843", # arbitrum
+        "1044836083530452992", # Optimism
+        "1542947918709080065", # eigenlayer
+        "984188226826010624", # Uniswap
+        "914738730740715521", # 0xPolygon
+    ],
+    "ai_agents": [
+        "1830340867737178112", # shawmakesmagic
+        "1851849397979480064", # ai16zdao
+        "1852674305517342720", # aixbt_agent
+        "1802642686710837249", # truth_terminal
+        "20006785", # AndyAyrey
+        "1762471547485184000", # cookiedotfun
+        "1866789219613421568", # agentcookiefun
+        "1851730950566350850", # griffaindotcom
+        "1651199844365766656", # sendaifun
+        "1714580962569588736", # deepseek_ai
+    ],
+}
+
 def initialize_app():
     print(f"Current working directory: {os.getcwd()}")
     db_path = 'data/twitter.db'
@@ -145,8 +189,12 @@ def initialize_app():
         return
 
     # G = build_graph()
-    # scores = calculate_pagerank(G, seed_nodes=SEED_NODES)
-    # save_daily_metrics(scores,G)
+    # scores = calculate_pagerank(G, seed_nodes=SEED_NODES, as_array=True)
+    # save_daily_metrics(scores, G, bulk=True)
+    # save_top_followers(scores, G)
+    # save_adjacency_index(scores, G)
+    # niche_scores = calculate_niche_pageranks(G, NICHE_SEED_NODES)
+    # save_niche_metrics(niche_scores, G)
 
 if __name__ == '__main__':
     with app.app_context():  
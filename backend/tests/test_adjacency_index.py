@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from app.adjacency_index import AdjacencyIndexStore, write_adjacency_index
+from app.csr_graph import CSRGraph
+
+
+def make_graph(src, dst, n=4):
+    node_ids = np.array([str(100 + i) for i in range(n)], dtype=object)
+    ones = np.ones(n, dtype=np.float64)
+    return CSRGraph.from_edges(node_ids, np.array(src), np.array(dst), ones, ones,
+                               np.zeros(n, dtype=bool), np.ones(n, dtype=bool))
+
+
+def test_rerun_on_the_same_date_leaves_mapped_builds_alone(tmp_path):
+    index_dir = str(tmp_path)
+    scores = np.array([0.4, 0.3, 0.2, 0.1])
+    store = AdjacencyIndexStore(index_dir)
+
+    first_path = write_adjacency_index('2024-05-01', make_graph([0, 1], [3, 3]), scores, index_dir, keep=0)
+    first = store.current()
+    assert first.path == first_path
+
+    # Same date again, and keep=0 prunes the first build
+    second_path = write_adjacency_index('2024-05-01', make_graph([0, 1, 2], [3, 3, 3]), scores,
+                                        index_dir, keep=0)
+    assert second_path != first_path
+    assert not os.path.exists(first_path)
+    assert sorted(os.listdir(index_dir)) == [os.path.basename(second_path)]
+
+    # The worker that had the first build open still reads all of it
+    assert first.user_ids(first.page(3, 'followers')[0]) == ['100', '101']
+    assert first.has_edge(0, 3) and not first.has_edge(2, 3)
+
+    second = store.current()
+    assert second.path == second_path
+    assert second.date == first.date and second.build != first.build
+    assert second.page(3, 'followers')[1] == 3
+
+
+def test_newest_build_wins_over_older_layout(tmp_path):
+    index_dir = str(tmp_path)
+    scores = np.ones(4)
+    legacy = write_adjacency_index('2024-05-02', make_graph([0], [1]), scores, index_dir)
+    # Directories written before builds had their own suffix
+    os.rename(legacy, os.path.join(index_dir, '2024-05-02'))
+    newer = write_adjacency_index('2024-05-02', make_graph([0, 2], [1, 1]), scores, index_dir)
+    write_adjacency_index('2024-05-01', make_graph([0], [1]), scores, index_dir)
+    assert AdjacencyIndexStore(index_dir).current().path == newer
@@ -0,0 +1,42 @@
+import gc
+import sqlite3
+import threading
+import weakref
+from functools import partial
+
+import pytest
+
+import app.db as db_module
+from app.db import close_pooled_readers, open_read_connection
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'twitter.db')
+    sqlite3.connect(db_path).close()
+    monkeypatch.setattr(db_module, 'open_read_connection', partial(open_read_connection, db_path))
+    return db_path
+
+
+def reader_from_new_thread():
+    readers = []
+    thread = threading.Thread(target=lambda: readers.append(db_module._pooled_reader()))
+    thread.start()
+    thread.join()
+    return readers[0]
+
+
+def test_pooled_readers_are_closed_at_exit(db_path):
+    reader = reader_from_new_thread()
+    assert reader in db_module._readers
+    close_pooled_readers()
+    with pytest.raises(sqlite3.ProgrammingError):
+        reader.execute("SELECT 1")
+    assert reader not in db_module._readers
+
+
+def test_readers_of_finished_threads_are_dropped(db_path):
+    # The thread's local goes away with it, and the WeakSet keeps nothing alive
+    reader = weakref.ref(reader_from_new_thread())
+    gc.collect()
+    assert reader() is None
@@ -0,0 +1,71 @@
+import sqlite3
+from functools import partial
+
+import pytest
+
+import app.jobs as jobs
+from app import create_app
+from app.crawler import NotFound
+from app.db import open_read_connection, open_write_connection
+from app.jobs import AnalysisQueue, ensure_jobs_table, get_job
+from app.routes import handle_user_not_in_db, job_routes
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'twitter.db')
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE users (user_id TEXT PRIMARY KEY, username TEXT)")
+    ensure_jobs_table(db)
+    db.commit()
+    db.close()
+    monkeypatch.setattr(jobs, 'open_write_connection', partial(open_write_connection, db_path))
+    return db_path
+
+
+def missing(identifier):
+    raise NotFound("HTTP Error: 404 Not Found for /user/details")
+
+
+def run_job(db_path, identifier):
+    queue = AnalysisQueue(workers=1)
+    db = open_write_connection(db_path)
+    job, _ = queue.enqueue(db, identifier)
+    queue._executor.shutdown(wait=True)
+    return get_job(db, job['job_id'])
+
+
+def test_api_errors_fail_the_job(db_path, monkeypatch):
+    def forbidden(identifier):
+        raise Exception("HTTP Error: Client error '403 Forbidden'")
+
+    monkeypatch.setattr(handle_user_not_in_db, 'get_user_details', forbidden)
+    job = run_job(db_path, 'someone')
+    assert job['status'] == 'failed'
+    assert '403' in job['error']
+    assert job['result'] is None
+
+
+def test_unknown_handles_finish_with_not_found(db_path, monkeypatch):
+    monkeypatch.setattr(handle_user_not_in_db, 'get_user_details', missing)
+    job = run_job(db_path, 'nobody')
+    assert job['status'] == 'done'
+    assert job['result']['status'] == 'not_found'
+
+
+def test_event_stream_ends_when_the_job_is_deleted(db_path, monkeypatch):
+    monkeypatch.setattr(handle_user_not_in_db, 'get_user_details', missing)
+    job_id = run_job(db_path, 'nobody')['job_id']
+    monkeypatch.setattr(job_routes, 'get_db', partial(open_read_connection, db_path))
+    monkeypatch.setattr(job_routes, 'open_read_connection', partial(open_read_connection, db_path))
+
+    with create_app().test_request_context():
+        response = job_routes.get_analysis_job_events(job_id)
+        # The route found the job; it is gone by the time the stream polls
+        db = sqlite3.connect(db_path)
+        db.execute("DELETE FROM analysis_jobs WHERE job_id = ?", (job_id,))
+        db.commit()
+        body = ''.join(response.response)
+
+    assert 'event: job' not in body
+    assert body.endswith(f'event: gone\ndata: {{"job_id": "{job_id}"}}\n\n')
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from app.csr_graph import CSRGraph
+from app.graph_builder import personalization_vector
+
+
+def legacy_personalization(G, seed_nodes):
+    """The per-node loop calculate_pagerank ran before personalization_vector"""
+    node_list = G.node_ids
+    node_idx = G.node_index
+    n = G.n
+
+    p = np.ones(n) / n
+    if seed_nodes:
+        seed_indices = [node_idx[node] for node in seed_nodes if node in node_idx]
+        p = np.zeros(n)
+        p[seed_indices] = 5 / len(seed_indices)
+
+    for i, node in enumerate(node_list):
+        if not (seed_nodes and node in seed_nodes):
+            followers = G.follower_count[i] if G.has_profile[i] else 1
+            following = G.following_count[i] if G.has_profile[i] else 1
+            p[i] = min(max(0, np.log((followers + 250) / (following + 250))), 5)
+
+            if following > 3000:
+                penalty_factor = following / 2000
+                p[i] /= penalty_factor
+
+    with np.errstate(invalid='ignore'):
+        return (p - p.min()) / (p.max() - p.min())
+
+
+def make_graph(follower_count, following_count, has_profile=None):
+    n = len(follower_count)
+    node_ids = np.array([str(100 + i) for i in range(n)], dtype=object)
+    src = np.arange(n)
+    dst = (src + 1) % n
+    if has_profile is None:
+        has_profile = np.ones(n, dtype=bool)
+    return CSRGraph.from_edges(
+        node_ids, src, dst,
+        np.asarray(follower_count, dtype=np.float64),
+        np.asarray(following_count, dtype=np.float64),
+        np.zeros(n, dtype=bool), np.asarray(has_profile, dtype=bool),
+    )
+
+
+def vectorized(G, seed_nodes):
+    with np.errstate(invalid='ignore'):
+        return personalization_vector(G, G.index_of(seed_nodes))
+
+
+def test_matches_loop_on_random_graph():
+    rng = np.random.default_rng(0)
+    n = 500
+    G = make_graph(rng.integers(0, 100_000, n), rng.integers(0, 10_000, n),
+                   rng.random(n) > 0.1)
+    seeds = list(G.node_ids[:7])
+    np.testing.assert_allclose(vectorized(G, seeds), legacy_personalization(G, seeds),
+                               rtol=1e-12, atol=1e-15)
+
+
+@pytest.mark.parametrize('seeds', [[], ['100'], ['101', '103']])
+def test_seed_nodes(seeds):
+    G = make_graph([10, 5000, 200, 0, 80], [300, 10, 4000, 0, 9000])
+    expected = legacy_personalization(G, seeds)
+    np.testing.assert_allclose(vectorized(G, seeds), expected, rtol=1e-12, atol=1e-15)
+    for seed in seeds:
+        assert expected[G.node_index[seed]] == 1.0
+
+
+def test_following_penalty():
+    # Same log ratio before the penalty; only the accounts over 3000 are divided
+    G = make_graph([100_000, 100_000, 100_000, 0], [2999, 3000, 3001, 0])
+    p = vectorized(G, [])
+    np.testing.assert_allclose(p, legacy_personalization(G, []), rtol=1e-12, atol=1e-15)
+    assert p[1] > p[2]
+
+
+def test_zero_counts_and_missing_profiles():
+    G = make_graph([0, 0, 1000, 7], [0, 500, 0, 7], has_profile=[True, True, True, False])
+    np.testing.assert_allclose(vectorized(G, ['102']), legacy_personalization(G, ['102']),
+                               rtol=1e-12, atol=1e-15)
+
+
+def test_all_equal_scales_to_nan():
+    # Min-max scaling divides by zero when every node gets the same weight
+    G = make_graph([50, 50, 50], [50, 50, 50])
+    p = vectorized(G, [])
+    assert np.isnan(p).all()
+    np.testing.assert_allclose(p, legacy_personalization(G, []), equal_nan=True)
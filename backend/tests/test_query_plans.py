@@ -0,0 +1,85 @@
+"""
+EXPLAIN QUERY PLAN regression tests for the API's hot queries, on a small
+synthetic fixture with every table the routes read and the indexes from
+create_indexes.
+"""
+import sqlite3
+
+import pytest
+
+from app.jobs import ensure_jobs_table
+from app.latest_metrics import backfill_latest_metrics
+from app.niches import ensure_niche_tables
+from app.percentiles import ensure_percentile_sketch_table
+from app.queries import create_indexes, full_scans, hot_queries
+from app.search_index import rebuild_search_index
+from app.top_followers import TOP_FOLLOWERS_SCHEMA
+from bench.synthetic import generate
+
+
+@pytest.fixture(scope='module')
+def db(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('plans') / 'fixture.db')
+    generate(db_path, n_users=2000, n_edges=10_000, days=3)
+    db = sqlite3.connect(db_path)
+    backfill_latest_metrics(db)
+    rebuild_search_index(db)
+    ensure_niche_tables(db)
+    ensure_jobs_table(db)
+    ensure_percentile_sketch_table(db)
+    db.execute(TOP_FOLLOWERS_SCHEMA)
+    db.execute("""
+        INSERT INTO user_niche_daily_metrics
+        SELECT 'solana', user_id, date, pagerank_score, pagerank_percentile
+        FROM user_daily_metrics
+    """)
+    db.execute("""
+        INSERT INTO user_niche_latest_metrics
+        SELECT 'solana', user_id, date, pagerank_score, pagerank_percentile
+        FROM user_latest_metrics
+    """)
+    db.commit()
+    create_indexes(db)
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize('name', sorted(hot_queries()))
+def test_hot_query_does_not_scan(db, name):
+    sql, params = hot_queries()[name]
+    assert full_scans(db, sql, params) == []
+
+
+def test_ordered_limit_index_walk_is_allowed(db):
+    sql = "SELECT last_updated FROM users ORDER BY last_updated DESC LIMIT 5"
+    assert full_scans(db, sql) == []
+
+
+def test_unordered_scan_is_reported(db):
+    assert full_scans(db, "SELECT COUNT(*) FROM user_daily_metrics WHERE pagerank_score > 0")
+
+
+def test_scan_in_union_arm_is_reported(db):
+    # The ORDER BY ... LIMIT belongs to the first arm, not to the scan of users
+    sql = """
+        SELECT * FROM (SELECT date FROM user_daily_metrics ORDER BY date DESC LIMIT 5) recent
+        UNION ALL
+        SELECT user_id FROM users INDEXED BY idx_users_last_updated WHERE follower_count > 5
+    """
+    assert full_scans(db, sql) == ['SCAN users USING INDEX idx_users_last_updated']
+
+
+def test_scan_in_correlated_subquery_is_reported(db):
+    # The outer index walk stops after LIMIT rows; the subquery's scan runs for each of them
+    sql = """
+        SELECT u.user_id, (
+            SELECT COUNT(*) FROM following_relationships
+            INDEXED BY idx_following_relationships_following_id
+            WHERE user_id = u.user_id
+        ) AS following
+        FROM users u
+        ORDER BY u.last_updated DESC
+        LIMIT 5
+    """
+    assert full_scans(db, sql) == [
+        'SCAN following_relationships USING INDEX idx_following_relationships_following_id']
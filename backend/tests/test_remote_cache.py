@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.crawler import TwitterAPI
+from app.remote_cache import RemoteCache, is_cacheable, is_not_found
+
+
+@pytest.mark.parametrize('path, status, body, not_found, cacheable', [
+    ('/user/details', 200, {'user_id': '1', 'username': 'a'}, False, True),
+    ('/user/details', 404, {'detail': 'Not Found'}, True, True),
+    ('/user/details', 200, {'detail': 'User not found'}, True, True),
+    ('/user/details', 200, {'message': 'You have exceeded the MONTHLY quota'}, False, False),
+    ('/user/details', 200, {'message': 'Internal Server Error'}, False, False),
+    ('/user/details', 200, None, False, False),
+    ('/user/followers', 200, {'results': [], 'continuation_token': None}, False, True),
+    ('/user/followers/continuation', 200, {'message': 'Too many requests'}, False, False),
+])
+def test_response_classification(path, status, body, not_found, cacheable):
+    assert is_not_found(path, status, body) == not_found
+    assert is_cacheable(path, status, body) == cacheable
+
+
+def test_error_bodies_are_not_stored(tmp_path):
+    cache = RemoteCache(path=str(tmp_path / 'remote_cache.db'))
+    params = {'username': 'Someone'}
+    cache.set('/user/details', params, 200, {'message': 'quota exceeded'})
+    assert cache.get('/user/details', params) is None
+    cache.set('/user/details', params, 200, {'user_id': '7'})
+    assert cache.get('/user/details', {'username': 'someone'}) == (200, {'user_id': '7'})
+
+
+class ThreadRecordingCache(RemoteCache):
+    """RemoteCache that notes which threads its SQLite calls ran on"""
+
+    def __init__(self, path):
+        super().__init__(path=path)
+        self.threads = []
+
+    def get(self, path, params):
+        self.threads.append(threading.get_ident())
+        return super().get(path, params)
+
+    def set(self, path, params, status, body):
+        self.threads.append(threading.get_ident())
+        super().set(path, params, status, body)
+
+
+def test_cache_calls_run_off_the_event_loop(tmp_path):
+    cache = ThreadRecordingCache(str(tmp_path / 'remote_cache.db'))
+
+    async def lookup():
+        api = TwitterAPI(headers={}, cache=cache)
+        api.client = httpx.AsyncClient(
+            base_url='http://api.test',
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json={'user_id': '7'})))
+        first = await api.get_json('/user/details', {'username': 'someone'})
+        second = await api.get_json('/user/details', {'username': 'someone'})
+        await api.client.aclose()
+        return first, second
+
+    assert asyncio.run(lookup()) == ({'user_id': '7'}, {'user_id': '7'})
+    assert cache.upstream_calls == 1 and cache.hits == 1
+    # get, set, get
+    assert len(cache.threads) == 3
+    assert threading.get_ident() not in cache.threads
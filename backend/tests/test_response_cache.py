@@ -0,0 +1,43 @@
+import pytest
+from flask import Flask, jsonify
+
+import app.response_cache as response_cache_module
+from app.response_cache import ResponseCache, cached_response
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(response_cache_module, 'response_cache', ResponseCache(backend='memory'))
+    monkeypatch.setattr(response_cache_module, 'get_db', lambda: None)
+    monkeypatch.setattr(response_cache_module, 'metrics_epoch', lambda db: 1)
+
+    app = Flask(__name__)
+
+    @app.route('/search')
+    @cached_response(lambda: ('q',))
+    def search():
+        response = jsonify({'results': []})
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+        response.headers['Connection'] = 'close'
+        return response
+
+    return app.test_client()
+
+
+def test_hits_replay_the_view_headers(client):
+    miss = client.get('/search')
+    hit = client.get('/search')
+    assert miss.headers['X-Cache'] == 'MISS' and hit.headers['X-Cache'] == 'HIT'
+    assert hit.get_json() == {'results': []}
+    for name in ('Content-Type', 'Access-Control-Allow-Origin', 'Access-Control-Allow-Methods', 'ETag'):
+        assert hit.headers.get(name) == miss.headers.get(name)
+    assert hit.headers.getlist('Content-Type') == ['application/json']
+    assert 'Connection' not in hit.headers
+
+
+def test_matching_etag_gets_304(client):
+    etag = client.get('/search').headers['ETag']
+    hit = client.get('/search', headers={'If-None-Match': etag})
+    assert hit.status_code == 304
+    assert hit.headers['Access-Control-Allow-Origin'] == '*'
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+
+from app.shared_cache import SharedCache
+from bench.stress_shared_cache import worker
+
+
+def test_geometry_change_replaces_the_file(tmp_path):
+    path = str(tmp_path / 'shared_cache.bin')
+    old = SharedCache(path, n_sets=4, ways=2, slot_size=1024)
+    assert old.set(b'key', b'old value', ttl=60)
+    old_inode = os.stat(path).st_ino
+
+    new = SharedCache(path, n_sets=8, ways=2, slot_size=1024)
+    assert os.stat(path).st_ino != old_inode
+    assert os.path.getsize(path) == new.size
+    assert new.get(b'key') is None
+    assert [name for name in os.listdir(tmp_path)] == ['shared_cache.bin']
+
+    # The old mapping was not truncated under the worker still using it
+    assert old.get(b'key') == b'old value'
+    assert old.set(b'other', b'x' * 500, ttl=60)
+
+    # Reopening with the new geometry keeps the new file and its entries
+    assert new.set(b'key', b'new value', ttl=60)
+    again = SharedCache(path, n_sets=8, ways=2, slot_size=1024)
+    assert os.stat(path).st_ino == os.fstat(new._fd).st_ino
+    assert again.get(b'key') == b'new value'
+    for cache in (old, new, again):
+        cache.close()
+
+
+def test_sets_have_their_own_mutex(tmp_path):
+    cache = SharedCache(str(tmp_path / 'shared_cache.bin'), n_sets=4, ways=2, slot_size=1024)
+    start, length = cache._set_range(0)
+    cache._lock(start, length, exclusive=True)
+    try:
+        assert not cache._set_mutexes[0].acquire(blocking=False)
+        # Other sets stay free while set 0 is held
+        assert cache._set_mutexes[1].acquire(blocking=False)
+        cache._set_mutexes[1].release()
+    finally:
+        cache._unlock(start, length)
+    cache.close()
+
+
+def test_threads_in_several_processes(tmp_path):
+    # Threads of two workers waiting on each other's sets trip the kernel's
+    # per-process deadlock check (EDEADLK), which _lock has to ride out
+    path = str(tmp_path / 'shared_cache.bin')
+    geometry = (16, 8, 8192)
+    SharedCache(path, *geometry).close()
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(path, geometry, 2000, 3, 1.5, i, results))
+             for i in range(3)]
+    for proc in procs:
+        proc.start()
+    totals = [results.get(timeout=60) for _ in procs]
+    for proc in procs:
+        proc.join()
+    assert [proc.exitcode for proc in procs] == [0, 0, 0]
+    assert sum(total['errors'] for total in totals) == 0
+    assert all(total['gets'] for total in totals)
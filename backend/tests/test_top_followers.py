@@ -0,0 +1,51 @@
+import sqlite3
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from app.graph_builder import build_graph, save_daily_metrics
+from app.niches import metrics_join
+from app.top_followers import (
+    LIVE_TOP_FOLLOWERS_SQL, PRECOMPUTED_TOP_FOLLOWERS_SQL, save_top_followers, top_k_followers,
+)
+from bench.synthetic import generate
+
+
+def test_top_k_followers_skips_unlistable_nodes():
+    # 0, 1 and 2 follow 3; 1 has the best score but no profile
+    A = csr_matrix((np.ones(3), ([0, 1, 2], [3, 3, 3])), shape=(4, 4))
+    scores = np.array([0.2, 0.9, 0.5, 0.1])
+    indptr, followers = top_k_followers(A, scores, 2)
+    assert followers[indptr[3]:indptr[4]].tolist() == [1, 2]
+    indptr, followers = top_k_followers(A, scores, 2, listable=np.array([True, False, True, True]))
+    assert followers[indptr[3]:indptr[4]].tolist() == [2, 0]
+
+
+@pytest.fixture(scope='module')
+def db_path(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('top') / 'twitter.db')
+    generate(db_path, n_users=1500, n_edges=12_000, days=0)
+    conn = sqlite3.connect(db_path)
+    # Followers that are only known from following_relationships
+    conn.execute("DELETE FROM users WHERE user_id IN (SELECT user_id FROM users ORDER BY user_id LIMIT 300)")
+    conn.commit()
+    conn.close()
+
+    G = build_graph(db_path)
+    scores = G.in_degree() / G.number_of_edges() + np.arange(G.n) * 1e-9
+    save_daily_metrics(scores, G, db_path=db_path)
+    save_top_followers(scores, G, db_path=db_path)
+    return db_path
+
+
+def test_precomputed_lists_match_live_query(db_path):
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    live_sql = LIVE_TOP_FOLLOWERS_SQL.format(metrics_join=metrics_join())
+    stored = db.execute("SELECT user_id, follower_ids FROM user_top_followers").fetchall()
+    assert stored
+    for row in stored:
+        precomputed = db.execute(PRECOMPUTED_TOP_FOLLOWERS_SQL, (row['follower_ids'], 10)).fetchall()
+        live = db.execute(live_sql, {'user_id': row['user_id'], 'limit': 10}).fetchall()
+        assert [r['user_id'] for r in precomputed] == [r['user_id'] for r in live]
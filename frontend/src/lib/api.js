@@ -39,12 +39,69 @@ export async function getUserHistory(identifier) {
 	return response.json();
 }
 
-export async function analyzeNewUser(username) {
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_TIMEOUT_MS = 5 * 60 * 1000;
+
+// Analysis runs as a background job on the server: queue it, then poll the
+// job until it finishes. onProgress receives the job on every poll.
+export async function analyzeNewUser(username, onProgress) {
 	const url = `${API_BASE}/api/user/${username}?not_in_database=true`;
 	console.log("Making request to:", url);
 	const response = await fetch(url);
 	if (!response.ok) {
 		throw new Error("Failed to analyze user");
 	}
+	let job = await response.json();
+	const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+
+	while (job.status === "queued" || job.status === "running") {
+		if (onProgress) {
+			onProgress(job);
+		}
+		if (Date.now() > deadline) {
+			throw new Error("Timed out waiting for user analysis");
+		}
+		await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+		const poll = await fetch(`${API_BASE}${job.poll_url}`);
+		if (!poll.ok) {
+			throw new Error("Failed to check user analysis");
+		}
+		job = await poll.json();
+	}
+
+	if (job.status === "failed") {
+		throw new Error(job.error || "Failed to analyze user");
+	}
+	return job.result;
+}
+
+// direction is "followers" or "following"; sorted by pagerank, best first
+export async function getNetworkPage(identifier, direction, offset = 0, limit = 50) {
+	const url = `${API_BASE}/api/user/${identifier}/${direction}?offset=${offset}&limit=${limit}`;
+	console.log("Making request to:", url);
+	const response = await fetch(url);
+	if (!response.ok) {
+		throw new Error(`Failed to fetch ${direction}`);
+	}
+	return response.json();
+}
+
+export async function getMutualFollows(identifier, other, limit = 10) {
+	const url = `${API_BASE}/api/user/${identifier}/mutual/${other}?limit=${limit}`;
+	console.log("Making request to:", url);
+	const response = await fetch(url);
+	if (!response.ok) {
+		throw new Error("Failed to fetch mutual follows");
+	}
+	return response.json();
+}
+
+export async function getEgoNetwork(identifier, first = 20, second = 5) {
+	const url = `${API_BASE}/api/user/${identifier}/ego?first=${first}&second=${second}`;
+	console.log("Making request to:", url);
+	const response = await fetch(url);
+	if (!response.ok) {
+		throw new Error("Failed to fetch ego network");
+	}
 	return response.json();
 }